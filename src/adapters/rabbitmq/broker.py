@@ -1,10 +1,18 @@
 from faststream.rabbit import RabbitBroker
 
 from src.config.settings import settings
+from src.db.tasks import register_task
 
 from .handlers import message, reply_to_message
+from .monitoring import QueueDepthPoller
+from .queues import message_queue, reply_to_message_queue
 
 broker = RabbitBroker(url=settings.RABBITMQ.URL.unicode_string())
 
 broker.include_router(message.router)
 broker.include_router(reply_to_message.router)
+
+if settings.RABBITMQ.QUEUE_DEPTH_INTERVAL:
+    register_task(QueueDepthPoller(
+        broker, [message_queue, reply_to_message_queue], interval=settings.RABBITMQ.QUEUE_DEPTH_INTERVAL
+    ))
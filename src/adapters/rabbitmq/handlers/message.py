@@ -5,33 +5,38 @@ from faststream import Logger, Depends
 from faststream.rabbit import RabbitRouter
 
 from src.adapters.rabbitmq.queues import telegram_exchange, message_queue
+from src.adapters.rabbitmq.timing import handler_middlewares, stage, timed
 
 from src.services.parsers.text import cryptobox_parser
 from src.schemas.telegram.message import TelegramMessageSchema
 from src.schemas.telegram.client import TelegramClientSchema
 from src.services.telegram.chat import telegram_chat_service
-from src.services.telegram.messages import telegram_message_service
+from src.services.telegram.cryptobox import cryptobox_sightings
+from src.services.telegram.rollups import rollups
+from src.services.telegram.unit_of_work import MessageUnitOfWork
 from src.services.telegram.user import telegram_user_service
 
 from src import metrics
 
 
+@timed('on_message', 'cryptoboxes')
 async def get_cryptoboxes(message: TelegramMessageSchema) -> Optional[List[str]]:
     return await cryptobox_parser(message.text or message.caption)
 
 
+@timed('on_message', 'restriction')
 async def is_source_restricted(message: TelegramMessageSchema) -> bool:
     if message.from_user and await telegram_user_service.is_restricted(message.from_user.id):
-        metrics.TELEGRAM_RESTRICTED_USER_MESSAGES.labels(
+        metrics.TELEGRAM_RESTRICTED_USER_MESSAGES.inc(
             user_id=message.from_user.id,
             user_username=message.from_user.username
-        ).inc()
+        )
         return True
     elif message.chat and await telegram_chat_service.is_restricted(message.chat.id):
-        metrics.TELEGRAM_RESTRICTED_CHAT_MESSAGES.labels(
+        metrics.TELEGRAM_RESTRICTED_CHAT_MESSAGES.inc(
             chat_id=message.chat.id,
             chat_title=message.chat.title
-        ).inc()
+        )
         return True
 
     return False
@@ -39,19 +44,34 @@ async def is_source_restricted(message: TelegramMessageSchema) -> bool:
 router = RabbitRouter()
 
 
-@router.subscriber(queue=message_queue, exchange=telegram_exchange)
+@router.subscriber(
+    queue=message_queue, exchange=telegram_exchange, middlewares=handler_middlewares('on_message', message_queue)
+)
 async def on_message(
         message: TelegramMessageSchema,
         client: TelegramClientSchema,
         logger: Logger,
         cryptoboxes: Optional[List[str]] = Depends(get_cryptoboxes)
 ):
+    if message.chat is not None:
+        metrics.TELEGRAM_MESSAGES_TOTAL.inc(chat_id=message.chat.id, title=message.chat.title)
+    chat_id = message.chat.id if message.chat else None
+    user_id = message.from_user.id if message.from_user else None
     if not cryptoboxes:
+        rollups.add(chat_id, user_id, message.date)
         return
+    if message.chat is not None:
+        metrics.TELEGRAM_MESSAGES_WITH_CRYPTOBOX.inc(chat_id=message.chat.id, title=message.chat.title)
     if await is_source_restricted(message):
+        rollups.add(chat_id, user_id, message.date, cryptobox=True, restricted=True)
         return
+    rollups.add(chat_id, user_id, message.date, cryptobox=True)
 
-    message_instance, _ = await telegram_message_service.get_or_create_from_schema(message)
+    with stage('on_message', 'persist'):
+        async with MessageUnitOfWork() as uow:
+            key = uow.add(message)
+        if key is not None:
+            cryptobox_sightings.add(cryptoboxes, uow.messages[key])
 
     # push message to rmq
 
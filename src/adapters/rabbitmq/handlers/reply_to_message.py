@@ -2,28 +2,57 @@ from faststream import Logger
 from faststream.rabbit import RabbitRouter
 
 from src.adapters.rabbitmq.queues import reply_to_message_queue, telegram_exchange
+from src.adapters.rabbitmq.timing import handler_middlewares, stage
+from src.cache import BoundedMemoryCache
+from src.config.settings import settings
 from src.schemas.telegram.client import TelegramClientSchema
 from src.schemas.telegram.message import TelegramMessageSchema
 from src.services.parsers.text import cryptobox_parser
 from src.services.reply_guard.guard import guard
+from src.services.reply_guard.reputation import reputation
 
 router = RabbitRouter()
 
+# codes of replied-to messages, every reply to the same message parses it once
+reply_codes = BoundedMemoryCache(name='reply_codes', max_entries=10_000, admission=BoundedMemoryCache.ADMISSION_LRU)
 
-@router.subscriber(queue=reply_to_message_queue, exchange=telegram_exchange)
+
+@router.subscriber(
+    queue=reply_to_message_queue,
+    exchange=telegram_exchange,
+    middlewares=handler_middlewares('on_reply_to_message', reply_to_message_queue)
+)
 async def on_reply_to_message(
         message: TelegramMessageSchema,
         client: TelegramClientSchema,
         logger: Logger,
 ):
-    cryptoboxes = await cryptobox_parser(message.reply_to_message.text or message.reply_to_message.caption)
+    replied = message.reply_to_message
+    # nothing to key the codes or the reputation by
+    if replied is None or replied.chat is None:
+        return
+
+    with stage('on_reply_to_message', 'cryptoboxes'):
+        key = f'{replied.chat.id}:{replied.id}'
+        if (cryptoboxes := await reply_codes.get(key)) is None:
+            cryptoboxes = await cryptobox_parser(replied.text or replied.caption) or []
+            await reply_codes.set(key, cryptoboxes)
     if not cryptoboxes:
         return
 
-    if await guard(message.text or message.caption) is None:
-        ...
+    with stage('on_reply_to_message', 'guard'):
+        verdict = guard.verdict(message.text or message.caption)
+        if verdict is not None and settings.REPUTATION.ENABLED:
+            reputation.record(
+                verdict,
+                reporter_id=message.from_user.id if message.from_user else None,
+                chat_id=replied.chat.id,
+                message_id=replied.id,
+                user_id=replied.from_user.id if replied.from_user else None,
+                codes=cryptoboxes
+            )
 
     logger.info('>>'.join([
         message.text or message.caption,
-        message.reply_to_message.text or message.reply_to_message.caption
-    ]))
\ No newline at end of file
+        replied.text or replied.caption
+    ]))
@@ -0,0 +1,95 @@
+import datetime
+import time
+from typing import Any, Optional, Sequence
+
+from faststream import BaseMiddleware
+from faststream.rabbit import RabbitBroker, RabbitQueue
+from faststream.types import DecodedMessage
+from tortoise.log import logger
+
+from src import metrics
+from src.config.settings import settings
+from src.db.budget import QueryScope
+from src.db.tasks import PeriodicTask
+
+
+class ConsumerMetricsMiddleware(BaseMiddleware):
+    """
+    Broker side health of a consumed message: lag behind its AMQP timestamp,
+    redeliveries, body size, the publishing client and how it was settled.
+    Subscribers without ``retry`` reject a message whose handler failed.
+    """
+
+    def __init__(self, msg: Any, queue: str, requeue: bool = False):
+        super().__init__(msg)
+        self.queue = queue
+        self.requeue = requeue
+
+    async def on_receive(self) -> None:
+        msg, queue = self.msg, self.queue
+        # whole seconds, naive UTC as decoded by pamqp
+        published: Optional[datetime.datetime] = getattr(msg, 'timestamp', None)
+        if published is not None:
+            if published.tzinfo is None:
+                published = published.replace(tzinfo=datetime.timezone.utc)
+            metrics.CONSUMER_LAG_SECONDS.labels(queue=queue).observe(max(0.0, time.time() - published.timestamp()))
+        if getattr(msg, 'redelivered', False):
+            metrics.CONSUMER_REDELIVERED.labels(queue=queue).inc()
+        metrics.CONSUMER_BODY_BYTES.labels(queue=queue).observe(len(getattr(msg, 'body', None) or b''))
+
+    async def on_consume(self, msg: DecodedMessage) -> DecodedMessage:
+        client = msg.get('client') if isinstance(msg, dict) else None
+        if isinstance(client, dict):
+            metrics.CONSUMER_CLIENT_MESSAGES.labels(queue=self.queue, client=client.get('name') or '').inc()
+        return msg
+
+    async def after_processed(self, exc_type=None, exc_val=None, exec_tb=None) -> Optional[bool]:
+        outcome = 'ack' if exc_type is None else 'nack' if self.requeue else 'reject'
+        metrics.CONSUMER_SETTLED.labels(queue=self.queue, outcome=outcome).inc()
+        return False
+
+
+class QueryBudgetMiddleware(BaseMiddleware):
+    """
+    Accounts the statements of one delivery to a :class:`QueryScope` named
+    after the handler.
+    """
+
+    def __init__(self, msg: Any, handler: str):
+        super().__init__(msg)
+        self.scope = QueryScope(handler, settings.DB.QUERY_BUDGET, detail=getattr(msg, 'message_id', None))
+
+    async def on_receive(self) -> None:
+        self.scope.__enter__()
+
+    async def after_processed(self, exc_type=None, exc_val=None, exec_tb=None) -> Optional[bool]:
+        self.scope.__exit__(exc_type, exc_val, exec_tb)
+        return False
+
+
+class QueueDepthPoller(PeriodicTask):
+    """
+    Reads ready messages and consumers of the queues with passive declares on
+    a short-lived channel, a missing queue closes that channel only.
+    """
+    name = 'queue_depth'
+
+    def __init__(self, broker: RabbitBroker, queues: Sequence[RabbitQueue], interval: float):
+        super().__init__(interval)
+        self.broker = broker
+        self.queues = queues
+
+    async def run_once(self) -> None:
+        connection = self.broker._connection
+        if connection is None or connection.is_closed:
+            return
+        for queue in self.queues:
+            try:
+                async with connection.channel() as channel:
+                    declared = await channel.declare_queue(queue.name, passive=True)
+            except Exception as e:
+                logger.warning('Queue depth of "%s" is not available: %r', queue.name, e)
+                continue
+            result = declared.declaration_result
+            metrics.QUEUE_MESSAGES.labels(queue=queue.name).set(result.message_count)
+            metrics.QUEUE_CONSUMERS.labels(queue=queue.name).set(result.consumer_count)
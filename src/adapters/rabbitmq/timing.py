@@ -0,0 +1,151 @@
+import datetime
+import functools
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from faststream import BaseMiddleware
+from faststream.rabbit import RabbitQueue
+from faststream.types import DecodedMessage
+
+from src import metrics, tracing
+from src.adapters.rabbitmq.monitoring import ConsumerMetricsMiddleware, QueryBudgetMiddleware
+from src.config.settings import settings
+
+_histograms: Dict[Tuple[str, str], Any] = {}
+_disabled = nullcontext()
+
+
+def _enabled() -> bool:
+    return settings.METRICS.STAGE_TIMING or settings.TRACING.ENABLED
+
+
+def _histogram(handler: str, name: str):
+    if not settings.METRICS.STAGE_TIMING:
+        return None
+    key = (handler, name)
+    if (histogram := _histograms.get(key)) is None:
+        histogram = _histograms[key] = metrics.HANDLER_STAGE_SECONDS.labels(handler=handler, stage=name)
+    return histogram
+
+
+class _Stage:
+    __slots__ = ('histogram', 'name', 'started', 'span')
+
+    def __init__(self, histogram, name: str):
+        self.histogram = histogram
+        self.name = name
+
+    def __enter__(self) -> '_Stage':
+        self.span = tracing.start_span(self.name)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if self.histogram is not None:
+            self.histogram.observe(time.perf_counter() - self.started)
+        tracing.end_span(self.span, exc_val)
+
+
+def stage(handler: str, name: str):
+    """
+    Times a stage of a handler and traces it as a span of the message.
+
+        with stage('on_message', 'persist'):
+            ...
+    """
+    if not _enabled():
+        return _disabled
+    return _Stage(_histogram(handler, name), name)
+
+
+def timed(handler: str, name: str) -> Callable:
+    """
+    :func:`stage` around every await of the decorated coroutine function, works
+    for faststream dependencies as well.
+    """
+    def decorator(func: Callable) -> Callable:
+        if not _enabled():
+            return func
+        histogram = _histogram(handler, name)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with _Stage(histogram, name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """
+    Records the ``decode`` stage (parsing and decoding of the body), the
+    ``total`` time from receiving to acking a message, and the delivery latency
+    from the AMQP timestamp set by the publisher, if any.
+    """
+
+    def __init__(self, msg: Any, handler: str):
+        super().__init__(msg)
+        self.handler = handler
+        self.received = time.perf_counter()
+
+    async def on_consume(self, msg: DecodedMessage) -> DecodedMessage:
+        _histogram(self.handler, 'decode').observe(time.perf_counter() - self.received)
+        return msg
+
+    async def after_processed(self, exc_type=None, exc_val=None, exec_tb=None) -> Optional[bool]:
+        _histogram(self.handler, 'total').observe(time.perf_counter() - self.received)
+
+        # whole seconds, naive UTC as decoded by pamqp
+        published: Optional[datetime.datetime] = getattr(self.msg, 'timestamp', None)
+        if published is not None:
+            if published.tzinfo is None:
+                published = published.replace(tzinfo=datetime.timezone.utc)
+            metrics.HANDLER_DELIVERY_SECONDS.labels(handler=self.handler).observe(
+                max(0.0, time.time() - published.timestamp())
+            )
+        return False
+
+
+class HandlerTracingMiddleware(BaseMiddleware):
+    """
+    Starts the trace of a message from its ``traceparent`` header, the stages
+    of the handler, cache lookups and queries become its child spans.
+    """
+
+    def __init__(self, msg: Any, handler: str):
+        super().__init__(msg)
+        self.handler = handler
+        self.span: Optional[tracing.Span] = None
+        self.received = 0.0
+
+    async def on_receive(self) -> None:
+        self.received = time.perf_counter()
+        self.span = tracing.start_trace(
+            self.handler, getattr(self.msg, 'headers', None),
+            message_id=getattr(self.msg, 'message_id', None),
+            routing_key=getattr(self.msg, 'routing_key', None)
+        )
+
+    async def on_consume(self, msg: DecodedMessage) -> DecodedMessage:
+        tracing.record_span('decode', self.received)
+        return msg
+
+    async def after_processed(self, exc_type=None, exc_val=None, exec_tb=None) -> Optional[bool]:
+        tracing.end_span(self.span, exc_val)
+        return False
+
+
+def handler_middlewares(handler: str, queue: RabbitQueue) -> Sequence[Callable[[Any], BaseMiddleware]]:
+    """
+    Middlewares for ``subscriber(middlewares=...)``, only the enabled ones.
+    """
+    middlewares = [
+        functools.partial(ConsumerMetricsMiddleware, queue=queue.name),
+        functools.partial(QueryBudgetMiddleware, handler=handler),
+    ]
+    if settings.TRACING.ENABLED:
+        middlewares.append(functools.partial(HandlerTracingMiddleware, handler=handler))
+    if settings.METRICS.STAGE_TIMING:
+        middlewares.append(functools.partial(HandlerTimingMiddleware, handler=handler))
+    return tuple(middlewares)
@@ -1,7 +1,10 @@
 from pathlib import Path
 
+from starlette.middleware import Middleware
+
 from src.config.settings import settings
 from .contrib.tortoise import Admin
+from .middlewares import QueryScopeMiddleware
 
 from .views import register_admin_views
 
@@ -9,7 +12,8 @@ TEMPLATES = Path(__file__).parent.joinpath('templates')
 
 admin = Admin(
     title=f'{settings.APP_TITLE} v{settings.APP_VERSION}',
-    templates_dir=TEMPLATES.as_posix()
+    templates_dir=TEMPLATES.as_posix(),
+    middlewares=[Middleware(QueryScopeMiddleware)]
 )
 
 register_admin_views(admin)
@@ -1,2 +1,3 @@
 from .view import ModelView
 from .admin import Admin
+from .counts import CountStrategy, ExactCount, CappedCount, CachedCount, EstimatedCount
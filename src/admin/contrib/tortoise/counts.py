@@ -0,0 +1,83 @@
+import json
+from typing import Any, Dict, Optional, Union
+
+from tortoise import Model
+from tortoise.queryset import QuerySet
+
+from src.cache import BoundedMemoryCache
+from src.db.schema import dialect_of
+
+Where = Union[Dict[str, Any], str, None]
+
+# sum over the table and its partitions, never analyzed relations report -1
+ESTIMATE_SQL = """
+SELECT COALESCE(SUM(c.reltuples) FILTER (WHERE c.reltuples > 0), 0)::bigint AS estimate
+FROM pg_class c
+WHERE c.oid = to_regclass($1) OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass($1))
+"""
+
+counts_cache = BoundedMemoryCache(
+    name='admin_counts', max_entries=1000, admission=BoundedMemoryCache.ADMISSION_LRU
+)
+
+
+class CountStrategy:
+    """
+    How a list view counts its rows, runs with the view's read connection.
+    """
+
+    async def count(self, model: type[Model], queryset: QuerySet, where: Where) -> int:
+        raise NotImplementedError
+
+
+class ExactCount(CountStrategy):
+    async def count(self, model, queryset, where):
+        return await queryset.count()
+
+
+class CappedCount(CountStrategy):
+    """
+    Counts at most ``cap`` + 1 rows, a result over ``cap`` means "more than".
+    """
+
+    def __init__(self, cap: int = 1000):
+        self.cap = cap
+
+    async def count(self, model, queryset, where):
+        return len(await queryset.limit(self.cap + 1).values_list(model._meta.pk_attr, flat=True))
+
+
+class CachedCount(CountStrategy):
+    """
+    Result of ``strategy`` kept for ``ttl`` seconds per view and filter.
+    """
+
+    def __init__(self, strategy: Optional[CountStrategy] = None, ttl: float = 30):
+        self.strategy = strategy or ExactCount()
+        self.ttl = ttl
+
+    async def count(self, model, queryset, where):
+        key = f'{model._meta.db_table}:{id(self)}:{json.dumps(where, sort_keys=True, default=str)}'
+        if (count := await counts_cache.get(key)) is None:
+            count = await self.strategy.count(model, queryset, where)
+            await counts_cache.set(key, count, ttl=self.ttl)
+        return count
+
+
+class EstimatedCount(CountStrategy):
+    """
+    Planner estimate for the unfiltered list on Postgres, once the table has
+    ``min_rows`` by that estimate; ``filtered`` counts everything else.
+    """
+
+    def __init__(self, filtered: Optional[CountStrategy] = None, min_rows: int = 100_000):
+        self.filtered = filtered or ExactCount()
+        self.min_rows = min_rows
+
+    async def count(self, model, queryset, where):
+        connection = model._choose_db()
+        if not where and dialect_of(connection) == 'postgres':
+            _, rows = await connection.execute_query(ESTIMATE_SQL, [model._meta.db_table])
+            if rows and rows[0]['estimate'] >= self.min_rows:
+                return rows[0]['estimate']
+        return await self.filtered.count(model, queryset, where)
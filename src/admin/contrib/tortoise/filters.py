@@ -0,0 +1,72 @@
+from typing import Any, Callable, Collection, Dict, Mapping, Set, Tuple, Type
+
+from tortoise import Model
+from tortoise.expressions import Q
+
+# the starlette-admin filter DSL, same operators as its SQLAlchemy contrib
+OPERATORS: Dict[str, Callable[[str, Any], Q]] = {
+    'eq': lambda f, v: Q(**{f: v}),
+    'neq': lambda f, v: Q(**{f'{f}__not': v}),
+    'lt': lambda f, v: Q(**{f'{f}__lt': v}),
+    'gt': lambda f, v: Q(**{f'{f}__gt': v}),
+    'le': lambda f, v: Q(**{f'{f}__lte': v}),
+    'ge': lambda f, v: Q(**{f'{f}__gte': v}),
+    'in': lambda f, v: Q(**{f'{f}__in': v}),
+    'not_in': lambda f, v: Q(**{f'{f}__not_in': v}),
+    'startswith': lambda f, v: Q(**{f'{f}__startswith': v}),
+    'not_startswith': lambda f, v: ~Q(**{f'{f}__startswith': v}),
+    'endswith': lambda f, v: Q(**{f'{f}__endswith': v}),
+    'not_endswith': lambda f, v: ~Q(**{f'{f}__endswith': v}),
+    'contains': lambda f, v: Q(**{f'{f}__contains': v}),
+    'not_contains': lambda f, v: ~Q(**{f'{f}__contains': v}),
+    'is_false': lambda f, v: Q(**{f: False}),
+    'is_true': lambda f, v: Q(**{f: True}),
+    'is_null': lambda f, v: Q(**{f'{f}__isnull': True}),
+    'is_not_null': lambda f, v: Q(**{f'{f}__not_isnull': True}),
+    # not __range, whose bounds skip the field's encoding (datetimes compare as text on SQLite)
+    'between': lambda f, v: Q(**{f'{f}__gte': v[0], f'{f}__lte': v[1]}),
+    'not_between': lambda f, v: ~Q(**{f'{f}__gte': v[0], f'{f}__lte': v[1]}),
+}
+
+# operators a b-tree index on the column can answer
+INDEXED_OPERATORS = frozenset({'eq', 'lt', 'gt', 'le', 'ge', 'in', 'is_false', 'is_true', 'is_null', 'between'})
+
+# operators taking a value of the column's type, the others take strings or nothing
+TYPED_OPERATORS = frozenset({'eq', 'neq', 'lt', 'gt', 'le', 'ge', 'in', 'not_in', 'between', 'not_between'})
+
+
+def build_query(
+        where: Mapping[str, Any], model: Type[Model], fields: Collection[str], indexed: Set[str],
+        field: str = None
+) -> Tuple[Q, bool]:
+    """
+    Compiles ``where`` into a :class:`Q` over the named ``fields`` of ``model``,
+    relations filtered by their foreign key column. The flag tells whether an
+    index on one of the ``indexed`` columns can narrow the rows down.
+    """
+    conditions, usable = [], []
+    for key, value in where.items():
+        if key in ('and', 'or'):
+            parts = [build_query(v, model, fields, indexed, field) for v in value]
+            conditions.append(Q(*[q for q, _ in parts], join_type=key.upper()))
+            usable.append(bool(parts) and (any if key == 'and' else all)(i for _, i in parts))
+        elif key in OPERATORS and field is not None:
+            column = model._meta.fields_map[field].source_field if field in model._meta.fk_fields else field
+            conditions.append(OPERATORS[key](column, coerce(model, field, key, value)))
+            usable.append(key in INDEXED_OPERATORS and column in indexed)
+        elif key in fields and key in model._meta.fields_map:
+            q, i = build_query(value, model, fields, indexed, key)
+            conditions.append(q)
+            usable.append(i)
+    return Q(*conditions), any(usable)
+
+
+def coerce(model: Type[Model], field: str, operator: str, value: Any) -> Any:
+    if operator not in TYPED_OPERATORS:
+        return value
+    field_object = model._meta.fields_map[field]
+    if field in model._meta.fk_fields:
+        field_object = field_object.related_model._meta.pk
+    if isinstance(value, (list, tuple)):
+        return [field_object.to_python_value(v) for v in value]
+    return field_object.to_python_value(value)
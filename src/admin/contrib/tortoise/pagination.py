@@ -0,0 +1,79 @@
+import base64
+import binascii
+import json
+from typing import Any, List, Optional, Sequence, Tuple, Type
+
+from tortoise import Model
+from tortoise.expressions import Q
+
+from src.cache import BoundedMemoryCache
+
+# page boundaries the list view ended on, so the next page seeks instead of skipping
+CURSOR_TTL = 600
+
+cursors = BoundedMemoryCache(name='admin_cursors', max_entries=5000, admission=BoundedMemoryCache.ADMISSION_LRU)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Keyset:
+    """
+    Ordering by model columns with the pk as the last, unique tiebreak. A cursor
+    holds the ordering values of a row, ``seek`` filters the rows after it.
+    """
+
+    def __init__(self, model: Type[Model], fields: Sequence[Tuple[str, bool]]):
+        self.model = model
+        self.fields = list(fields)
+
+    @classmethod
+    def from_ordering(cls, model: Type[Model], ordering: Sequence[str]) -> Optional['Keyset']:
+        """
+        ``None`` when the ordering can't be seeked, e.g. by a relation, an annotation
+        or a nullable column (``>`` never matches the NULL rows, they'd be skipped).
+        """
+        fields = []
+        for name in ordering:
+            field, descending = name.lstrip('-'), name.startswith('-')
+            if field not in model._meta.fields_db_projection or model._meta.fields_map[field].null:
+                return None
+            fields.append((field, descending))
+        pk = model._meta.pk_attr
+        if pk not in [field for field, _ in fields]:
+            fields.append((pk, fields[-1][1] if fields else False))
+        return cls(model, fields)
+
+    def order_by(self) -> List[str]:
+        return [f'-{field}' if descending else field for field, descending in self.fields]
+
+    def cursor(self, obj: Model) -> Optional[str]:
+        values = [getattr(obj, field) for field, _ in self.fields]
+        if any(value is None for value in values):
+            return None
+        values = [value.isoformat() if hasattr(value, 'isoformat') else getattr(value, 'value', value)
+                  for value in values]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+    def decode(self, cursor: str) -> List[Any]:
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        except (binascii.Error, ValueError) as e:
+            raise InvalidCursor(cursor) from e
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        fields_map = self.model._meta.fields_map
+        return [fields_map[field].to_python_value(value) for (field, _), value in zip(self.fields, values)]
+
+    def seek(self, cursor: str) -> Q:
+        return self.after(self.decode(cursor))
+
+    def after(self, values: Sequence[Any]) -> Q:
+        conditions = []
+        for i, (field, descending) in enumerate(self.fields):
+            equal = {f: value for (f, _), value in zip(self.fields[:i], values)}
+            conditions.append(Q(**equal, **{f'{field}__{"lt" if descending else "gt"}': values[i]}))
+        # bound on the leading column too, an index condition the scan can start from
+        field, descending = self.fields[0]
+        return Q(**{f'{field}__{"lte" if descending else "gte"}': values[0]}) & Q(*conditions, join_type='OR')
@@ -1,5 +1,7 @@
+import json
 from typing import Type, Any, Dict, List, Sequence, Optional, Union, Set
 
+from starlette.exceptions import HTTPException
 from starlette.requests import Request
 from starlette_admin import BaseModelView, fields
 from starlette_admin.exceptions import FormValidationError
@@ -7,13 +9,22 @@ from starlette_admin.helpers import prettify_class_name
 from tortoise import Model
 from tortoise.exceptions import BaseORMException
 from tortoise.expressions import Q
+from tortoise.log import logger
 from tortoise.models import MODEL
 
+from src import metrics
+from src.db.budget import current_query_scope
+from src.db.routers import read_from_replica
+from src.db.schema import leading_index_columns
 from .converter import ModelConverter
+from .counts import CountStrategy, ExactCount
+from .filters import build_query
+from .pagination import CURSOR_TTL, InvalidCursor, Keyset, cursors
 
 
 class ModelView(BaseModelView):
     model: Type[MODEL]
+    count_strategy: CountStrategy = ExactCount()
 
     def __init__(
             self,
@@ -34,6 +45,7 @@ class ModelView(BaseModelView):
         self.name = name or self.name or prettify_class_name(self.model.__name__)
         self.icon = icon or self.icon
         self.pk_attr = self.model._meta.pk_attr
+        self.indexed_columns = leading_index_columns(self.model)
         if self.fields is None or len(self.fields) == 0:
             self.fields = self.model._meta.fields
 
@@ -47,13 +59,13 @@ class ModelView(BaseModelView):
         return queryset
 
     def resolve_order_by(self, order_by: Optional[List[str]] = None):
-        orderings = set()
+        orderings = []
 
-        for name, direction in [o.split(maxsplit=1) for o in order_by]:
+        for name, direction in [o.split(maxsplit=1) for o in order_by or []]:
             if direction == 'asc':
-                orderings.add(name)
+                orderings.append(name)
             elif direction == 'desc':
-                orderings.add(f'-{name}')
+                orderings.append(f'-{name}')
             else:
                 raise Exception(f'Unknown "order_by" value "{order_by}"')
 
@@ -88,7 +100,27 @@ class ModelView(BaseModelView):
         return Q(*conditions, join_type='OR')
 
     def resolve_deep_query(self, where: Dict[str, Any] = None):
-        raise NotImplemented
+        return self.build_query(where)[0]
+
+    def build_query(self, where: Optional[Dict[str, Any]]):
+        return build_query(where or {}, self.model, {field.name for field in self.fields}, self.indexed_columns)
+
+    def warn_unindexed(self, where: Union[Dict[str, Any], str, None]) -> None:
+        if not isinstance(where, dict) or not where or self.build_query(where)[1]:
+            return
+        scope = current_query_scope()
+        metrics.DB_SCOPE_WARNINGS.labels(scope=scope.name if scope else 'admin', reason='unindexed_filter').inc()
+        logger.warning('%s filter %s is not narrowed by any index, needs a sequential scan', self.identity, where)
+
+    def filter_queryset(self, queryset, where: Union[Dict[str, Any], str, None] = None):
+        return queryset.filter(self.resolve_query(where))
+
+    def is_ranked(self, where: Union[Dict[str, Any], str, None] = None) -> bool:
+        """
+        True when ``filter_queryset`` orders the rows itself, e.g. by search rank,
+        and the list ordering would undo it.
+        """
+        return False
 
     async def find_all(
             self,
@@ -98,15 +130,44 @@ class ModelView(BaseModelView):
             where: Union[Dict[str, Any], str, None] = None,
             order_by: Optional[List[str]] = None
     ) -> Sequence[Any]:
-        query = self.resolve_query(where)
-        order_by = self.resolve_order_by(order_by)
-        queryset = self.get_queryset().filter(query).order_by(*order_by).offset(skip).limit(limit)
-        return await queryset
+        order_by = [] if self.is_ranked(where) else self.resolve_order_by(order_by)
+        self.warn_unindexed(where)
+        queryset = self.filter_queryset(self.get_queryset(), where)
+        keyset = Keyset.from_ordering(self.model, order_by) if order_by else None
+        if keyset is None:
+            if order_by:
+                queryset = queryset.order_by(*order_by)
+            with read_from_replica():
+                return await queryset.offset(skip).limit(limit)
+
+        # the page after one served before seeks from where that page ended
+        boundary = f'{self.identity}:{json.dumps([where, order_by], sort_keys=True, default=str)}'
+        cursor = request.query_params.get('cursor') or (skip and await cursors.get(f'{boundary}:{skip}'))
+        queryset = queryset.order_by(*keyset.order_by())
+        try:
+            queryset = queryset.filter(keyset.seek(cursor)) if cursor else queryset.offset(skip)
+        except InvalidCursor:
+            raise HTTPException(400, 'Invalid cursor')
+        with read_from_replica():
+            items = await queryset.limit(limit)
+
+        request.state.keyset = keyset
+        if items and (next_cursor := keyset.cursor(items[-1])):
+            await cursors.set(f'{boundary}:{skip + len(items)}', next_cursor, ttl=CURSOR_TTL)
+        return items
 
     async def count(self, request: Request, where: Union[Dict[str, Any], str, None] = None) -> int:
-        query = self.resolve_query(where)
-        queryset = self.model.filter(query)
-        return await queryset.count()
+        queryset = self.filter_queryset(self.get_queryset(), where)
+        with read_from_replica():
+            return await self.count_strategy.count(self.model, queryset, where)
+
+    async def serialize(self, obj: Any, request: Request, *args, **kwargs) -> Dict[str, Any]:
+        serialized = await super().serialize(obj, request, *args, **kwargs)
+        # pass the last item's cursor to get the page after it
+        keyset = getattr(request.state, 'keyset', None)
+        if keyset is not None and isinstance(obj, keyset.model):
+            serialized['_meta']['cursor'] = keyset.cursor(obj)
+        return serialized
 
     async def delete(self, request: Request, pks: List[Any]) -> Optional[int]:
         query = {f'{self.pk_attr}__in': pks}
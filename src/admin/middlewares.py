@@ -0,0 +1,28 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.config.settings import settings
+from src.db.budget import QueryScope
+
+
+class QueryScopeMiddleware:
+    """
+    Accounts the statements of every admin page and api call to a
+    :class:`QueryScope`, static files are skipped and exports have no budget.
+    """
+
+    def __init__(self, app: ASGIApp, name: str = 'admin'):
+        self.app = app
+        self.name = name
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or '/statics/' in scope['path']:
+            await self.app(scope, receive, send)
+            return
+        detail = f'{scope["method"]} {scope["path"]}'
+        if '/export/' in scope['path']:
+            # one query per chunk, as many as the export needs
+            with QueryScope(f'{self.name}_export', None, repeated=0, detail=detail):
+                await self.app(scope, receive, send)
+            return
+        with QueryScope(self.name, settings.DB.ADMIN_QUERY_BUDGET, detail=detail):
+            await self.app(scope, receive, send)
@@ -1,10 +1,13 @@
 from starlette_admin import DropDown
 from src.admin.contrib.tortoise import Admin
 
-from . import users, chats, messages
+from . import users, chats, messages, caches, export, dashboard
 
 
 def register_admin_views(admin: Admin):
+    dashboard.register(admin)
     users.register(admin)
     chats.register(admin)
     messages.register(admin)
+    caches.register(admin)
+    export.register(admin)
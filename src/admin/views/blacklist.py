@@ -0,0 +1,46 @@
+import datetime
+from typing import List, Optional
+
+from starlette.datastructures import FormData
+from starlette_admin.exceptions import ActionFailed
+from tortoise.timezone import now
+
+# (value in seconds, label), an empty value is permanent
+DURATIONS = [('3600', '1H'), ('14400', '4H'), ('86400', '1D'), ('604800', '7D'), ('', 'PERM')]
+
+ADD_TO_BLACKLIST_FORM = """
+<form>
+    <div class="mt-3">
+        <input type="text" class="form-control" name="reason" placeholder="Reason">
+    </div>
+    <div class="btn-group w-100 mt-3" role="group">
+        {durations}
+    </div>
+</form>
+""".format(durations='\n        '.join(
+    f'<input type="radio" class="btn-check" name="duration" id="duration-{label}" value="{value}" autocomplete="off"'
+    f'{" checked" if not value else ""}>'
+    f'<label for="duration-{label}" type="button" class="btn">{label}</label>'
+    for value, label in DURATIONS
+))
+
+AMNESTY_FORM = """
+<form>
+    <div class="mt-3">
+        <input type="text" class="form-control" name="reason" placeholder="Reason">
+    </div>
+</form>
+"""
+
+
+def release_at_from(data: FormData) -> Optional[datetime.datetime]:
+    duration = data.get('duration') or ''
+    if not duration:
+        return None
+    if not duration.isdigit():
+        raise ActionFailed(f'Unknown duration "{duration}"')
+    return now() + datetime.timedelta(seconds=int(duration))
+
+
+def parse_pks(pks: List[str]) -> List[int]:
+    return [int(pk) for pk in pks]
@@ -0,0 +1,26 @@
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.templating import Jinja2Templates
+from starlette_admin import CustomView
+
+from src.admin.contrib.tortoise import Admin
+from src.cache import CACHES
+from src.cache.introspection import describe, list_keys
+
+CACHE_ICON = 'fa-solid fa-memory'
+SAMPLE_SIZE = 20
+
+
+class CachesView(CustomView):
+    async def render(self, request: Request, templates: Jinja2Templates) -> Response:
+        caches = [
+            {**describe(cache), 'sample': list_keys(cache, limit=SAMPLE_SIZE, sample=True)['items']}
+            for cache in CACHES.values()
+        ]
+        return templates.TemplateResponse(
+            self.template_path, {'request': request, 'title': self.title(request), 'caches': caches}
+        )
+
+
+def register(admin: Admin):
+    admin.add_view(CachesView('Caches', icon=CACHE_ICON, path='/caches', template_path='caches.html'))
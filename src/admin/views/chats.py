@@ -3,36 +3,14 @@ from typing import List
 from starlette.datastructures import FormData
 from starlette.requests import Request
 from starlette_admin import fields, DropDown, action
-from tortoise.functions import Count
 
-from src.admin.contrib.tortoise import Admin, ModelView
+from src.admin.contrib.tortoise import Admin, ModelView, CachedCount, EstimatedCount
+from src.admin.views.blacklist import ADD_TO_BLACKLIST_FORM, AMNESTY_FORM, parse_pks, release_at_from
 from src.models.telegram import TelegramChat, TelegramChatBlacklist
+from src.services.telegram.chat import telegram_chat_service
 
 CHAT_ICON = 'fa-solid fa-comment-dots'
 
-ADD_TO_BLACKLIST_FORM = """
-<form>
-    <div class="mt-3">
-        <input type="text" class="form-control" name="reason" placeholder="Reason">
-        
-        <!-- <input type="radio" class="btn-check" name="btn-radio-basic" id="btn-radio-basic-1" autocomplete="off" checked=""> -->
-        <!-- <label for="btn-radio-basic-1" type="button" class="btn">1H</label> -->
-
-        <!-- <input type="radio" class="btn-check" name="btn-radio-basic" id="btn-radio-basic-2" autocomplete="off"> -->
-        <!-- <label for="btn-radio-basic-2" type="button" class="btn">4H</label> -->
-
-        <!-- <input type="radio" class="btn-check" name="btn-radio-basic" id="btn-radio-basic-3" autocomplete="off"> -->
-        <!-- <label for="btn-radio-basic-3" type="button" class="btn">1D</label> -->
-
-        <!-- <input type="radio" class="btn-check" name="btn-radio-basic" id="btn-radio-basic-4" autocomplete="off"> -->
-        <!-- <label for="btn-radio-basic-4" type="button" class="btn">7D</label> -->
-
-        <!-- <input type="radio" class="btn-check btn-outline-danger" name="btn-radio-basic" id="btn-radio-basic-5" autocomplete="off"> -->
-        <!-- <label for="btn-radio-basic-5" type="button" class="btn">PERM</label> -->
-    </div>
-</form>
-"""
-
 
 class ChatView(ModelView):
     model = TelegramChat
@@ -56,13 +34,11 @@ class ChatView(ModelView):
 
     actions = [
         'delete',
-        'add_to_blacklist'
+        'add_to_blacklist',
+        'amnesty'
     ]
 
-    def get_queryset(self):
-        return self.model.all().annotate(
-            messages_count=Count('messages'),
-        )
+    count_strategy = EstimatedCount(filtered=CachedCount())
 
     async def repr(self, obj: TelegramChat, request: Request) -> str:
         return obj.title
@@ -75,7 +51,23 @@ class ChatView(ModelView):
     )
     async def add_to_blacklist(self, request: Request, pks: List[int]):
         data: FormData = await request.form()
-        return str(data)
+        blacklisted = await telegram_chat_service.blacklist_many(
+            parse_pks(pks), reason=data.get('reason') or None, release_at=release_at_from(data)
+        )
+        return f'{len(blacklisted)} chats added to blacklist, {len(pks) - len(blacklisted)} already restricted'
+
+    @action(
+        name='amnesty',
+        confirmation='Are you sure?',
+        text='Remove from blacklist',
+        form=AMNESTY_FORM
+    )
+    async def amnesty(self, request: Request, pks: List[int]):
+        data: FormData = await request.form()
+        amnestied = await telegram_chat_service.amnesty_many(
+            parse_pks(pks), amnestied_reason=data.get('reason') or None
+        )
+        return f'{len(amnestied)} chats removed from blacklist'
 
 
 class HistoryBlacklistChatView(ModelView):
@@ -0,0 +1,79 @@
+import datetime
+from typing import Any, Dict, List, Type
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.templating import Jinja2Templates
+from starlette_admin import CustomView
+from tortoise.functions import Sum
+from tortoise.timezone import now
+
+from src.admin.contrib.tortoise import Admin
+from src.db.routers import read_from_replica
+from src.models.telegram import ChatHourlyRollup, TelegramChat, TelegramUser, UserHourlyRollup
+from src.models.telegram.rollups import HourlyRollup
+from src.services.telegram.rollups import hour_of
+
+DASHBOARD_ICON = 'fa-solid fa-chart-column'
+WINDOWS = (24, 24 * 7, 24 * 30)
+TOP_SIZE = 20
+
+
+def _totals(model: Type[HourlyRollup], since: datetime.datetime):
+    return model.filter(hour__gte=since).annotate(
+        total=Sum('messages'), cryptobox=Sum('cryptobox_messages'), restricted=Sum('restricted_messages')
+    )
+
+
+async def _top(model: Type[HourlyRollup], key: str, since: datetime.datetime) -> List[Dict[str, Any]]:
+    return await _totals(model, since).group_by(key).order_by('-total').limit(TOP_SIZE).values(
+        key, 'total', 'cryptobox', 'restricted'
+    )
+
+
+def _named(rows: List[Dict[str, Any]], key: str, names: Dict[int, Any]) -> List[Dict[str, Any]]:
+    # most sources are counted without ever being stored, only stored ones link to their page
+    return [{**row, 'stored': row[key] in names, 'name': names.get(row[key])} for row in rows]
+
+
+class DashboardView(CustomView):
+    """
+    Message volumes read from the hourly rollups only.
+    """
+
+    async def render(self, request: Request, templates: Jinja2Templates) -> Response:
+        hours = int(request.query_params.get('hours') or WINDOWS[0])
+        if hours not in WINDOWS:
+            hours = WINDOWS[0]
+        since = hour_of(now() - datetime.timedelta(hours=hours))
+
+        with read_from_replica():
+            hourly = await _totals(ChatHourlyRollup, since).group_by('hour').order_by('-hour').values(
+                'hour', 'total', 'cryptobox', 'restricted'
+            )
+            chats = await _top(ChatHourlyRollup, 'chat_id', since)
+            users = await _top(UserHourlyRollup, 'user_id', since)
+            titles = dict(
+                await TelegramChat.filter(id__in=[row['chat_id'] for row in chats]).values_list('id', 'title')
+            )
+            usernames = dict(
+                await TelegramUser.filter(id__in=[row['user_id'] for row in users]).values_list('id', 'username')
+            )
+
+        totals = {name: sum(row[name] or 0 for row in hourly) for name in ('total', 'cryptobox', 'restricted')}
+        peak = max([row['total'] or 0 for row in hourly] or [0])
+        return templates.TemplateResponse(self.template_path, {
+            'request': request,
+            'title': self.title(request),
+            'hours': hours,
+            'windows': WINDOWS,
+            'totals': totals,
+            'hourly': hourly,
+            'peak': peak or 1,
+            'chats': _named(chats, 'chat_id', titles),
+            'users': _named(users, 'user_id', usernames),
+        })
+
+
+def register(admin: Admin):
+    admin.add_view(DashboardView('Dashboard', icon=DASHBOARD_ICON, path='/dashboard', template_path='dashboard.html'))
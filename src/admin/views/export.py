@@ -0,0 +1,151 @@
+import csv
+import datetime
+import io
+import json
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence
+
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+from starlette_admin import DropDown
+from starlette_admin.views import Link
+from tortoise.queryset import QuerySet
+
+from src.admin.contrib.tortoise import Admin
+from src.admin.contrib.tortoise.pagination import Keyset
+from src.db.routers import read_from_replica
+from src.models.telegram import Cryptobox, TelegramMessage
+
+EXPORT_ICON = 'fa-solid fa-file-export'
+
+CHUNK_SIZE = 5000
+
+MESSAGE_FIELDS = (
+    'id', 'chat_id', 'message_id', 'from_user_id', 'reply_to_message_id', 'date', 'text', 'caption', 'empty'
+)
+CODE_FIELDS = ('id', 'code', 'first_seen_at', 'last_seen_at', 'sightings_count')
+
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+async def iter_chunks(
+        queryset: QuerySet, keyset: Keyset, fields: Sequence[str], chunk_size: int = CHUNK_SIZE
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Rows in keyset order, one short query on the replica per chunk: no
+    transaction or cursor stays open between chunks and only one is in memory.
+    """
+    after = None
+    while True:
+        chunk = queryset.order_by(*keyset.order_by())
+        if after is not None:
+            chunk = chunk.filter(keyset.after(after))
+        with read_from_replica():
+            rows = await chunk.limit(chunk_size).values(*fields)
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after = [rows[-1][field] for field, _ in keyset.fields]
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return getattr(value, 'value', str(value))
+
+
+async def encode(
+        chunks: AsyncIterator[List[Dict[str, Any]]], fields: Sequence[str], format: str, compress: bool
+) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31) if compress else None  # gzip container
+    if format == 'csv':
+        yield _compress(compressor, _csv([fields]))
+    async for rows in chunks:
+        if format == 'csv':
+            data = _csv([[_json_default(row[field]) if row[field] is not None else '' for field in fields]
+                         for row in rows])
+        else:
+            data = ''.join(json.dumps(row, default=_json_default, ensure_ascii=False) + '\n' for row in rows)
+        if block := _compress(compressor, data):
+            yield block
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def _csv(rows: Iterable[Sequence[Any]]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _compress(compressor, data: str) -> bytes:
+    return compressor.compress(data.encode()) if compressor is not None else data.encode()
+
+
+def _param(request: Request, name: str, parse=str) -> Optional[Any]:
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return parse(value)
+    except ValueError:
+        raise HTTPException(400, f'Invalid "{name}": {value}')
+
+
+def _stream(request: Request, name: str, chunks: AsyncIterator, fields: Sequence[str]) -> StreamingResponse:
+    format = request.query_params.get('format', 'ndjson')
+    if format not in MEDIA_TYPES:
+        raise HTTPException(400, f'Unknown format "{format}", expected one of {", ".join(MEDIA_TYPES)}')
+    compress = request.query_params.get('gzip') in ('1', 'true')
+    filename = f'{name}.{format}' + ('.gz' if compress else '')
+    return StreamingResponse(
+        encode(chunks, fields, format, compress),
+        media_type='application/gzip' if compress else MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+async def export_messages(request: Request) -> StreamingResponse:
+    """
+    ``?format=ndjson|csv&gzip=1&chat_id=&user_id=&q=&since=&until=``, oldest first.
+    """
+    queryset = TelegramMessage.objects.get_queryset()
+    if (chat_id := _param(request, 'chat_id', int)) is not None:
+        queryset = queryset.by_chat_id(chat_id)
+    if (user_id := _param(request, 'user_id', int)) is not None:
+        queryset = queryset.by_user_id(user_id)
+    if since := _param(request, 'since', datetime.datetime.fromisoformat):
+        queryset = queryset.since(since)
+    if until := _param(request, 'until', datetime.datetime.fromisoformat):
+        queryset = queryset.filter(date__lt=until)
+    if q := _param(request, 'q'):
+        queryset = queryset.search(q)
+    # (date, id) follows the date indexes, also behind the chat and user filters
+    keyset = Keyset.from_ordering(TelegramMessage, ['date'])
+    return _stream(request, 'messages', iter_chunks(queryset, keyset, MESSAGE_FIELDS), MESSAGE_FIELDS)
+
+
+async def export_codes(request: Request) -> StreamingResponse:
+    """
+    ``?format=ndjson|csv&gzip=1&since=``, codes last seen since ``since``.
+    """
+    queryset = Cryptobox.all()
+    if since := _param(request, 'since', datetime.datetime.fromisoformat):
+        queryset = queryset.filter(last_seen_at__gte=since)
+    keyset = Keyset.from_ordering(Cryptobox, ['id'])
+    return _stream(request, 'codes', iter_chunks(queryset, keyset, CODE_FIELDS), CODE_FIELDS)
+
+
+def register(admin: Admin):
+    admin.routes.extend([
+        Route('/export/messages', export_messages, methods=['GET'], name='export_messages'),
+        Route('/export/codes', export_codes, methods=['GET'], name='export_codes'),
+    ])
+    admin.add_view(DropDown('Export', icon=EXPORT_ICON, views=[
+        Link('Messages (CSV)', url=f'{admin.base_url}/export/messages?format=csv&gzip=1'),
+        Link('Messages (NDJSON)', url=f'{admin.base_url}/export/messages?format=ndjson&gzip=1'),
+        Link('Codes (CSV)', url=f'{admin.base_url}/export/codes?format=csv'),
+    ]))
@@ -1,7 +1,7 @@
 from starlette_admin import fields
 from tortoise.functions import Count
 
-from src.admin.contrib.tortoise import Admin, ModelView
+from src.admin.contrib.tortoise import Admin, ModelView, CachedCount, CappedCount, EstimatedCount
 from src.models.telegram import TelegramMessage
 
 
@@ -29,11 +29,25 @@ class MessageView(ModelView):
 
     exclude_fields_from_list = ['description']
 
+    # newest first, served by the (date, id) index
+    fields_default_sort = [('date', True)]
+
+    # searches are ranked over all matches, only the first pages are worth counting
+    count_strategy = EstimatedCount(filtered=CachedCount(CappedCount(1000)))
+
     def get_queryset(self):
-        return self.model.all().prefetch_related(
+        return self.model.objects.get_queryset().prefetch_related(
             'chat', 'from_user', 'reply_to_message'
         )
 
+    def is_ranked(self, where=None) -> bool:
+        return isinstance(where, str) and bool(where)
+
+    def filter_queryset(self, queryset, where=None):
+        if self.is_ranked(where):
+            return queryset.ranked_search(where)
+        return super().filter_queryset(queryset, where)
+
 
 def register(admin: Admin):
     admin.add_view(MessageView(model=TelegramMessage))
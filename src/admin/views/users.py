@@ -1,9 +1,13 @@
+from typing import List
+
+from starlette.datastructures import FormData
 from starlette.requests import Request
-from starlette_admin import fields, DropDown
-from tortoise.functions import Count
+from starlette_admin import fields, DropDown, action
 
-from src.admin.contrib.tortoise import Admin, ModelView
+from src.admin.contrib.tortoise import Admin, ModelView, CachedCount, EstimatedCount
+from src.admin.views.blacklist import ADD_TO_BLACKLIST_FORM, AMNESTY_FORM, parse_pks, release_at_from
 from src.models.telegram import TelegramUser, TelegramUserBlacklist
+from src.services.telegram.user import telegram_user_service
 
 USERS_ICON = 'fa-solid fa-users'
 
@@ -41,15 +45,43 @@ class UserView(ModelView):
         'last_name',
     ]
 
-    def get_queryset(self):
-        return self.model.all().annotate(
-            messages_count=Count('messages'),
-            # violations_count=Count('blacklist')
-        )
+    actions = [
+        'delete',
+        'add_to_blacklist',
+        'amnesty'
+    ]
+
+    count_strategy = EstimatedCount(filtered=CachedCount())
 
     async def repr(self, obj: TelegramUser, request: Request) -> str:
         return obj.username or obj.full_name or obj.id
 
+    @action(
+        name='add_to_blacklist',
+        confirmation='Are you sure?',
+        text='Add to blacklist',
+        form=ADD_TO_BLACKLIST_FORM
+    )
+    async def add_to_blacklist(self, request: Request, pks: List[int]):
+        data: FormData = await request.form()
+        blacklisted = await telegram_user_service.blacklist_many(
+            parse_pks(pks), reason=data.get('reason') or None, release_at=release_at_from(data)
+        )
+        return f'{len(blacklisted)} users added to blacklist, {len(pks) - len(blacklisted)} already restricted'
+
+    @action(
+        name='amnesty',
+        confirmation='Are you sure?',
+        text='Remove from blacklist',
+        form=AMNESTY_FORM
+    )
+    async def amnesty(self, request: Request, pks: List[int]):
+        data: FormData = await request.form()
+        amnestied = await telegram_user_service.amnesty_many(
+            parse_pks(pks), amnestied_reason=data.get('reason') or None
+        )
+        return f'{len(amnestied)} users removed from blacklist'
+
 
 class HistoryBlacklistUserView(ModelView):
     model = TelegramUserBlacklist
@@ -0,0 +1,22 @@
+from typing import Dict, Any, Optional
+
+from src.config.settings import settings
+
+from .backend import CACHES, BoundedMemoryCache, estimate_size
+from .singleflight import coalesced
+
+
+def bounded_cache_config(alias: str, max_entries: Optional[int] = None, **kwargs: Any) -> Dict[str, Any]:
+    return {
+        'cache': 'src.cache.BoundedMemoryCache',
+        'name': alias,
+        'ttl': settings.CACHE.TTL,
+        'timeout': None,
+        'max_entries': max_entries or settings.CACHE.MAX_ENTRIES,
+        'max_bytes': settings.CACHE.MAX_BYTES,
+        'admission': settings.CACHE.ADMISSION,
+        'serializer': {
+            'class': 'aiocache.serializers.NullSerializer'
+        },
+        **kwargs
+    }
@@ -0,0 +1,320 @@
+import itertools
+import random
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from aiocache.base import BaseCache
+from aiocache.serializers import NullSerializer
+
+from src import metrics, tracing
+
+from .sketch import FrequencySketch
+
+
+def estimate_size(value: Any) -> int:
+    size = sys.getsizeof(value)
+    for cls in type(value).__mro__:
+        for slot in cls.__dict__.get('__slots__', ()):
+            size += sys.getsizeof(getattr(value, slot, None))
+    return size
+
+
+# every BoundedMemoryCache by name, for metrics and inspection
+CACHES: Dict[str, 'BoundedMemoryCache'] = {}
+
+
+class _Entry:
+    __slots__ = ('value', 'expires_at', 'size')
+
+    def __init__(self, value: Any, expires_at: Optional[float], size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+
+
+class BoundedMemoryCache(BaseCache):
+    """
+    In-process cache bounded by entries and/or estimated bytes.
+
+    Entries are kept in LRU order, expired lazily on access or when they reach
+    the eviction end, and new keys are admitted over the LRU victim only when
+    the TinyLFU sketch says they are requested at least as often.
+    """
+    NAME = 'bounded_memory'
+
+    ADMISSION_LRU = 'lru'
+    ADMISSION_TINYLFU = 'tinylfu'
+
+    def __init__(
+            self,
+            serializer=None,
+            name: Optional[str] = None,
+            max_entries: int = 10_000,
+            max_bytes: Optional[int] = None,
+            admission: str = ADMISSION_TINYLFU,
+            sizeof: Callable[[Any], int] = estimate_size,
+            **kwargs
+    ):
+        super().__init__(serializer=serializer or NullSerializer(), **kwargs)
+        if admission not in (self.ADMISSION_LRU, self.ADMISSION_TINYLFU):
+            raise ValueError(f'Unknown admission policy "{admission}"')
+
+        self.name = name or self.NAME
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.admission = admission
+        self.sizeof = sizeof
+
+        self._data: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._sketch = FrequencySketch(max_entries) if admission == self.ADMISSION_TINYLFU else None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+
+        self._hits_metric = metrics.CACHE_REQUESTS.labels(cache=self.name, result='hit')
+        self._misses_metric = metrics.CACHE_REQUESTS.labels(cache=self.name, result='miss')
+        self._evictions_metric = metrics.CACHE_EVICTIONS.labels(cache=self.name, reason='size')
+        self._expirations_metric = metrics.CACHE_EVICTIONS.labels(cache=self.name, reason='expired')
+        self._rejections_metric = metrics.CACHE_EVICTIONS.labels(cache=self.name, reason='rejected')
+        CACHES[self.name] = self
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def ttl_remaining(self, key: Hashable) -> Optional[float]:
+        entry = self._data.get(key)
+        if entry is None or entry.expires_at is None:
+            return None
+        return entry.expires_at - time.monotonic()
+
+    def estimated_bytes(self, sample_size: int = 64) -> int:
+        """
+        Tracked bytes when bounded by size, otherwise extrapolated from the
+        entries at both ends of the LRU order.
+        """
+        if self.max_bytes is not None:
+            return self._bytes
+        if not self._data:
+            return 0
+        half = max(1, sample_size // 2)
+        sample = {
+            key: self._data[key]
+            for key in itertools.chain(itertools.islice(self._data, half), itertools.islice(reversed(self._data), half))
+        }
+        sampled = sum(self.sizeof(key) + self.sizeof(entry.value) for key, entry in sample.items())
+        return sampled * len(self._data) // len(sample)
+
+    def entries(self, offset: int = 0, limit: int = 100) -> List[Tuple[Hashable, _Entry]]:
+        """
+        A page of entries in LRU order, least recently used first.
+        """
+        return list(itertools.islice(self._data.items(), offset, offset + limit))
+
+    def sample(self, limit: int = 100) -> List[Tuple[Hashable, _Entry]]:
+        size = len(self._data)
+        positions = sorted(random.sample(range(size), min(limit, size)))
+        items: Iterator[Tuple[Hashable, _Entry]] = iter(self._data.items())
+        sampled, previous = [], -1
+        for position in positions:
+            sampled.append(next(itertools.islice(items, position - previous - 1, None)))
+            previous = position
+        return sampled
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'ttl': self.ttl,
+            'admission': self.admission,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'entries': len(self._data),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'rejections': self.rejections,
+        }
+
+    def _lookup(self, key: Hashable, now: float) -> Optional[_Entry]:
+        if self._sketch is not None:
+            self._sketch.increment(key)
+
+        entry = self._data.get(key)
+        if entry is not None and entry.expires_at is not None and entry.expires_at <= now:
+            self._discard(key)
+            self.expirations += 1
+            self._expirations_metric.inc()
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            self._misses_metric.inc()
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        self._hits_metric.inc()
+        return entry
+
+    def _discard(self, key: Hashable) -> bool:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= entry.size
+        return True
+
+    def _is_full(self, extra_entries: int, extra_size: int) -> bool:
+        if len(self._data) + extra_entries > self.max_entries:
+            return True
+        return self.max_bytes is not None and self._bytes + extra_size > self.max_bytes
+
+    def _reject(self) -> bool:
+        self.rejections += 1
+        self._rejections_metric.inc()
+        return False
+
+    def _make_room(self, key: Hashable, entries: int, size: int, now: float, admit: bool) -> bool:
+        while self._data and self._is_full(entries, size):
+            victim_key, victim = next(iter(self._data.items()))
+            if victim_key == key:
+                break
+            if victim.expires_at is not None and victim.expires_at <= now:
+                self._discard(victim_key)
+                self.expirations += 1
+                self._expirations_metric.inc()
+                continue
+
+            # ties are admitted, otherwise a cache full of one-hit keys never takes a new one
+            if admit and self._sketch is not None and self._sketch.frequency(key) < self._sketch.frequency(victim_key):
+                return self._reject()
+
+            self._discard(victim_key)
+            self.evictions += 1
+            self._evictions_metric.inc()
+        return True
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float]) -> bool:
+        now = time.monotonic()
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        expires_at = now + ttl if ttl else None
+
+        # would evict everything and still not fit
+        if self.max_bytes is not None and size > self.max_bytes:
+            return self._reject()
+
+        current = self._data.get(key)
+        if current is not None:
+            # already admitted, an update only makes room for what it grows by
+            self._data.move_to_end(key)
+            self._make_room(key, 0, size - current.size, now, admit=False)
+            self._bytes += size - current.size
+            current.value, current.expires_at, current.size = value, expires_at, size
+            return True
+
+        if not self._make_room(key, 1, size, now, admit=True):
+            return False
+
+        self._data[key] = _Entry(value, expires_at, size)
+        self._bytes += size
+        return True
+
+    async def _get(self, key, encoding='utf-8', _conn=None):
+        span = tracing.start_span('cache.get', cache=self.name)
+        entry = self._lookup(key, time.monotonic())
+        if span is not None:
+            span.set('hit', entry is not None)
+            tracing.end_span(span)
+        return entry.value if entry is not None else None
+
+    async def _gets(self, key, encoding='utf-8', _conn=None):
+        return await self._get(key, encoding=encoding, _conn=_conn)
+
+    async def _multi_get(self, keys, encoding='utf-8', _conn=None):
+        span = tracing.start_span('cache.multi_get', cache=self.name, keys=len(keys))
+        now = time.monotonic()
+        values = [entry.value if (entry := self._lookup(key, now)) is not None else None for key in keys]
+        if span is not None:
+            span.set('hits', sum(value is not None for value in values))
+            tracing.end_span(span)
+        return values
+
+    async def _set(self, key, value, ttl=None, _cas_token=None, _conn=None):
+        if _cas_token is not None:
+            entry = self._data.get(key)
+            if _cas_token != (entry.value if entry is not None else None):
+                return 0
+        return self._store(key, value, ttl)
+
+    async def _multi_set(self, pairs, ttl=None, _conn=None):
+        for key, value in pairs:
+            self._store(key, value, ttl)
+        return True
+
+    async def _add(self, key, value, ttl=None, _conn=None):
+        entry = self._data.get(key)
+        if entry is not None and (entry.expires_at is None or entry.expires_at > time.monotonic()):
+            raise ValueError('Key {} already exists, use .set to update the value'.format(key))
+        self._store(key, value, ttl)
+        return True
+
+    async def _exists(self, key, _conn=None):
+        entry = self._data.get(key)
+        return entry is not None and (entry.expires_at is None or entry.expires_at > time.monotonic())
+
+    async def _increment(self, key, delta, _conn=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self._store(key, delta, None)
+            return delta
+        try:
+            entry.value = int(entry.value) + delta
+        except ValueError:
+            raise TypeError('Value is not an integer') from None
+        return entry.value
+
+    async def _expire(self, key, ttl, _conn=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return False
+        entry.expires_at = time.monotonic() + ttl if ttl else None
+        return True
+
+    async def _delete(self, key, _conn=None):
+        return int(self._discard(key))
+
+    def delete_many(self, keys: Iterable[Hashable]) -> int:
+        return sum(self._discard(self.build_key(key, namespace=self.namespace)) for key in keys)
+
+    async def _clear(self, namespace=None, _conn=None):
+        if namespace:
+            for key in [k for k in self._data if isinstance(k, str) and k.startswith(namespace)]:
+                self._discard(key)
+        else:
+            self._data.clear()
+            self._bytes = 0
+        return True
+
+    async def _raw(self, command, *args, encoding='utf-8', _conn=None, **kwargs):
+        return getattr(self._data, command)(*args, **kwargs)
+
+    async def _redlock_release(self, key, value):
+        entry = self._data.get(key)
+        if entry is not None and entry.value == value:
+            self._discard(key)
+            return 1
+        return 0
+
+    @classmethod
+    def parse_uri_path(cls, path):
+        return {}
@@ -0,0 +1,59 @@
+import time
+from typing import Any, Dict, List
+
+from prometheus_client import REGISTRY
+from prometheus_client.metrics_core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from .backend import CACHES, BoundedMemoryCache
+
+MAX_PAGE_SIZE = 1000
+
+
+class CacheCollector(Collector):
+    """
+    Size gauges read from the registered caches at scrape time, the hit, miss
+    and eviction counters are updated by the caches themselves.
+    """
+
+    def collect(self):
+        entries = GaugeMetricFamily('cache_entries', 'Entries held by the cache', labels=('cache',))
+        max_entries = GaugeMetricFamily('cache_max_entries', 'Entry limit of the cache', labels=('cache',))
+        size = GaugeMetricFamily('cache_bytes', 'Estimated memory held by cache entries', labels=('cache',))
+        for name, cache in CACHES.items():
+            entries.add_metric((name,), len(cache))
+            max_entries.add_metric((name,), cache.max_entries)
+            size.add_metric((name,), cache.estimated_bytes())
+        yield entries
+        yield max_entries
+        yield size
+
+
+REGISTRY.register(CacheCollector())
+
+
+def describe(cache: BoundedMemoryCache) -> Dict[str, Any]:
+    return {**cache.stats(), 'estimated_bytes': cache.estimated_bytes()}
+
+
+def list_keys(cache: BoundedMemoryCache, offset: int = 0, limit: int = 100, sample: bool = False) -> Dict[str, Any]:
+    """
+    One bounded page of keys with their remaining ttl, or a random sample of
+    them, so a large cache is never copied as a whole.
+    """
+    limit = max(0, min(limit, MAX_PAGE_SIZE))
+    entries = cache.sample(limit) if sample else cache.entries(max(0, offset), limit)
+    now = time.monotonic()
+    items: List[Dict[str, Any]] = []
+    for key, entry in entries:
+        item = {'key': key}
+        if entry.expires_at is not None:
+            item['ttl'] = round(entry.expires_at - now, 2)
+        items.append(item)
+    return {
+        'name': cache.name,
+        'total': len(cache),
+        'offset': None if sample else offset,
+        'limit': limit,
+        'items': items,
+    }
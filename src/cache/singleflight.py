@@ -0,0 +1,93 @@
+import asyncio
+from typing import Any, Dict, Hashable, Optional, Set
+
+from aiocache import cached
+
+from src import metrics
+
+
+class coalesced(cached):
+    """
+    ``aiocache.cached`` with single-flight loading: concurrent misses for the
+    same key await one in-flight call instead of each hitting the database.
+
+    With ``refresh_ahead`` set, a hit whose remaining TTL is below that many
+    seconds is returned as is while one background call refreshes the entry.
+    """
+
+    def __init__(self, *args: Any, refresh_ahead: Optional[float] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.refresh_ahead = refresh_ahead
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._refreshing: Set[asyncio.Task] = set()
+
+    def __call__(self, f):
+        wrapper = super().__call__(f)
+        name = getattr(self.cache, 'name', self.alias or f.__qualname__)
+        self._coalesced_metric = metrics.CACHE_COALESCED_WAITS.labels(cache=name)
+        self._refresh_metric = metrics.CACHE_REFRESHES.labels(cache=name)
+        return wrapper
+
+    async def decorator(
+            self, f, *args, cache_read=True, cache_write=True, aiocache_wait_for_write=True, **kwargs
+    ):
+        key = self.get_cache_key(f, args, kwargs)
+
+        if cache_read:
+            value = await self.get_from_cache(key)
+            if value is not None:
+                if self._is_stale(key):
+                    self._refresh(key, f, args, kwargs)
+                return value
+
+        return await self._load(key, f, args, kwargs, cache_write)
+
+    def _is_stale(self, key: Hashable) -> bool:
+        if not self.refresh_ahead or key in self._inflight:
+            return False
+        ttl_remaining = getattr(self.cache, 'ttl_remaining', None)
+        if ttl_remaining is None:
+            return False
+        remaining = ttl_remaining(self.cache.build_key(key, namespace=self.cache.namespace))
+        return remaining is not None and remaining < self.refresh_ahead
+
+    def _refresh(self, key: Hashable, f, args, kwargs) -> None:
+        # the caller's transaction may be gone by the time the refresh runs
+        kwargs = {k: v for k, v in kwargs.items() if k != 'using_db'}
+        task = asyncio.create_task(self._load(key, f, args, kwargs, True))
+        task.add_done_callback(self._on_refreshed)
+        self._refreshing.add(task)
+        self._refresh_metric.inc()
+
+    def _on_refreshed(self, task: asyncio.Task) -> None:
+        self._refreshing.discard(task)
+        if not task.cancelled():
+            task.exception()
+
+    async def _load(self, key: Hashable, f, args, kwargs, cache_write: bool):
+        while (future := self._inflight.get(key)) is not None:
+            self._coalesced_metric.inc()
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await f(*args, **kwargs)
+            if cache_write and not self.skip_cache_func(result):
+                await self.set_in_cache(key, result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
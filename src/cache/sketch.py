@@ -0,0 +1,45 @@
+from typing import Hashable
+
+_DEPTH = 4
+_MAX_COUNT = 15
+_MIX = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+
+class FrequencySketch:
+    """
+    Count-min sketch with saturating 4-bit counters and periodic halving,
+    used as the TinyLFU admission filter of :class:`BoundedMemoryCache`.
+    """
+    __slots__ = ('_width', '_mask', '_table', '_additions', '_sample_size')
+
+    def __init__(self, capacity: int):
+        width = 1 << max(4, max(capacity, 1).bit_length())
+        self._width = width
+        self._mask = width - 1
+        self._table = bytearray(width * _DEPTH)
+        self._additions = 0
+        self._sample_size = 10 * width
+
+    def _indexes(self, key: Hashable):
+        h = (hash(key) * _MIX) & _MASK64
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [((h1 + i * h2) & self._mask) + i * self._width for i in range(_DEPTH)]
+
+    def frequency(self, key: Hashable) -> int:
+        table = self._table
+        return min(table[i] for i in self._indexes(key))
+
+    def increment(self, key: Hashable) -> None:
+        table = self._table
+        for i in self._indexes(key):
+            if table[i] < _MAX_COUNT:
+                table[i] += 1
+
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._reset()
+
+    def _reset(self) -> None:
+        self._table = bytearray(c >> 1 for c in self._table)
+        self._additions //= 2
@@ -1,6 +1,7 @@
 from pathlib import Path
+from typing import Optional, Literal
 
-from pydantic import AmqpDsn, PostgresDsn
+from pydantic import AmqpDsn, PostgresDsn, SecretStr
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -15,6 +16,112 @@ class RabbitMQ(BaseSettings):
     TELEGRAM_MESSAGE_QUEUE: str = 'message'
     TELEGRAM_REPLY_TO_MESSAGE_QUEUE: str = 'reply_to_message'
 
+    # passive declares for queue_messages/queue_consumers, None turns the poll off
+    QUEUE_DEPTH_INTERVAL: Optional[float] = 15.0
+
+
+class Cache(BaseSettings):
+    TTL: int = 300
+    MAX_ENTRIES: int = 100_000
+    MAX_BYTES: Optional[int] = None
+    ADMISSION: str = 'tinylfu'
+    REFRESH_AHEAD: Optional[float] = None
+
+    CHAT_MAX_ENTRIES: Optional[int] = None
+    USER_MAX_ENTRIES: Optional[int] = None
+    MESSAGE_MAX_ENTRIES: Optional[int] = 20_000
+
+
+class Buffers(BaseSettings):
+    COUNTERS_FLUSH_INTERVAL: float = 5.0
+    SIGHTINGS_FLUSH_INTERVAL: float = 2.0
+    PROFILES_FLUSH_INTERVAL: float = 10.0
+    PROFILES_MIN_REFRESH_INTERVAL: float = 3600
+    PROFILES_MAX_TRACKED: int = 100_000
+    ROLLUPS_FLUSH_INTERVAL: float = 10.0
+
+
+class Messages(BaseSettings):
+    PARTITIONING: Optional[Literal['day', 'week']] = None
+    PARTITIONS_AHEAD: int = 7
+    RETENTION_DAYS: Optional[int] = None
+    RETENTION_DETACH: bool = False
+    PURGE_BATCH_SIZE: int = 5000
+    MAINTENANCE_INTERVAL: float = 3600
+    SEARCH_TRIGRAM: bool = True
+
+
+class Warmup(BaseSettings):
+    ENABLED: bool = True
+    BUDGET: float = 15.0
+    ACTIVITY_DAYS: float = 1
+    CHATS: int = 5_000
+    USERS: int = 20_000
+    MESSAGES: int = 10_000
+
+
+class Metrics(BaseSettings):
+    STAGE_TIMING: bool = True
+
+    # series kept per chat/user counter, None keeps one for every chat and user
+    TOP_K: Optional[int] = 50
+    TOP_K_TRACKED: int = 1000
+    TOP_K_WINDOW: Optional[int] = 100_000
+
+    LOOP_MONITOR: bool = True
+    LOOP_LAG_INTERVAL: float = 0.5
+    SLOW_CALLBACK_THRESHOLD: float = 0.1
+    SLOW_CALLBACKS_KEPT: int = 100
+
+
+class Tracing(BaseSettings):
+    ENABLED: bool = True
+    # share of messages traced when the publisher sent no sampling decision
+    SAMPLE_RATE: float = 0.01
+    BUFFER_SIZE: int = 10_000
+    # JSON lines file, spans are only kept in memory without one
+    FILE: Optional[str] = None
+    FLUSH_INTERVAL: float = 1.0
+
+
+class Profiler(BaseSettings):
+    # bearer token of /debug/profile, the endpoint is disabled without one
+    TOKEN: Optional[SecretStr] = None
+    INTERVAL: float = 0.005
+    MAX_SECONDS: float = 60
+
+
+class Reputation(BaseSettings):
+    ENABLED: bool = False
+    # seconds for a score to halve
+    HALF_LIFE: float = 3 * 24 * 3600
+    USER_THRESHOLD: float = 5.0
+    CHAT_THRESHOLD: float = 15.0
+    # distinct reporters needed before a threshold blacklists
+    MIN_REPORTERS: int = 3
+    # most score one reporter adds to one user, chat or code
+    REPORTER_CAP: float = 2.0
+    # seconds of an automatic blacklist entry, 0 for a permanent one
+    BLACKLIST_DURATION: int = 7 * 24 * 3600
+    FLUSH_INTERVAL: float = 30.0
+    MAX_TRACKED: int = 100_000
+
+
+class Database(BaseSettings):
+    POOL_MIN_SIZE: int = 1
+    POOL_MAX_SIZE: int = 10
+
+    # admin and reporting reads, a separate pool on the primary when no replica is set
+    REPLICA_URL: Optional[PostgresDsn] = None
+    REPLICA_POOL_MIN_SIZE: int = 1
+    REPLICA_POOL_MAX_SIZE: int = 5
+
+    # statements per delivery / admin request before a warning, None only measures
+    QUERY_BUDGET: Optional[int] = 8
+    ADMIN_QUERY_BUDGET: Optional[int] = 30
+    # the same statement shape this many times in one scope is reported as a possible N+1
+    REPEATED_QUERY_THRESHOLD: int = 4
+
 
 class Settings(BaseSettings):
     BASE_DIR: Path = _BASE_DIR
@@ -23,7 +130,16 @@ class Settings(BaseSettings):
     APP_VERSION: str = '0.0.1'
 
     POSTGRES_URL: PostgresDsn
+    DB: Database = Database(_env_file=_ENV_FILE, _env_prefix='DB_')
     RABBITMQ: RabbitMQ = RabbitMQ(_env_file=_ENV_FILE, _env_prefix='RABBITMQ_')
+    CACHE: Cache = Cache(_env_file=_ENV_FILE, _env_prefix='CACHE_')
+    BUFFERS: Buffers = Buffers(_env_file=_ENV_FILE, _env_prefix='BUFFERS_')
+    MESSAGES: Messages = Messages(_env_file=_ENV_FILE, _env_prefix='MESSAGES_')
+    WARMUP: Warmup = Warmup(_env_file=_ENV_FILE, _env_prefix='WARMUP_')
+    METRICS: Metrics = Metrics(_env_file=_ENV_FILE, _env_prefix='METRICS_')
+    TRACING: Tracing = Tracing(_env_file=_ENV_FILE, _env_prefix='TRACING_')
+    PROFILER: Profiler = Profiler(_env_file=_ENV_FILE, _env_prefix='PROFILER_')
+    REPUTATION: Reputation = Reputation(_env_file=_ENV_FILE, _env_prefix='REPUTATION_')
 
     model_config = SettingsConfigDict(env_file=_ENV_FILE, extra='ignore')
 
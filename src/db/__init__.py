@@ -1,15 +1,28 @@
 from functools import partial
 
-from typing import Dict
+from typing import Dict, Any
 
 from fastapi import FastAPI
 from starlette.requests import Request
 from starlette.responses import JSONResponse
 from tortoise import Tortoise, connections
+from tortoise.backends.base.config_generator import expand_db_url
 from tortoise.exceptions import IntegrityError
 from tortoise.log import logger
 
 from src.config.settings import settings
+from src.db.routers import REPLICA
+from src.db.partitions import prepare_partitioned_storage, finalize_partitioned_storage
+from src.db.schema import upgrade_schema
+
+
+def connection_config(url: str, min_size: int, max_size: int) -> Dict[str, Any]:
+    config = expand_db_url(url)
+    if config['engine'] == 'tortoise.backends.asyncpg':
+        config['engine'] = 'src.db.engine'
+        config['credentials'].update({'minsize': min_size, 'maxsize': max_size})
+    return config
+
 
 TORTOISE_CONFIG = {
     'connections': {
@@ -24,14 +37,21 @@ TORTOISE_CONFIG = {
         #         'database': settings.POSTGRES_DB,
         #     }
         # }
-        'default': settings.POSTGRES_URL.unicode_string()
+        'default': connection_config(
+            settings.POSTGRES_URL.unicode_string(), settings.DB.POOL_MIN_SIZE, settings.DB.POOL_MAX_SIZE
+        ),
+        REPLICA: connection_config(
+            (settings.DB.REPLICA_URL or settings.POSTGRES_URL).unicode_string(),
+            settings.DB.REPLICA_POOL_MIN_SIZE,
+            settings.DB.REPLICA_POOL_MAX_SIZE
+        ),
     },
     'apps': {
         'telegram': {
             'models': ['src.models.telegram'],
         },
     },
-    # 'routers': ['path.router1', 'path.router2'],
+    'routers': ['src.db.routers.ReplicaRouter'],
     'use_tz': True,
     # 'timezone': settings.TIMEZONE
 }
@@ -63,7 +83,10 @@ async def init_orm(generate_schemas: bool = False, drop_databases: bool = False)
 
     if generate_schemas:
         logger.info("Tortoise-ORM generating schema")
+        await prepare_partitioned_storage(connections.get('default'))
         await Tortoise.generate_schemas()
+        await upgrade_schema()
+        await finalize_partitioned_storage(connections.get('default'))
 
 
 async def close_orm():
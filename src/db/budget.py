@@ -0,0 +1,81 @@
+import collections
+import functools
+import re
+from contextvars import ContextVar, Token
+from typing import Counter, List, Optional, Tuple
+
+from tortoise.log import logger
+
+from src import metrics
+from src.config.settings import settings
+
+_scope: ContextVar[Optional['QueryScope']] = ContextVar('query_scope', default=None)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\$\d+|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(query: str) -> str:
+    """
+    The shape of a statement: literals and parameters replaced by ``?``, value
+    lists collapsed, so the same query with other ids gives the same string.
+    """
+    return _LISTS.sub('(...)', _LITERALS.sub('?', ' '.join(query.split())))
+
+
+class QueryScope:
+    """
+    Counts and times the statements of one delivery or request, reports them
+    on exit and warns about a blown budget or a repeated query shape.
+
+        with QueryScope('on_message', budget=10):
+            ...
+    """
+    __slots__ = ('name', 'budget', 'repeated', 'detail', 'count', 'seconds', 'shapes', '_token')
+
+    def __init__(self, name: str, budget: Optional[int], repeated: Optional[int] = None, detail: Optional[str] = None):
+        self.name = name
+        self.detail = detail
+        self.budget = budget
+        self.repeated = settings.DB.REPEATED_QUERY_THRESHOLD if repeated is None else repeated
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter[str] = collections.Counter()
+        self._token: Optional[Token] = None
+
+    def record(self, query: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[fingerprint(query)] += 1
+
+    def __enter__(self) -> 'QueryScope':
+        self._token = _scope.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        _scope.reset(self._token)
+        metrics.DB_SCOPE_QUERIES.labels(scope=self.name).observe(self.count)
+        metrics.DB_SCOPE_QUERY_SECONDS.labels(scope=self.name).observe(self.seconds)
+
+        if self.budget is not None and self.count > self.budget:
+            metrics.DB_SCOPE_WARNINGS.labels(scope=self.name, reason='budget').inc()
+            logger.warning(
+                '%s ran %s queries in %.3fs, over its budget of %s: %s',
+                self.label, self.count, self.seconds, self.budget, self._describe(self.shapes.most_common(5))
+            )
+        if self.repeated and (repeated := [(shape, n) for shape, n in self.shapes.items() if n >= self.repeated]):
+            metrics.DB_SCOPE_WARNINGS.labels(scope=self.name, reason='repeated').inc()
+            logger.warning('%s repeated query shapes, possible N+1: %s', self.label, self._describe(repeated))
+
+    @property
+    def label(self) -> str:
+        return f'{self.name} {self.detail}' if self.detail else self.name
+
+    @staticmethod
+    def _describe(shapes: List[Tuple[str, int]]) -> str:
+        return '; '.join(f'{n}x {shape[:300]}' for shape, n in shapes)
+
+
+def current_query_scope() -> Optional[QueryScope]:
+    return _scope.get()
@@ -0,0 +1,37 @@
+import asyncio
+
+from src.db.tasks import PeriodicTask, register_task
+
+
+class BufferedWriter(PeriodicTask):
+    """
+    Accumulates writes in memory and flushes them to the database every
+    ``interval`` seconds from a background task, and once more on close.
+    """
+    name: str = 'buffer'
+
+    def __init__(self, interval: float):
+        super().__init__(interval)
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return 0
+
+    async def _flush(self) -> None:
+        raise NotImplementedError
+
+    async def flush(self) -> None:
+        async with self._lock:
+            await self._flush()
+
+    async def run_once(self) -> None:
+        await self.flush()
+
+    async def close(self) -> None:
+        await super().close()
+        await self.flush()
+
+
+def register_writer(writer: BufferedWriter) -> BufferedWriter:
+    register_task(writer)
+    return writer
@@ -0,0 +1,78 @@
+from typing import Any, Dict, List, Sequence, Type
+
+from tortoise import BaseDBAsyncClient, Model
+
+# stays well below the bind parameter limits of PostgreSQL and SQLite
+MAX_PARAMETERS = 30_000
+
+
+async def insert_ignore_returning(
+        connection: BaseDBAsyncClient,
+        model: Type[Model],
+        instances: Sequence[Model],
+        returning: Sequence[str],
+        include_pk: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Multi-row ``INSERT ... ON CONFLICT DO NOTHING RETURNING ...``, one statement
+    per chunk. Only the rows that were actually inserted come back.
+    """
+    if not instances:
+        return []
+
+    executor = connection.executor_class(model=model, db=connection)
+    fields, columns = executor._prepare_insert_columns(include_generated=include_pk)
+    returning_sql = ', '.join(f'"{model._meta.fields_db_projection[field]}"' for field in returning)
+    rows_per_statement = max(1, MAX_PARAMETERS // len(fields))
+
+    inserted = []
+    for start in range(0, len(instances), rows_per_statement):
+        query = connection.query_class.into(model._meta.basetable).columns(*columns)
+        values: List[Any] = []
+        for instance in instances[start:start + rows_per_statement]:
+            query = query.insert(*[executor.parameter(len(values) + i) for i in range(len(fields))])
+            values.extend(
+                executor._field_to_db(model._meta.fields_map[field], getattr(instance, field), instance)
+                for field in fields
+            )
+        query = query.on_conflict().do_nothing()
+        _, rows = await connection.execute_query(f'{query.get_sql()} RETURNING {returning_sql}', values)
+        inserted.extend(dict(row) for row in rows)
+    return inserted
+
+
+async def upsert(
+        connection: BaseDBAsyncClient,
+        model: Type[Model],
+        rows: Sequence[Dict[str, Any]],
+        conflict: Sequence[str],
+        update: Dict[str, str]
+) -> None:
+    """
+    Multi-row ``INSERT ... ON CONFLICT (...) DO UPDATE``, one statement per
+    chunk. ``update`` maps a field to the SQL expression it is set to, with
+    ``EXCLUDED`` as the row that was not inserted.
+    """
+    if not rows:
+        return
+
+    executor = connection.executor_class(model=model, db=connection)
+    fields = list(rows[0])
+    projection = model._meta.fields_db_projection
+    columns_sql = ', '.join(f'"{projection[field]}"' for field in fields)
+    conflict_sql = ', '.join(f'"{projection[field]}"' for field in conflict)
+    update_sql = ', '.join(f'"{projection[field]}" = {expression}' for field, expression in update.items())
+    rows_per_statement = max(1, MAX_PARAMETERS // len(fields))
+
+    for start in range(0, len(rows), rows_per_statement):
+        groups: List[str] = []
+        values: List[Any] = []
+        for row in rows[start:start + rows_per_statement]:
+            parameters = [executor.parameter(len(values) + i).get_sql() for i in range(len(fields))]
+            groups.append(f'({", ".join(parameters)})')
+            values.extend(executor._field_to_db(model._meta.fields_map[field], row[field], model) for field in fields)
+        await connection.execute_query(
+            f'INSERT INTO "{model._meta.db_table}" ({columns_sql}) VALUES {", ".join(groups)} '
+            f'ON CONFLICT ({conflict_sql}) DO UPDATE SET {update_sql}',
+            values
+        )
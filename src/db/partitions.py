@@ -0,0 +1,184 @@
+import datetime
+import re
+from typing import List, Optional, Tuple
+
+from tortoise import BaseDBAsyncClient
+from tortoise.exceptions import IntegrityError
+from tortoise.log import logger
+from tortoise.transactions import in_transaction
+
+from src.config.settings import settings
+from src.db.schema import dialect_of
+
+MESSAGE_TABLE = 'telegram_message'
+DEFAULT_PARTITION = f'{MESSAGE_TABLE}_default'
+
+# Same columns as the model's generated table. The partition key has to be part of
+# every unique constraint, and nothing can reference a partitioned table by "id" alone,
+# so "reply_to_message_id" is a plain column here.
+#
+# Messages are therefore unique by (chat_id, message_id, date), not (chat_id, message_id):
+# a redelivery is ignored by ON CONFLICT DO NOTHING only when it carries the same date.
+# Telegram keeps "date" as the send time (edits set "edit_date"), so that holds for
+# redeliveries and edits; a client reporting another date for a known message stores
+# a second row.
+PARTITIONED_MESSAGE_TABLE_SQL = f'''
+CREATE TABLE IF NOT EXISTS "{MESSAGE_TABLE}" (
+    "id" SERIAL NOT NULL,
+    "message_id" BIGINT NOT NULL,
+    "date" TIMESTAMPTZ NOT NULL,
+    "text" VARCHAR(4096),
+    "caption" VARCHAR(4096),
+    "empty" BOOL,
+    "chat_id" BIGINT NOT NULL,
+    "from_user_id" BIGINT,
+    "reply_to_message_id" INT,
+    PRIMARY KEY ("id", "date"),
+    CONSTRAINT "uid_{MESSAGE_TABLE}_chat_id_message_id_date" UNIQUE ("chat_id", "message_id", "date")
+) PARTITION BY RANGE ("date");
+CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF "{MESSAGE_TABLE}" DEFAULT;
+'''
+
+# added once the referenced tables exist
+FOREIGN_KEYS = [
+    (f'fk_{MESSAGE_TABLE}_chat_id', 'chat_id', 'telegram_chat'),
+    (f'fk_{MESSAGE_TABLE}_from_user_id', 'from_user_id', 'telegram_user'),
+]
+
+_PARTITION_NAME = re.compile(rf'^{MESSAGE_TABLE}_p(\d{{8}})$')
+
+
+def period_start(day: datetime.date, partitioning: str) -> datetime.date:
+    if partitioning == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    return day
+
+
+def period_end(start: datetime.date, partitioning: str) -> datetime.date:
+    return start + datetime.timedelta(days=7 if partitioning == 'week' else 1)
+
+
+def partition_name(start: datetime.date) -> str:
+    return f'{MESSAGE_TABLE}_p{start:%Y%m%d}'
+
+
+async def table_kind(connection: BaseDBAsyncClient, table: str) -> Optional[str]:
+    _, rows = await connection.execute_query(
+        'SELECT c.relkind::text AS kind FROM pg_class c WHERE c.oid = to_regclass($1)', [table]
+    )
+    return rows[0]['kind'] if rows else None
+
+
+async def is_partitioned(connection: BaseDBAsyncClient) -> bool:
+    if dialect_of(connection) != 'postgres':
+        return False
+    return await table_kind(connection, MESSAGE_TABLE) == 'p'
+
+
+async def create_partitioned_table(connection: BaseDBAsyncClient) -> None:
+    kind = await table_kind(connection, MESSAGE_TABLE)
+    if kind == 'p':
+        return
+    if kind is not None:
+        logger.warning(
+            'Table "%s" exists and is not partitioned, it has to be migrated manually; '
+            'retention falls back to batched deletes', MESSAGE_TABLE
+        )
+        return
+    logger.info('Creating partitioned table "%s"', MESSAGE_TABLE)
+    await connection.execute_script(PARTITIONED_MESSAGE_TABLE_SQL)
+
+
+async def add_foreign_keys(connection: BaseDBAsyncClient) -> None:
+    for name, column, referenced in FOREIGN_KEYS:
+        await connection.execute_script(f'''
+DO $$ BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = '{name}') THEN
+        ALTER TABLE "{MESSAGE_TABLE}" ADD CONSTRAINT "{name}"
+            FOREIGN KEY ("{column}") REFERENCES "{referenced}" ("id") ON DELETE CASCADE;
+    END IF;
+END $$;
+''')
+
+
+async def list_partitions(connection: BaseDBAsyncClient) -> List[Tuple[str, datetime.date]]:
+    _, rows = await connection.execute_query(
+        'SELECT c.relname AS name FROM pg_inherits i '
+        'JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = to_regclass($1)', [MESSAGE_TABLE]
+    )
+    partitions = []
+    for row in rows:
+        if match := _PARTITION_NAME.match(row['name']):
+            partitions.append((row['name'], datetime.datetime.strptime(match.group(1), '%Y%m%d').date()))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+async def create_partition(
+        connection: BaseDBAsyncClient, name: str, start: datetime.date, end: datetime.date
+) -> None:
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    try:
+        await connection.execute_script(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{MESSAGE_TABLE}" FOR VALUES {bounds}'
+        )
+    except IntegrityError:
+        # rows for this range already landed in the default partition, move them over
+        logger.warning('Moving rows of "%s" out of the default partition', name)
+        default = DEFAULT_PARTITION
+        condition = f"\"date\" >= '{start.isoformat()}' AND \"date\" < '{end.isoformat()}'"
+        async with in_transaction(connection.connection_name) as transaction:
+            await transaction.execute_script(f'''
+ALTER TABLE "{MESSAGE_TABLE}" DETACH PARTITION "{default}";
+CREATE TABLE "{name}" PARTITION OF "{MESSAGE_TABLE}" FOR VALUES {bounds};
+INSERT INTO "{name}" SELECT * FROM "{default}" WHERE {condition};
+DELETE FROM "{default}" WHERE {condition};
+ALTER TABLE "{MESSAGE_TABLE}" ATTACH PARTITION "{default}" DEFAULT;
+''')
+
+
+async def ensure_partitions(
+        connection: BaseDBAsyncClient, partitioning: str, ahead: int, today: Optional[datetime.date] = None
+) -> List[str]:
+    existing = {name for name, _ in await list_partitions(connection)}
+    start = period_start(today or datetime.datetime.now(datetime.timezone.utc).date(), partitioning)
+
+    created = []
+    for _ in range(ahead + 1):
+        end = period_end(start, partitioning)
+        name = partition_name(start)
+        if name not in existing:
+            await create_partition(connection, name, start, end)
+            created.append(name)
+        start = end
+
+    if created:
+        logger.info('Created message partitions %s', created)
+    return created
+
+
+async def expired_partitions(
+        connection: BaseDBAsyncClient, partitioning: str, cutoff: datetime.date
+) -> List[str]:
+    return [
+        name for name, start in await list_partitions(connection)
+        if period_end(start, partitioning) <= cutoff
+    ]
+
+
+async def remove_partition(connection: BaseDBAsyncClient, name: str, detach: bool = False) -> None:
+    if detach:
+        await connection.execute_script(f'ALTER TABLE "{MESSAGE_TABLE}" DETACH PARTITION "{name}"')
+    else:
+        await connection.execute_script(f'DROP TABLE IF EXISTS "{name}"')
+
+
+async def prepare_partitioned_storage(connection: BaseDBAsyncClient) -> None:
+    if settings.MESSAGES.PARTITIONING and dialect_of(connection) == 'postgres':
+        await create_partitioned_table(connection)
+
+
+async def finalize_partitioned_storage(connection: BaseDBAsyncClient) -> None:
+    if settings.MESSAGES.PARTITIONING and await is_partitioned(connection):
+        await add_foreign_keys(connection)
+        await ensure_partitions(connection, settings.MESSAGES.PARTITIONING, settings.MESSAGES.PARTITIONS_AHEAD)
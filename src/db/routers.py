@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional, Type
+
+from tortoise import Model
+
+REPLICA = 'replica'
+
+_read_connection: ContextVar[Optional[str]] = ContextVar('read_connection', default=None)
+
+
+class ReplicaRouter:
+    """
+    Reads go to the primary unless wrapped in ``read_from_replica``,
+    writes always go to the primary.
+    """
+
+    def db_for_read(self, model: Type[Model]) -> Optional[str]:
+        return _read_connection.get()
+
+    def db_for_write(self, model: Type[Model]) -> Optional[str]:
+        return None
+
+
+@contextmanager
+def read_from_replica(connection_name: str = REPLICA) -> Iterator[None]:
+    token = _read_connection.set(connection_name)
+    try:
+        yield
+    finally:
+        _read_connection.reset(token)
@@ -0,0 +1,112 @@
+from typing import List, Optional, Set, Tuple, Type
+
+from tortoise import BaseDBAsyncClient, Model, connections
+from tortoise.exceptions import OperationalError
+from tortoise.log import logger
+
+from src.config.settings import settings
+from src.models.telegram.search import SEARCH_DOCUMENT, SEARCH_VECTOR, capabilities
+
+# (table, column, column definition) added to tables created by earlier versions,
+# ``Tortoise.generate_schemas`` only creates missing tables.
+COLUMNS: List[Tuple[str, str, str]] = [
+    ('telegram_chat', 'messages_count', 'INT NOT NULL DEFAULT 0'),
+    ('telegram_user', 'messages_count', 'INT NOT NULL DEFAULT 0'),
+]
+
+# (index name, table, columns)
+INDEXES: List[Tuple[str, str, Tuple[str, ...]]] = [
+    # admin keyset pagination orders by date with id as the tiebreak
+    ('idx_telegram_message_date_id', 'telegram_message', ('date', 'id')),
+    # admin filters by chat or sender within a date window
+    ('idx_telegram_message_chat_date', 'telegram_message', ('chat_id', 'date')),
+    ('idx_telegram_message_from_user_date', 'telegram_message', ('from_user_id', 'date')),
+    # retention prunes sightings by age
+    ('idx_cryptobox_sighting_seen_at', 'cryptobox_sighting', ('seen_at',)),
+]
+
+# (index name, table, index definition, required extension), PostgreSQL only
+POSTGRES_INDEXES: List[Tuple[str, str, str, Optional[str]]] = [
+    ('idx_telegram_message_search_vector', 'telegram_message', f'USING GIN ({SEARCH_VECTOR})', None),
+    (
+        'idx_telegram_message_search_trgm', 'telegram_message',
+        f'USING GIN ({SEARCH_DOCUMENT} gin_trgm_ops)', 'pg_trgm'
+    ),
+    # lookups by code answered from the index alone
+    (
+        'idx_cryptobox_code_seen', 'cryptobox',
+        '("code") INCLUDE ("id", "first_seen_at", "last_seen_at", "sightings_count")', None
+    ),
+]
+
+
+def dialect_of(connection: BaseDBAsyncClient) -> str:
+    return connection.capabilities.dialect
+
+
+def leading_index_columns(model: Type[Model]) -> Set[str]:
+    """
+    Fields some b-tree index of the model's table starts with.
+    """
+    meta = model._meta
+    columns = {meta.pk_attr}
+    columns.update(name for name, field in meta.fields_map.items() if field.index or field.unique)
+    unique_together = meta.unique_together or ()
+    columns.update(fields[0] for fields in unique_together if fields)
+    columns.update(index_columns[0] for _, table, index_columns in INDEXES if table == meta.db_table)
+    return columns
+
+
+async def add_column_if_missing(connection: BaseDBAsyncClient, table: str, column: str, definition: str) -> None:
+    if dialect_of(connection) == 'postgres':
+        await connection.execute_script(
+            f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "{column}" {definition}'
+        )
+        return
+
+    _, rows = await connection.execute_query(f'PRAGMA table_info("{table}")')
+    if column not in {row['name'] for row in rows}:
+        logger.info('Adding column %s.%s', table, column)
+        await connection.execute_script(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {definition}')
+
+
+async def upgrade_schema(connection_name: str = 'default') -> None:
+    connection = connections.get(connection_name)
+    for table, column, definition in COLUMNS:
+        await add_column_if_missing(connection, table, column, definition)
+    for name, table, columns in INDEXES:
+        columns_sql = ', '.join(f'"{column}"' for column in columns)
+        await connection.execute_script(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({columns_sql})')
+
+    if dialect_of(connection) == 'postgres':
+        capabilities.trigram = await create_postgres_indexes(connection)
+
+
+async def create_extension(connection: BaseDBAsyncClient, name: str) -> bool:
+    _, rows = await connection.execute_query(
+        'SELECT installed_version IS NOT NULL AS installed FROM pg_available_extensions WHERE name = $1', [name]
+    )
+    if not rows:
+        return False
+    if not rows[0]['installed']:
+        try:
+            await connection.execute_script(f'CREATE EXTENSION IF NOT EXISTS "{name}"')
+        except OperationalError as e:
+            logger.warning('Extension "%s" was not created: %s', name, e)
+            return False
+    return True
+
+
+async def create_postgres_indexes(connection: BaseDBAsyncClient) -> bool:
+    """
+    Returns whether trigram search is available.
+    """
+    trigram = settings.MESSAGES.SEARCH_TRIGRAM and await create_extension(connection, 'pg_trgm')
+    if settings.MESSAGES.SEARCH_TRIGRAM and not trigram:
+        logger.warning('pg_trgm is not available, message search matches whole words only')
+
+    for name, table, definition, extension in POSTGRES_INDEXES:
+        if extension == 'pg_trgm' and not trigram:
+            continue
+        await connection.execute_script(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" {definition}')
+    return trigram
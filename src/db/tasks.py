@@ -0,0 +1,57 @@
+import asyncio
+from typing import List, Optional
+
+from tortoise.log import logger
+
+
+class PeriodicTask:
+    name: str = 'task'
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> None:
+        raise NotImplementedError
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception('Periodic task "%s" failed', self.name)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f'periodic:{self.name}')
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+periodic_tasks: List[PeriodicTask] = []
+
+
+def register_task(task: PeriodicTask) -> PeriodicTask:
+    periodic_tasks.append(task)
+    return task
+
+
+def start_tasks() -> None:
+    for task in periodic_tasks:
+        task.start()
+
+
+async def close_tasks() -> None:
+    for task in periodic_tasks:
+        try:
+            await task.close()
+        except Exception:
+            logger.exception('Closing periodic task "%s" failed', task.name)
@@ -0,0 +1,171 @@
+import asyncio
+import collections
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Deque, Dict, List, Optional
+
+from tortoise.log import logger
+
+from src import metrics
+from src.config.settings import settings
+from src.db.tasks import PeriodicTask, register_task
+
+
+def callback_name(handle: asyncio.Handle) -> str:
+    callback = getattr(handle, '_callback', None)
+    owner = getattr(callback, '__self__', None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        return f'{owner.get_name()}:{getattr(coro, "__qualname__", coro)}'
+    if isinstance(owner, asyncio.Future):
+        return f'{type(owner).__name__} callback'
+    return getattr(callback, '__qualname__', repr(callback))
+
+
+def stack_name(stack: List[str]) -> str:
+    # innermost frame of a format_stack() sample: '  File "x.py", line 1, in func\n ...'
+    location = stack[-1].strip().splitlines()[0]
+    return location.replace('File ', '', 1)
+
+
+class LoopMonitor(PeriodicTask):
+    """
+    Measures how late the loop wakes up a sleeping task and times every
+    callback the loop runs. A callback over ``threshold`` is kept with its
+    name and, while it still runs, a stack sample taken from a watchdog thread.
+
+    Loops that don't run callbacks through ``asyncio.Handle`` (uvloop) can't be
+    timed per callback; there a heartbeat timer every ``threshold / 2`` that
+    fires ``threshold`` late marks a stall, named by the frame it was sampled in.
+    """
+    name = 'loop_monitor'
+
+    def __init__(self, interval: float, threshold: float, kept: int):
+        super().__init__(interval)
+        self.threshold = threshold
+        self.slow_callbacks: Deque[Dict[str, Any]] = collections.deque(maxlen=kept)
+        self.last_lag: Optional[float] = None
+        self.max_lag = 0.0
+        self.mode: Optional[str] = None
+
+        self._original_run = None
+        self._heartbeat: Optional[asyncio.TimerHandle] = None
+        self._loop_thread: Optional[int] = None
+        self._current: Optional[asyncio.Handle] = None
+        self._busy_since: Optional[float] = None
+        self._current_stack: Optional[List[str]] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._install(loop)
+        try:
+            while True:
+                started = loop.time()
+                await asyncio.sleep(self.interval)
+                self.last_lag = max(0.0, loop.time() - started - self.interval)
+                self.max_lag = max(self.max_lag, self.last_lag)
+                metrics.EVENT_LOOP_LAG_SECONDS.observe(self.last_lag)
+        finally:
+            self._uninstall()
+
+    def _install(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._watchdog is not None:
+            return
+        if isinstance(loop, asyncio.BaseEventLoop):
+            self._patch_handles()
+            self.mode = 'callbacks'
+        else:
+            logger.info('%s does not run asyncio handles, timing stalls with a heartbeat', type(loop).__name__)
+            self._beat(loop)
+            self.mode = 'heartbeat'
+
+        self._loop_thread = threading.get_ident()
+        self._stopped.clear()
+        self._watchdog = threading.Thread(target=self._watch, name='loop-monitor-watchdog', daemon=True)
+        self._watchdog.start()
+
+    def _patch_handles(self) -> None:
+        monitor, original_run = self, asyncio.Handle._run
+
+        def _run(handle: asyncio.Handle) -> None:
+            # nested loops (e.g. a sync call into another loop) are not timed
+            if monitor._current is not None:
+                return original_run(handle)
+            started = time.perf_counter()
+            monitor._current, monitor._busy_since = handle, started
+            try:
+                return original_run(handle)
+            finally:
+                duration = time.perf_counter() - started
+                stack, monitor._current, monitor._current_stack = monitor._current_stack, None, None
+                monitor._busy_since = None
+                if duration >= monitor.threshold:
+                    monitor._record(callback_name(handle), duration, stack)
+
+        self._original_run = original_run
+        asyncio.Handle._run = _run
+
+    def _beat(self, loop: asyncio.AbstractEventLoop) -> None:
+        period = self.threshold / 2
+        now = time.perf_counter()
+        if self._busy_since is not None and (late := now - self._busy_since) >= self.threshold:
+            stack = self._current_stack
+            self._record(stack_name(stack) if stack else 'unknown', late, stack)
+        # due again in one period, the watchdog samples the loop once it is a threshold late
+        self._busy_since, self._current_stack = now + period, None
+        self._heartbeat = loop.call_later(period, self._beat, loop)
+
+    def _uninstall(self) -> None:
+        if self._watchdog is None:
+            return
+        if self._original_run is not None:
+            asyncio.Handle._run = self._original_run
+            self._original_run = None
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        self._busy_since = None
+        self._watchdog = None
+        self._stopped.set()
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.threshold / 2):
+            since = self._busy_since
+            if since is None or self._current_stack is not None or time.perf_counter() - since < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None and self._busy_since == since:
+                self._current_stack = traceback.format_stack(frame)
+
+    def _record(self, name: str, duration: float, stack: Optional[List[str]]) -> None:
+        metrics.EVENT_LOOP_SLOW_CALLBACKS.inc()
+        self.slow_callbacks.append({
+            'name': name,
+            'duration': round(duration, 4),
+            'at': time.time(),
+            'stack': stack,
+        })
+        logger.warning('Event loop blocked for %.3fs by %s', duration, name)
+
+    def report(self, limit: int = 20) -> Dict[str, Any]:
+        return {
+            'interval': self.interval,
+            'mode': self.mode,
+            'threshold': self.threshold,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+            'slow_callbacks': list(self.slow_callbacks)[-limit:][::-1],
+        }
+
+
+loop_monitor = LoopMonitor(
+    interval=settings.METRICS.LOOP_LAG_INTERVAL,
+    threshold=settings.METRICS.SLOW_CALLBACK_THRESHOLD,
+    kept=settings.METRICS.SLOW_CALLBACKS_KEPT
+)
+if settings.METRICS.LOOP_MONITOR:
+    register_task(loop_monitor)
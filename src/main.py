@@ -1,12 +1,25 @@
+import asyncio
+import hmac
 from contextlib import asynccontextmanager
+from typing import Literal, Optional
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from prometheus_fastapi_instrumentator import Instrumentator
 
+from src import metrics, tracing
+from src.cache import CACHES
+from src.cache.introspection import MAX_PAGE_SIZE, describe, list_keys
 from src.config.logs import configure_logging
 from src.config.settings import settings
 from src.adapters.rabbitmq.broker import broker
 from src.db import init_orm, close_orm
+from src.db.tasks import start_tasks, close_tasks
+from src.loop_monitor import loop_monitor
+from src.profiler import SamplingProfiler
+from src.services.telegram.retention import message_storage_maintenance  # noqa: registers the periodic task
+from src.services.telegram.warmup import cache_warmup
 from src.admin import register_admin_app
 
 
@@ -15,11 +28,20 @@ async def fastapi_lifespan(app: FastAPI):
     register_admin_app(app)
 
     await init_orm(generate_schemas=True, drop_databases=False)
+    start_tasks()
+    if settings.WARMUP.ENABLED:
+        warmup = asyncio.create_task(cache_warmup.run(settings.WARMUP.BUDGET))
+    else:
+        warmup = None
+        cache_warmup.skip()
     await broker.start()
 
     yield
 
+    if warmup is not None:
+        warmup.cancel()
     await broker.close()
+    await close_tasks()
     await close_orm()
 
 
@@ -32,9 +54,83 @@ app = FastAPI(
 Instrumentator().instrument(app).expose(app)
 
 
+def profiler_auth(credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))):
+    token = settings.PROFILER.TOKEN
+    if token is None:
+        raise HTTPException(status_code=404)
+    if credentials is None or not hmac.compare_digest(credentials.credentials, token.get_secret_value()):
+        raise HTTPException(status_code=401, headers={'WWW-Authenticate': 'Bearer'})
+
+
 @app.get('/healthcheck')
-async def healthcheck():
-    return 'ok'
+async def healthcheck(response: Response):
+    if not cache_warmup.ready:
+        response.status_code = 503
+    return {'status': 'ok' if cache_warmup.ready else 'warming_up', 'warmup': cache_warmup.progress()}
+
+
+@app.get('/caches')
+async def caches():
+    return [describe(cache) for cache in CACHES.values()]
+
+
+@app.get('/caches/{name}/keys', dependencies=[Depends(profiler_auth)])
+async def cache_keys(
+        name: str, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), sample: bool = False
+):
+    if (cache := CACHES.get(name)) is None:
+        raise HTTPException(status_code=404, detail=f'Unknown cache "{name}"')
+    return list_keys(cache, offset=offset, limit=limit, sample=sample)
+
+
+@app.get('/loop', dependencies=[Depends(profiler_auth)])
+async def loop(limit: int = Query(20, ge=1, le=settings.METRICS.SLOW_CALLBACKS_KEPT)):
+    return loop_monitor.report(limit)
+
+
+profile_lock = asyncio.Lock()
+
+
+@app.get('/debug/profile', dependencies=[Depends(profiler_auth)])
+async def profile(
+        seconds: float = Query(10, gt=0, le=settings.PROFILER.MAX_SECONDS),
+        handlers: bool = False,
+        format: Literal['collapsed', 'json'] = 'collapsed'
+):
+    """
+    Samples the event loop for ``seconds``, ``handlers=true`` keeps only the
+    stacks that pass through the rabbitmq handlers.
+    """
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail='A profile is already running')
+    async with profile_lock:
+        profiler = await SamplingProfiler(settings.PROFILER.INTERVAL, only_handlers=handlers).run(seconds)
+
+    if format == 'json':
+        return profiler.summary()
+    return PlainTextResponse(
+        profiler.collapsed(), headers={'Content-Disposition': 'attachment; filename="profile.folded"'}
+    )
+
+
+@app.get('/traces', dependencies=[Depends(profiler_auth)])
+async def traces(limit: int = Query(20, ge=1, le=1000)):
+    return tracing.exporter.traces(limit)
+
+
+@app.get('/traces/{trace_id}', dependencies=[Depends(profiler_auth)])
+async def trace(trace_id: str):
+    if not (spans := tracing.exporter.trace(trace_id)):
+        raise HTTPException(status_code=404, detail=f'Trace "{trace_id}" is not buffered')
+    return spans
+
+
+@app.get('/metrics/sources')
+async def metrics_sources(limit: int = Query(100, ge=1, le=settings.METRICS.TOP_K_TRACKED), key: Optional[str] = None):
+    """
+    Per chat/user detail of the counters that export only their top sources.
+    """
+    return {name: counter.top(limit, key) for name, counter in metrics.TOP_K_COUNTERS.items()}
 
 
 configure_logging(20)
@@ -1,32 +1,202 @@
-from prometheus_client import Counter
+from prometheus_client import Counter, Gauge, Histogram
 
-TELEGRAM_MESSAGES_TOTAL = Counter(
+from src.config.settings import settings
+from src.topk import TopKCounter
+
+
+def _top_k(counter: Counter, key: str) -> TopKCounter:
+    counter = TopKCounter(
+        counter, key, k=settings.METRICS.TOP_K, tracked=settings.METRICS.TOP_K_TRACKED,
+        window=settings.METRICS.TOP_K_WINDOW
+    )
+    TOP_K_COUNTERS[counter.name] = counter
+    return counter
+
+
+# per chat/user counters, see /metrics/sources for the tracked keys
+TOP_K_COUNTERS = {}
+
+TELEGRAM_MESSAGES_TOTAL = _top_k(Counter(
     'telegram_messages_total',
     'Total count of consuming telegram messages ',
     labelnames=('chat_id', 'title',)
-)
+), 'chat_id')
 
 TELEGRAM_REPLIES_TO_MESSAGE_TOTAL = Counter(
     'telegram_replies_to_message',
     'Count of telegram messages with replies'
 )
 
-TELEGRAM_MESSAGES_WITH_CRYPTOBOX = Counter(
+TELEGRAM_MESSAGES_WITH_CRYPTOBOX = _top_k(Counter(
     'telegram_messages_with_cryptobox',
     'Count of consuming telegram messages with cryptoboxes',
     labelnames=('chat_id', 'title', )
-)
+), 'chat_id')
 
-TELEGRAM_RESTRICTED_CHAT_MESSAGES = Counter(
+TELEGRAM_RESTRICTED_CHAT_MESSAGES = _top_k(Counter(
     'telegram_restricted_chat_messages',
     'Consumed messages from restricted chat source',
     labelnames=('chat_id', 'chat_title')
-)
+), 'chat_id')
 
-TELEGRAM_RESTRICTED_USER_MESSAGES = Counter(
+TELEGRAM_RESTRICTED_USER_MESSAGES = _top_k(Counter(
     'telegram_restricted_user_messages',
     'Consumed messages from restricted user source',
     labelnames=('user_id', 'user_username')
+), 'user_id')
+
+CACHE_REQUESTS = Counter(
+    'cache_requests',
+    'Cache lookups by result',
+    labelnames=('cache', 'result')
+)
+
+CACHE_EVICTIONS = Counter(
+    'cache_evictions',
+    'Entries removed from cache or refused by admission policy',
+    labelnames=('cache', 'reason')
+)
+
+CACHE_COALESCED_WAITS = Counter(
+    'cache_coalesced_waits',
+    'Cache misses that awaited an in-flight load of the same key',
+    labelnames=('cache',)
+)
+
+CACHE_REFRESHES = Counter(
+    'cache_refreshes',
+    'Background refreshes of cache entries close to expiry',
+    labelnames=('cache',)
+)
+
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections',
+    'Database pool connections by state',
+    labelnames=('connection', 'state')
+)
+
+DB_POOL_WAITING = Gauge(
+    'db_pool_waiting',
+    'Tasks waiting to acquire a database connection',
+    labelnames=('connection',)
+)
+
+DB_POOL_ACQUIRE_SECONDS = Histogram(
+    'db_pool_acquire_seconds',
+    'Time spent waiting for a database connection from the pool',
+    labelnames=('connection',),
+    buckets=(.0005, .001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
 )
 
+UOW_FLUSH_SECONDS = Histogram(
+    'uow_flush_seconds',
+    'Time to write and commit one message unit of work',
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+)
+
+UOW_FLUSH_STATEMENTS = Histogram(
+    'uow_flush_statements',
+    'Statements executed by one message unit of work flush',
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16)
+)
+
+HANDLER_STAGE_SECONDS = Histogram(
+    'handler_stage_seconds',
+    'Time spent in each stage of a consumer handler',
+    labelnames=('handler', 'stage'),
+    buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+)
+
+HANDLER_DELIVERY_SECONDS = Histogram(
+    'handler_delivery_seconds',
+    'Time from the AMQP timestamp of a message to its ack',
+    labelnames=('handler',),
+    buckets=(.5, 1, 2, 5, 10, 30, 60, 120, 300, 900)
+)
 
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    'event_loop_lag_seconds',
+    'Delay of the event loop in waking up a sleeping probe task',
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+)
+
+EVENT_LOOP_SLOW_CALLBACKS = Counter(
+    'event_loop_slow_callbacks',
+    'Event loop callbacks that ran longer than the slow callback threshold'
+)
+
+CONSUMER_LAG_SECONDS = Histogram(
+    'consumer_lag_seconds',
+    'Time from the AMQP timestamp of a message to its receipt by the consumer',
+    labelnames=('queue',),
+    buckets=(.5, 1, 2, 5, 10, 30, 60, 120, 300, 900, 3600)
+)
+
+CONSUMER_REDELIVERED = Counter(
+    'consumer_redelivered',
+    'Consumed messages with the redelivered flag set',
+    labelnames=('queue',)
+)
+
+CONSUMER_BODY_BYTES = Histogram(
+    'consumer_body_bytes',
+    'Body size of consumed messages',
+    labelnames=('queue',),
+    buckets=(256, 512, 1024, 2048, 4096, 8192, 16384, 65536, 262144, 1048576)
+)
+
+CONSUMER_CLIENT_MESSAGES = Counter(
+    'consumer_client_messages',
+    'Consumed messages by publishing telegram client',
+    labelnames=('queue', 'client')
+)
+
+CONSUMER_SETTLED = Counter(
+    'consumer_settled',
+    'Consumed messages by how they were settled',
+    labelnames=('queue', 'outcome')
+)
+
+QUEUE_MESSAGES = Gauge(
+    'queue_messages',
+    'Messages ready in the queue, from the last passive declare',
+    labelnames=('queue',)
+)
+
+QUEUE_CONSUMERS = Gauge(
+    'queue_consumers',
+    'Consumers of the queue, from the last passive declare',
+    labelnames=('queue',)
+)
+
+DB_SCOPE_QUERIES = Histogram(
+    'db_scope_queries',
+    'Statements executed per delivery or admin request',
+    labelnames=('scope',),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+)
+
+DB_SCOPE_QUERY_SECONDS = Histogram(
+    'db_scope_query_seconds',
+    'Time spent in statements per delivery or admin request',
+    labelnames=('scope',),
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+)
+
+DB_SCOPE_WARNINGS = Counter(
+    'db_scope_warnings',
+    'Deliveries or admin requests over their query budget, with repeated query shapes or unindexed filters',
+    labelnames=('scope', 'reason')
+)
+
+REPUTATION_VERDICTS = Counter(
+    'reputation_verdicts',
+    'Reply verdicts scored against the replied-to source',
+    labelnames=('verdict',)
+)
+
+REPUTATION_BLACKLISTED = Counter(
+    'reputation_blacklisted',
+    'Users and chats blacklisted for crossing their reputation threshold',
+    labelnames=('kind',)
+)
@@ -3,3 +3,6 @@ from .chat import TelegramChat
 from .messages import TelegramMessage
 from .blacklist.user import TelegramUserBlacklist
 from .blacklist.chat import TelegramChatBlacklist
+from .cryptobox import Cryptobox, CryptoboxSighting
+from .rollups import ChatHourlyRollup, UserHourlyRollup
+from .reputation import ReputationScore
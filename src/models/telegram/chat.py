@@ -18,6 +18,7 @@ class TelegramChat(Model):
     username: Optional[str] = fields.CharField(255, null=True, unique=True)
     description: Optional[str] = fields.CharField(4096, null=True)
     members_count: Optional[int] = fields.IntField(null=True)
+    messages_count: int = fields.IntField(default=0)
 
     blacklist: fields.ReverseRelation
 
@@ -0,0 +1,36 @@
+import datetime
+
+from tortoise import Model, fields
+
+
+class Cryptobox(Model):
+    code: str = fields.CharField(8, unique=True)
+    # lifetime totals, retention prunes old sightings but leaves these as they are
+    first_seen_at: datetime.datetime = fields.DatetimeField()
+    last_seen_at: datetime.datetime = fields.DatetimeField()
+    sightings_count: int = fields.IntField(default=0)
+
+    sightings: fields.ReverseRelation
+
+    class Meta:
+        table = 'cryptobox'
+        # "latest N codes" is answered from the index alone
+        indexes = (('last_seen_at', 'code'),)
+        ordering = ['-last_seen_at']
+
+
+class CryptoboxSighting(Model):
+    cryptobox: fields.ForeignKeyRelation[Cryptobox] = fields.ForeignKeyField(
+        'telegram.Cryptobox', 'sightings'
+    )
+    # telegram_message may be partitioned, and a partitioned table can not be referenced by "id" alone
+    message: fields.ForeignKeyRelation = fields.ForeignKeyField(
+        'telegram.TelegramMessage', 'cryptobox_sightings', db_constraint=False
+    )
+    chat_id: int = fields.BigIntField()
+    seen_at: datetime.datetime = fields.DatetimeField()
+
+    class Meta:
+        table = 'cryptobox_sighting'
+        unique_together = ('cryptobox_id', 'message_id')
+        ordering = ['seen_at']
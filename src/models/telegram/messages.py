@@ -5,15 +5,37 @@ from tortoise import Model, fields
 from tortoise.expressions import Q
 from tortoise.manager import Manager
 from tortoise.queryset import QuerySet
+from tortoise.timezone import now
+
+from src.config.settings import settings
+from .search import capabilities, search_match, search_rank, code_match
 
 
 class TelegramMessageQueryset(QuerySet):
+    def _is_postgres(self) -> bool:
+        return self._choose_db().capabilities.dialect == 'postgres'
+
     def search(self, q: str) -> Self:
-        return self.filter(Q(
-            text__contains=q,
-            caption__contains=q,
-            join_type='OR'
-        ))
+        if not self._is_postgres():
+            return self.filter(Q(
+                text__contains=q,
+                caption__contains=q,
+                join_type='OR'
+            ))
+        return self.annotate(
+            search_match=search_match(q, trigram=settings.MESSAGES.SEARCH_TRIGRAM and capabilities.trigram)
+        ).filter(search_match=True)
+
+    def ranked_search(self, q: str) -> Self:
+        queryset = self.search(q)
+        if not self._is_postgres():
+            return queryset.order_by('-date')
+        return queryset.annotate(search_rank=search_rank(q)).order_by('-search_rank', '-date')
+
+    def with_code(self, code: str) -> Self:
+        if not self._is_postgres():
+            return self.search(code)
+        return self.annotate(code_match=code_match(code)).filter(code_match=True)
 
     def by_user_id(self, from_user_id: int) -> Self:
         return self.filter(from_user_id=from_user_id)
@@ -21,6 +43,13 @@ class TelegramMessageQueryset(QuerySet):
     def by_chat_id(self, chat_id: int) -> Self:
         return self.filter(chat_id=chat_id)
 
+    def since(self, date: datetime.datetime) -> Self:
+        # bounded by the partition key, so partitioned storage only scans hot partitions
+        return self.filter(date__gte=date)
+
+    def recent(self, days: int) -> Self:
+        return self.since(now() - datetime.timedelta(days=days))
+
 
 class TelegramMessageManager(Manager):
     def get_queryset(self) -> TelegramMessageQueryset:
@@ -38,9 +67,10 @@ class TelegramMessage(Model):
     from_user: fields.ForeignKeyRelation = fields.ForeignKeyField('telegram.TelegramUser', 'messages', null=True)
 
     reply_to_message: fields.ForeignKeyNullableRelation = fields.ForeignKeyField(
-        'telegram.TelegramMessage', 'replies', null=True
+        'telegram.TelegramMessage', 'replies', null=True, on_delete=fields.SET_NULL
     )
     replies: fields.ReverseRelation
+    cryptobox_sightings: fields.ReverseRelation
 
     objects = TelegramMessageManager()
 
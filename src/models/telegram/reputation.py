@@ -0,0 +1,16 @@
+import datetime
+
+from tortoise import Model, fields
+
+
+class ReputationScore(Model):
+    # "user", "chat" or "code", with the id or the code as key
+    kind: str = fields.CharField(8)
+    key: str = fields.CharField(32)
+    # decayed score as of updated_at
+    score: float = fields.FloatField(default=0)
+    updated_at: datetime.datetime = fields.DatetimeField()
+
+    class Meta:
+        table = 'reputation_score'
+        unique_together = ('kind', 'key')
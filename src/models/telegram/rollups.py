@@ -0,0 +1,31 @@
+import datetime
+
+from tortoise import Model, fields
+
+
+class HourlyRollup(Model):
+    hour: datetime.datetime = fields.DatetimeField()
+    # every consumed message, the ones with a cryptobox code, and those dropped for a restricted source
+    messages: int = fields.IntField(default=0)
+    cryptobox_messages: int = fields.IntField(default=0)
+    restricted_messages: int = fields.IntField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+# keyed by plain ids, most consumed messages never store their chat or user
+class ChatHourlyRollup(HourlyRollup):
+    chat_id: int = fields.BigIntField()
+
+    class Meta:
+        table = 'telegram_chat_hourly'
+        unique_together = ('hour', 'chat_id')
+
+
+class UserHourlyRollup(HourlyRollup):
+    user_id: int = fields.BigIntField()
+
+    class Meta:
+        table = 'telegram_user_hourly'
+        unique_together = ('hour', 'user_id')
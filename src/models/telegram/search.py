@@ -0,0 +1,49 @@
+from pypika.terms import ValueWrapper
+from tortoise.expressions import RawSQL
+
+# Index expressions in src.db.schema must match these exactly for the planner to use them.
+SEARCH_CONFIG = 'simple'
+SEARCH_DOCUMENT = "(coalesce(\"text\", '') || ' ' || coalesce(\"caption\", ''))"
+SEARCH_VECTOR = f"to_tsvector('{SEARCH_CONFIG}', {SEARCH_DOCUMENT})"
+
+
+class SearchCapabilities:
+    """
+    What the database offers to message search, detected by src.db.schema when it upgrades the schema.
+    """
+    __slots__ = ('trigram',)
+
+    def __init__(self):
+        self.trigram = True
+
+
+capabilities = SearchCapabilities()
+
+
+def literal(value: str) -> str:
+    return ValueWrapper(value).get_sql()
+
+
+def like_pattern(value: str) -> str:
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return literal(f'%{escaped}%')
+
+
+def search_query(q: str) -> str:
+    return f"websearch_to_tsquery('{SEARCH_CONFIG}', {literal(q)})"
+
+
+def search_match(q: str, trigram: bool = True) -> RawSQL:
+    # tsvector for words, trigram ILIKE keeps the old substring semantics; both are GIN indexed
+    if not trigram:
+        return RawSQL(f'{SEARCH_VECTOR} @@ {search_query(q)}')
+    return RawSQL(f'({SEARCH_VECTOR} @@ {search_query(q)} OR {SEARCH_DOCUMENT} ILIKE {like_pattern(q)})')
+
+
+def search_rank(q: str) -> RawSQL:
+    return RawSQL(f'ts_rank_cd({SEARCH_VECTOR}, {search_query(q)})')
+
+
+def code_match(code: str) -> RawSQL:
+    # whole token only, "AABBCCD1" does not match "XAABBCCD12"
+    return RawSQL(f"{SEARCH_VECTOR} @@ plainto_tsquery('{SEARCH_CONFIG}', {literal(code)})")
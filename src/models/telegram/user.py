@@ -10,6 +10,7 @@ class TelegramUser(Model):
     first_name: Optional[str] = fields.CharField(64, null=True)
     last_name: Optional[str] = fields.CharField(64, null=True)
     bio: Optional[str] = fields.CharField(max_length=512, null=True)
+    messages_count: int = fields.IntField(default=0)
 
     blacklist: fields.ReverseRelation
 
@@ -0,0 +1,107 @@
+import asyncio
+import collections
+import os
+import signal
+import sys
+import threading
+import time
+from types import FrameType
+from typing import Counter, Dict, Optional, Tuple
+
+from src.config.settings import settings
+
+HANDLERS_DIR = settings.BASE_DIR.joinpath('adapters', 'rabbitmq', 'handlers').as_posix()
+_ROOT = settings.BASE_DIR.parent.as_posix()
+
+CodeKey = Tuple[str, str, int]
+
+
+def _label(code: CodeKey) -> str:
+    qualname, filename, line = code
+    if filename.startswith(_ROOT):
+        filename = os.path.relpath(filename, _ROOT)
+    else:
+        filename = os.path.join(*filename.split(os.sep)[-2:])
+    return f'{qualname} ({filename}:{line})'
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of the event loop thread every ``interval`` seconds, each
+    sample is one walk over the current frames.
+
+    When the loop runs in the main thread, samples are taken by a SIGPROF
+    handler every ``interval`` of process CPU time, so idle waits in the
+    selector are left out. Otherwise a separate thread samples wall clock time,
+    which is biased towards the points where the loop releases the GIL.
+    """
+
+    def __init__(self, interval: float, only_handlers: bool = False):
+        self.interval = interval
+        self.only_handlers = only_handlers
+        self.mode: Optional[str] = None
+        self.stacks: Counter[Tuple[CodeKey, ...]] = collections.Counter()
+        self.samples = 0
+        self.duration = 0.0
+
+    def _sample(self, frame: Optional[FrameType]) -> None:
+        self.samples += 1
+        stack = []
+        in_handler = False
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+            in_handler = in_handler or code.co_filename.startswith(HANDLERS_DIR)
+            frame = frame.f_back
+        if self.only_handlers and not in_handler:
+            return
+        self.stacks[tuple(reversed(stack))] += 1
+
+    async def run(self, seconds: float) -> 'SamplingProfiler':
+        started = time.perf_counter()
+        if threading.current_thread() is threading.main_thread() and hasattr(signal, 'setitimer'):
+            self.mode = 'cpu'
+            previous = signal.signal(signal.SIGPROF, lambda signum, frame: self._sample(frame))
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                signal.setitimer(signal.ITIMER_PROF, 0)
+                signal.signal(signal.SIGPROF, previous)
+        else:
+            self.mode = 'wall'
+            await asyncio.get_running_loop().run_in_executor(None, self._run_thread, seconds, threading.get_ident())
+        self.duration = time.perf_counter() - started
+        return self
+
+    def _run_thread(self, seconds: float, thread_id: int) -> None:
+        deadline = time.perf_counter() + seconds
+        while (now := time.perf_counter()) < deadline:
+            self._sample(sys._current_frames().get(thread_id))
+            time.sleep(max(0.0, self.interval - (time.perf_counter() - now)))
+
+    def collapsed(self) -> str:
+        """
+        One ``frame;frame;frame count`` line per stack, the input format of
+        flamegraph.pl, speedscope and most flame graph viewers.
+        """
+        labels: Dict[CodeKey, str] = {}
+        lines = []
+        for stack, count in self.stacks.most_common():
+            frames = [labels.setdefault(code, _label(code)) for code in stack]
+            lines.append(f'{";".join(frames)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, limit: int = 50) -> Dict:
+        own: Counter[str] = collections.Counter()
+        for stack, count in self.stacks.items():
+            if stack:
+                own[_label(stack[-1])] += count
+        return {
+            'mode': self.mode,
+            'duration': round(self.duration, 3),
+            'interval': self.interval,
+            'samples': self.samples,
+            'kept': sum(self.stacks.values()),
+            'top': [{'frame': frame, 'samples': count} for frame, count in own.most_common(limit)],
+        }
@@ -1,4 +1,5 @@
-from typing import List, Optional, Any, Set
+import re
+from typing import List, Optional, Any, Iterable, Dict
 
 
 class BaseProcessor:
@@ -31,25 +32,44 @@ class Executor:
 class StopWordProcessor(BaseProcessor):
     NAME = 'stop word processor'
 
-    def __init__(self, stopwords: Set[str]):
-        self.stopwords = stopwords or set()
+    def __init__(self, stopwords: Iterable[str]):
+        self.stopwords = list(stopwords or [])
+        self._patterns = [(w, re.compile(rf'\b{re.escape(w.lower())}\b')) for w in self.stopwords]
 
     async def process(self, state: str) -> Optional[str]:
         if state and not any(map(lambda w: w.lower() in state.lower(), self.stopwords)):
             return state
 
+    def match(self, state: Optional[str]) -> Optional[str]:
+        """
+        First stop word, in the order given, found as a whole word in ``state``.
+        """
+        if state:
+            lowered = state.lower()
+            return next((w for w, pattern in self._patterns if pattern.search(lowered)), None)
+
+
+# stop word -> verdict of a reply containing it, a reply with several takes the first one
+VERDICTS: Dict[str, str] = {
+    'ban': 'report', 'report': 'report',
+    'fake': 'fake', 'f4ke': 'fake',
+    'invalid': 'invalid', 'wrong': 'invalid',
+    'fuck': 'abuse', 'f4ck': 'abuse',
+    'blad': 'abuse', 'syka': 'abuse', 'suka': 'abuse',
+}
+
 
 class ReplyGuard(Executor):
     processors = [
-        StopWordProcessor({
-            'fake', 'f4ke',
-            'fuck', 'f4ck',
-            'invalid', 'wrong',
-            'ban', 'report',
-            'blad', 'syka', 'suka',
-        })
+        StopWordProcessor(VERDICTS)
     ]
 
+    def verdict(self, text: Optional[str]) -> Optional[str]:
+        for processor in self.processors:
+            if isinstance(processor, StopWordProcessor) and (word := processor.match(text)) is not None:
+                return VERDICTS.get(word, word)
+        return None
+
 
 guard = ReplyGuard()
 
@@ -58,3 +78,6 @@ if __name__ == '__main__':
 
     assert asyncio.run(guard.run('ABCDABCD is fake')) is None, 'stop word not intercepted'
     assert asyncio.run(guard.run('ABCDABCD suka blad')) is None, 'stop word not intercepted'
+    assert guard.verdict('ABCDABCD is F4KE') == 'fake', 'verdict not matched'
+    assert guard.verdict('ABCDABCD banana from the bank') is None, 'stop word matched inside a word'
+    assert guard.verdict('fake, ban him') == 'report', 'verdict not picked by priority'
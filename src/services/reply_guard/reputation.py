@@ -0,0 +1,236 @@
+import datetime
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from tortoise.log import logger
+from tortoise.timezone import now
+from tortoise.transactions import in_transaction
+
+from src import metrics
+from src.config.settings import settings
+from src.db.buffers import BufferedWriter, register_writer
+from src.db.bulk import upsert
+from src.models.telegram import ReputationScore
+from src.services.telegram.chat import telegram_chat_service
+from src.services.telegram.user import telegram_user_service
+
+USER, CHAT, CODE = 'user', 'chat', 'code'
+
+# score added by one reply with the verdict
+VERDICT_WEIGHTS: Dict[str, float] = {'fake': 1.0, 'invalid': 1.0, 'report': 1.5, 'abuse': 0.5}
+
+# a reporter counts once per replied-to message
+MAX_REPORTS_TRACKED = 100_000
+
+REASON = 'Reputation: called out by replies'
+
+Key = Tuple[str, str]
+
+
+class _Score:
+    __slots__ = ('value', 'at', 'reporters', 'flagged')
+
+    def __init__(self, value: float, at: float, flagged: bool = False):
+        self.value = value
+        # unix time the value was decayed to
+        self.at = at
+        # distinct reporters since the table started, up to the number a threshold needs
+        self.reporters: Set[int] = set()
+        self.flagged = flagged
+
+
+class ReputationTable(BufferedWriter):
+    """
+    Decayed scores of the users, chats and codes that replies call out, held
+    in memory and written in one bulk upsert per flush. A user or chat whose
+    score reaches its threshold, called out by at least ``min_reporters``
+    distinct reporters, is blacklisted on the next flush.
+
+    One reporter adds at most ``reporter_cap`` to a score (decaying like the
+    score itself) and counts once per replied-to message. Replies without a
+    sender cannot be told apart and are not scored.
+
+    Stored scores are loaded on the first flush and added to what was scored
+    before it. The least recently scored keys are dropped past ``max_tracked``
+    and start over from zero when scored again.
+    """
+    name = 'reputation'
+
+    def __init__(
+            self, interval: float, half_life: float, thresholds: Dict[str, float], max_tracked: int,
+            min_reporters: int = 1, reporter_cap: float = float('inf')
+    ):
+        super().__init__(interval)
+        self.half_life = half_life
+        self.thresholds = thresholds
+        self.max_tracked = max_tracked
+        self.min_reporters = min_reporters
+        self.reporter_cap = reporter_cap
+        self._scores: OrderedDict[Key, _Score] = OrderedDict()
+        self._dirty: Dict[Key, Tuple[float, float]] = {}
+        self._crossed: Dict[Key, float] = {}
+        self._reports: OrderedDict[Tuple[int, int, int], None] = OrderedDict()
+        # (reporter, kind, key) -> (score added, unix time)
+        self._contributions: OrderedDict[Tuple[int, str, str], Tuple[float, float]] = OrderedDict()
+        self._loaded = False
+
+    def __len__(self) -> int:
+        return len(self._dirty) + len(self._crossed)
+
+    def _decayed(self, score: float, since: float, at: float) -> float:
+        return score * 0.5 ** ((at - since) / self.half_life)
+
+    def score(self, kind: str, key: object) -> float:
+        entry = self._scores.get((kind, str(key)))
+        return self._decayed(entry.value, entry.at, time.time()) if entry else 0.0
+
+    def _check(self, key: Key, entry: _Score, before: float) -> None:
+        threshold = self.thresholds.get(key[0])
+        if threshold is None:
+            return
+        if before < threshold:
+            entry.flagged = False
+        if not entry.flagged and entry.value >= threshold and len(entry.reporters) >= self.min_reporters:
+            entry.flagged = True
+            self._crossed[key] = entry.value
+
+    def _capped(self, reporter_id: int, key: Key, weight: float, at: float) -> float:
+        contribution = (reporter_id, *key)
+        given = 0.0
+        if (previous := self._contributions.pop(contribution, None)) is not None:
+            given = self._decayed(previous[0], previous[1], at)
+        weight = min(weight, self.reporter_cap - given)
+        self._contributions[contribution] = (given + max(weight, 0.0), at)
+        if len(self._contributions) > MAX_REPORTS_TRACKED:
+            self._contributions.popitem(last=False)
+        return weight
+
+    def add(self, kind: str, key: object, weight: float, reporter_id: int, at: Optional[float] = None) -> float:
+        at = time.time() if at is None else at
+        key = (kind, str(key))
+        entry = self._scores.get(key)
+        if (weight := self._capped(reporter_id, key, weight, at)) <= 0:
+            return self._decayed(entry.value, entry.at, at) if entry else 0.0
+
+        if entry is not None:
+            self._scores.move_to_end(key)
+            before = self._decayed(entry.value, entry.at, at)
+        else:
+            entry = self._scores[key] = _Score(0.0, at)
+            before = 0.0
+            if len(self._scores) > self.max_tracked:
+                self._scores.popitem(last=False)
+
+        entry.value, entry.at = before + weight, at
+        if len(entry.reporters) < self.min_reporters:
+            entry.reporters.add(reporter_id)
+        self._dirty[key] = (entry.value, at)
+        self._check(key, entry, before)
+        return entry.value
+
+    def record(
+            self, verdict: str, reporter_id: Optional[int], chat_id: int, message_id: int,
+            user_id: Optional[int], codes: Iterable[str]
+    ) -> bool:
+        """
+        Scores one reply with ``verdict`` to message ``message_id`` of ``user_id``
+        in ``chat_id``, false when it was not counted.
+        """
+        weight = VERDICT_WEIGHTS.get(verdict)
+        if weight is None or reporter_id is None or reporter_id == user_id:
+            return False
+        report = (reporter_id, chat_id, message_id)
+        if report in self._reports:
+            return False
+        self._reports[report] = None
+        if len(self._reports) > MAX_REPORTS_TRACKED:
+            self._reports.popitem(last=False)
+
+        metrics.REPUTATION_VERDICTS.labels(verdict=verdict).inc()
+        if user_id is not None:
+            self.add(USER, user_id, weight, reporter_id)
+        self.add(CHAT, chat_id, weight, reporter_id)
+        for code in set(codes):
+            self.add(CODE, code, weight, reporter_id)
+        return True
+
+    async def _load(self) -> None:
+        cutoff = now() - datetime.timedelta(seconds=self.half_life * 8)
+        rows = await ReputationScore.filter(updated_at__gte=cutoff).order_by('-score').limit(
+            self.max_tracked
+        ).values_list('kind', 'key', 'score', 'updated_at')
+        for kind, key, score, updated_at in rows:
+            if (entry := self._scores.get((kind, key))) is not None:
+                before = entry.value
+                entry.value += self._decayed(score, updated_at.timestamp(), entry.at)
+                # scored below the threshold since the start, the stored score may take it over
+                self._check((kind, key), entry, before)
+            elif len(self._scores) < self.max_tracked:
+                threshold = self.thresholds.get(kind)
+                self._scores[(kind, key)] = _Score(
+                    score, updated_at.timestamp(), flagged=threshold is not None and score >= threshold
+                )
+                self._scores.move_to_end((kind, key), last=False)
+        self._loaded = True
+
+    async def _flush(self) -> None:
+        if not self._loaded:
+            await self._load()
+            # scores merged with the stored ones are what gets written
+            self._dirty = {
+                key: (self._scores[key].value, self._scores[key].at) for key in self._dirty if key in self._scores
+            }
+        if self._dirty:
+            dirty, self._dirty = self._dirty, {}
+            try:
+                await self._write(dirty)
+            except Exception:
+                self._dirty = {**dirty, **self._dirty}
+                raise
+        if self._crossed:
+            crossed, self._crossed = self._crossed, {}
+            try:
+                await self._blacklist(crossed)
+            except Exception:
+                self._crossed = {**crossed, **self._crossed}
+                raise
+
+    @staticmethod
+    async def _write(dirty: Dict[Key, Tuple[float, float]]) -> None:
+        async with in_transaction(connection_name=ReputationScore._choose_db(True).connection_name) as connection:
+            await upsert(
+                connection, ReputationScore,
+                [
+                    {
+                        'kind': kind, 'key': key, 'score': score,
+                        'updated_at': datetime.datetime.fromtimestamp(at, datetime.timezone.utc)
+                    }
+                    for (kind, key), (score, at) in dirty.items()
+                ],
+                conflict=('kind', 'key'),
+                update={'score': 'EXCLUDED."score"', 'updated_at': 'EXCLUDED."updated_at"'}
+            )
+
+    @staticmethod
+    async def _blacklist(crossed: Dict[Key, float]) -> None:
+        duration = settings.REPUTATION.BLACKLIST_DURATION
+        release_at = now() + datetime.timedelta(seconds=duration) if duration else None
+        for kind, service in ((USER, telegram_user_service), (CHAT, telegram_chat_service)):
+            ids = [int(key) for (k, key) in crossed if k == kind]
+            if not ids:
+                continue
+            blacklisted = await service.blacklist_many(ids, reason=REASON, release_at=release_at)
+            metrics.REPUTATION_BLACKLISTED.labels(kind=kind).inc(len(blacklisted))
+            if blacklisted:
+                logger.warning('Blacklisted %s %s by reputation', kind, blacklisted)
+
+
+reputation = register_writer(ReputationTable(
+    settings.REPUTATION.FLUSH_INTERVAL,
+    half_life=settings.REPUTATION.HALF_LIFE,
+    thresholds={USER: settings.REPUTATION.USER_THRESHOLD, CHAT: settings.REPUTATION.CHAT_THRESHOLD},
+    max_tracked=settings.REPUTATION.MAX_TRACKED,
+    min_reporters=settings.REPUTATION.MIN_REPORTERS,
+    reporter_cap=settings.REPUTATION.REPORTER_CAP
+))
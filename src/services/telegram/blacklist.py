@@ -0,0 +1,57 @@
+import datetime
+from typing import Iterable, List, Optional, Type
+
+from tortoise.log import logger
+from tortoise.timezone import now
+from tortoise.transactions import in_transaction
+
+from src.cache import BoundedMemoryCache
+from src.models.telegram.blacklist.base import BlacklistBaseModel
+
+
+async def blacklist_many(
+        model: Type[BlacklistBaseModel], field: str, ids: Iterable[int], cache: BoundedMemoryCache,
+        reason: Optional[str] = None, release_at: Optional[datetime.datetime] = None
+) -> List[int]:
+    """
+    Blacklists every id not restricted yet with one multi-row insert and drops
+    their cached snapshots, returns the ids blacklisted. Ids without a stored
+    chat or user are skipped, one of them would fail the whole insert.
+    """
+    ids = list(dict.fromkeys(ids))
+    meta = model._meta
+    parent = next(
+        meta.fields_map[name].related_model for name in meta.fk_fields if meta.fields_map[name].source_field == field
+    )
+    async with in_transaction(connection_name=model._choose_db(True).connection_name) as connection:
+        stored = set(await parent.filter(id__in=ids).using_db(connection).values_list('id', flat=True))
+        if missing := [id for id in ids if id not in stored]:
+            logger.warning('Not blacklisting %s %s, no stored row', parent.__name__, missing)
+            ids = [id for id in ids if id in stored]
+        restricted = set(await model.objects.get_queryset().using_db(connection).restricted().filter(
+            **{f'{field}__in': ids}
+        ).values_list(field, flat=True))
+        blacklisted = [id for id in ids if id not in restricted]
+        await model.bulk_create(
+            [model(**{field: id}, reason=reason, release_at=release_at) for id in blacklisted], using_db=connection
+        )
+    cache.delete_many(blacklisted)
+    return blacklisted
+
+
+async def amnesty_many(
+        model: Type[BlacklistBaseModel], field: str, ids: Iterable[int], cache: BoundedMemoryCache,
+        amnestied_reason: Optional[str] = None
+) -> List[int]:
+    """
+    Amnesties the active entries of every id with one update and drops their
+    cached snapshots, returns the ids that were restricted.
+    """
+    ids = list(dict.fromkeys(ids))
+    async with in_transaction(connection_name=model._choose_db(True).connection_name) as connection:
+        restricted = model.objects.get_queryset().using_db(connection).restricted().filter(**{f'{field}__in': ids})
+        amnestied = set(await restricted.values_list(field, flat=True))
+        if amnestied:
+            await restricted.update(amnestied_reason=amnestied_reason, amnestied_at=now())
+    cache.delete_many(amnestied)
+    return [id for id in ids if id in amnestied]
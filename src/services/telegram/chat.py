@@ -1,11 +1,9 @@
-import asyncio
 import datetime
 from typing import Any, List, Optional, Type, Union, Tuple, Dict
 
-from aiocache import caches, cached, SimpleMemoryCache
+from aiocache import caches
 from tortoise import BaseDBAsyncClient
 from tortoise.exceptions import DoesNotExist, TransactionManagementError, IntegrityError
-from tortoise.functions import Count
 from tortoise.models import MODEL
 from tortoise.query_utils import Prefetch
 from tortoise.queryset import QuerySet
@@ -13,7 +11,13 @@ from tortoise.signals import post_save, post_delete, Signals
 from tortoise.timezone import now
 from tortoise.transactions import in_transaction
 
+from src.cache import BoundedMemoryCache, bounded_cache_config, coalesced
+from src.config.settings import settings
 from src.models.telegram import TelegramChat, TelegramChatBlacklist
+from src.db.buffers import register_writer
+from src.services.telegram.blacklist import amnesty_many, blacklist_many
+from src.services.telegram.profiles import ProfileRefreshBuffer
+from src.services.telegram.snapshots import TelegramChatSnapshot, CHAT_PROFILE_FIELDS
 
 
 class TelegramChatAlreadyBlacklisted(Exception):
@@ -25,46 +29,32 @@ class TelegramChatIsNotRestricted(Exception):
 
 
 cache_alias = 'telegram_chat'
-caches.add(cache_alias, {
-    'ttl': 300,
-    'cache': "aiocache.SimpleMemoryCache",
-    'serializer': {
-        'class': "aiocache.serializers.NullSerializer"
-    }
-})
+caches.add(cache_alias, bounded_cache_config(cache_alias, max_entries=settings.CACHE.CHAT_MAX_ENTRIES))
 
-cache: SimpleMemoryCache = caches.get(cache_alias)
+cache: BoundedMemoryCache = caches.get(cache_alias)
+
+chat_profiles = register_writer(ProfileRefreshBuffer(
+    TelegramChat,
+    CHAT_PROFILE_FIELDS,
+    interval=settings.BUFFERS.PROFILES_FLUSH_INTERVAL,
+    min_refresh_interval=settings.BUFFERS.PROFILES_MIN_REFRESH_INTERVAL,
+    max_tracked=settings.BUFFERS.PROFILES_MAX_TRACKED,
+    cache=cache
+))
 
 
 async def invalidate_cache(key: Any):
     await cache.delete(key)
 
 
-def get_cache_detail():
-    assert isinstance(cache, SimpleMemoryCache), 'this available only on SimpleMemoryCache'
-    items = []
-    loop_time = asyncio.get_running_loop().time()
-    for cache_key in cache._cache.keys():
-        item = {'key': cache_key}
-        if handler := cache._handlers.get(cache_key):
-            item.update({'ttl': round(handler.when() - loop_time, 2)})
-        items.append(item)
-
-    return {
-        'ttl': cache.ttl,
-        'total': len(items),
-        'items': items
-    }
-
-
 @post_save(TelegramChat, TelegramChatBlacklist)
 async def on_models_save(sender, instance: Union[TelegramChat, TelegramChatBlacklist], created, using_db,
                          update_fields):
-    if not created:
-        if isinstance(instance, TelegramChat):
-            await invalidate_cache(instance.id)
-        elif isinstance(instance, TelegramChatBlacklist):
-            await invalidate_cache(instance.chat_id)
+    # a new blacklist entry restricts the cached chat as well
+    if isinstance(instance, TelegramChatBlacklist):
+        await invalidate_cache(instance.chat_id)
+    elif not created:
+        await invalidate_cache(instance.id)
 
 
 @post_delete(TelegramChat, TelegramChatBlacklist)
@@ -77,16 +67,20 @@ async def on_models_delete(sender, instance: Union[TelegramChat, TelegramChatBla
 
 class TelegramChatService:
     def get_queryset(self) -> QuerySet[TelegramChat]:
-        return TelegramChat.all().annotate(
-            messages_count=Count('messages')
-        ).prefetch_related(Prefetch('blacklist', TelegramChatBlacklist.objects.restricted()))
+        return TelegramChat.all().prefetch_related(
+            Prefetch('blacklist', TelegramChatBlacklist.objects.restricted())
+        )
 
-    @cached(alias=cache_alias, key_builder=lambda f, *args, **kwargs: kwargs.get('id', args[-1]))
-    async def get_by_id(self, id: int, using_db: Optional[BaseDBAsyncClient] = None) -> TelegramChat:
-        return await self.get_queryset().using_db(using_db).get(id=id)
+    @coalesced(
+        alias=cache_alias,
+        key_builder=lambda f, *args, **kwargs: kwargs.get('id', args[-1]),
+        refresh_ahead=settings.CACHE.REFRESH_AHEAD
+    )
+    async def get_by_id(self, id: int, using_db: Optional[BaseDBAsyncClient] = None) -> TelegramChatSnapshot:
+        return TelegramChatSnapshot.from_model(await self.get_queryset().using_db(using_db).get(id=id))
 
-    async def create(self, using_db: Optional[BaseDBAsyncClient] = None, **kwargs: Any) -> TelegramChat:
-        return await TelegramChat.create(using_db=using_db, **kwargs)
+    async def create(self, using_db: Optional[BaseDBAsyncClient] = None, **kwargs: Any) -> TelegramChatSnapshot:
+        return TelegramChatSnapshot.from_model(await TelegramChat.create(using_db=using_db, **kwargs), blacklist=[])
 
     async def update(
             self, chat: TelegramChat, data: Dict, using_db: Optional[BaseDBAsyncClient] = None
@@ -95,19 +89,22 @@ class TelegramChatService:
 
     async def get_or_create(
             self, id: int, defaults: Optional[dict] = None, using_db: Optional[BaseDBAsyncClient] = None
-    ) -> Tuple[TelegramChat, bool]:
+    ) -> Tuple[TelegramChatSnapshot, bool]:
         if not defaults:
             defaults = {}
         db = using_db or TelegramChat._choose_db(True)
         async with in_transaction(connection_name=db.connection_name) as connection:
             try:
-                return await self.get_by_id(id=id, using_db=connection), False
+                chat = await self.get_by_id(id=id, using_db=connection)
             except DoesNotExist:
                 try:
                     defaults.update(dict(id=id))
                     return await self.create(using_db=connection, **defaults), True
                 except (IntegrityError, TransactionManagementError):
-                    return await self.get_by_id(id=id, using_db=connection), False
+                    chat = await self.get_by_id(id=id, using_db=connection)
+        if defaults:
+            chat_profiles.observe(id, defaults, chat.fingerprint)
+        return chat, False
 
     async def add_to_blacklist(
             self, chat_id: int, reason: Optional[str] = None, release_at: Optional[datetime.datetime] = None
@@ -119,7 +116,7 @@ class TelegramChatService:
     async def is_restricted(self, chat_id: int) -> bool:
         try:
             chat = await self.get_by_id(id=chat_id)
-            return len(chat.blacklist) != 0
+            return chat.is_restricted
         except DoesNotExist:
             pass
         return False
@@ -131,14 +128,22 @@ class TelegramChatService:
         if not active_violations:
             raise TelegramChatIsNotRestricted
 
-        amnestied_violations: List[TelegramChatBlacklist] = []
-        for violation in amnestied_violations:
-            await violation.update_from_dict(dict(
-                amnestied_reason=amnestied_reason,
-                amnestied_at=now()
-            )).save()
-            amnestied_violations.append(violation)
-        return amnestied_violations
+        amnestied_at = now()
+        await TelegramChatBlacklist.filter(id__in=[violation.id for violation in active_violations]).update(
+            amnestied_reason=amnestied_reason, amnestied_at=amnestied_at
+        )
+        for violation in active_violations:
+            violation.amnestied_reason, violation.amnestied_at = amnestied_reason, amnestied_at
+        await invalidate_cache(chat_id)
+        return active_violations
+
+    async def blacklist_many(
+            self, chat_ids: List[int], reason: Optional[str] = None, release_at: Optional[datetime.datetime] = None
+    ) -> List[int]:
+        return await blacklist_many(TelegramChatBlacklist, 'chat_id', chat_ids, cache, reason, release_at)
+
+    async def amnesty_many(self, chat_ids: List[int], amnestied_reason: Optional[str] = None) -> List[int]:
+        return await amnesty_many(TelegramChatBlacklist, 'chat_id', chat_ids, cache, amnestied_reason)
 
 
 telegram_chat_service = TelegramChatService()
@@ -159,7 +164,7 @@ telegram_chat_service = TelegramChatService()
 #         chat: TelegramChat = await service.get_by_id(chat_id)
 #         pprint(TelegramChatRetrieveDetail.model_validate(chat).model_dump())
 #
-#         if chat.blacklist:
+#         if chat.is_restricted:
 #             await service.remove_from_blacklist(chat.id, 'test')
 #             print('remove from blacklist')
 #         else:
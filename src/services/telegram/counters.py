@@ -0,0 +1,124 @@
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Type, Union
+
+from tortoise import Model
+from tortoise.expressions import F
+from tortoise.functions import Count
+from tortoise.log import logger
+from tortoise.transactions import in_transaction
+
+from src.config.settings import settings
+from src.db.buffers import BufferedWriter, register_writer
+from src.models.telegram import TelegramChat, TelegramUser, TelegramMessage
+
+
+async def apply_increments(model: Type[Model], increments: Dict[int, int], using_db=None) -> None:
+    # one UPDATE per distinct delta, most deltas within a flush interval are small and repeat
+    by_delta: Dict[int, List[int]] = defaultdict(list)
+    for pk, delta in increments.items():
+        if delta:
+            by_delta[delta].append(pk)
+
+    for delta, pks in by_delta.items():
+        await model.filter(id__in=pks).using_db(using_db).update(messages_count=F('messages_count') + delta)
+
+
+class MessageCountersBuffer(BufferedWriter):
+    name = 'message_counters'
+
+    def __init__(self, interval: float):
+        super().__init__(interval)
+        self._chats: Counter = Counter()
+        self._users: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self._chats) + len(self._users)
+
+    def increment(self, chat_id: Optional[int] = None, user_id: Optional[int] = None) -> None:
+        if chat_id is not None:
+            self._chats[chat_id] += 1
+        if user_id is not None:
+            self._users[user_id] += 1
+
+    def decrement(self, chat_id: Optional[int] = None, user_id: Optional[int] = None) -> None:
+        if chat_id is not None:
+            self._chats[chat_id] -= 1
+        if user_id is not None:
+            self._users[user_id] -= 1
+
+    async def _flush(self) -> None:
+        if not self._chats and not self._users:
+            return
+
+        chats, self._chats = self._chats, Counter()
+        users, self._users = self._users, Counter()
+        try:
+            async with in_transaction(connection_name=TelegramChat._choose_db(True).connection_name) as connection:
+                await apply_increments(TelegramChat, chats, using_db=connection)
+                await apply_increments(TelegramUser, users, using_db=connection)
+        except Exception:
+            self._chats.update(chats)
+            self._users.update(users)
+            raise
+
+
+message_counters = register_writer(MessageCountersBuffer(settings.BUFFERS.COUNTERS_FLUSH_INTERVAL))
+
+
+async def repair_model_counters(
+        model: Union[Type[TelegramChat], Type[TelegramUser]], message_field: str, chunk_size: int
+) -> int:
+    repaired, last_id = 0, None
+    while True:
+        queryset = model.all().order_by('id').limit(chunk_size).only('id', 'messages_count')
+        if last_id is not None:
+            queryset = queryset.filter(id__gt=last_id)
+        entities = await queryset
+        if not entities:
+            return repaired
+
+        ids = [entity.id for entity in entities]
+        counts = dict(
+            await TelegramMessage.filter(**{f'{message_field}__in': ids})
+            .annotate(total=Count('id'))
+            .group_by(message_field)
+            .values_list(message_field, 'total')
+        )
+
+        changed = []
+        for entity in entities:
+            total = counts.get(entity.id, 0)
+            if entity.messages_count != total:
+                entity.messages_count = total
+                changed.append(entity)
+        if changed:
+            await model.bulk_update(changed, fields=['messages_count'])
+
+        repaired += len(changed)
+        last_id = ids[-1]
+
+
+async def repair_message_counters(chunk_size: int = 1000) -> Dict[str, int]:
+    await message_counters.flush()
+    result = {
+        'chats': await repair_model_counters(TelegramChat, 'chat_id', chunk_size),
+        'users': await repair_model_counters(TelegramUser, 'from_user_id', chunk_size),
+    }
+    logger.info('Message counters repaired: %s', result)
+    return result
+
+
+if __name__ == '__main__':
+    import asyncio
+    from src.db import init_orm, close_orm
+
+
+    async def main():
+        await init_orm(generate_schemas=True)
+        try:
+            return await repair_message_counters()
+        finally:
+            await close_orm()
+
+
+    print(asyncio.run(main()))
@@ -0,0 +1,139 @@
+import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tortoise import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+from src.config.settings import settings
+from src.db.buffers import BufferedWriter, register_writer
+from src.db.bulk import insert_ignore_returning
+from src.db.schema import dialect_of
+from src.models.telegram import Cryptobox, CryptoboxSighting
+from src.services.telegram.snapshots import TelegramMessageSnapshot
+
+# adds one flush's new sightings to the counters, work grows with the batch and not the history
+INCREMENT_CRYPTOBOX_SQL = '''
+UPDATE "cryptobox" SET
+    "sightings_count" = "cryptobox"."sightings_count" + batch."n",
+    "first_seen_at" = {least}("cryptobox"."first_seen_at", batch."first_seen_at"),
+    "last_seen_at" = {greatest}("cryptobox"."last_seen_at", batch."last_seen_at")
+FROM ({batch}) AS batch
+WHERE "cryptobox"."id" = batch."id"
+'''
+
+BATCH_COLUMNS = ('id', 'n', 'first_seen_at', 'last_seen_at')
+
+# untyped parameters of a bare SELECT are text to PostgreSQL
+POSTGRES_BATCH_TYPES = ('INT', 'INT', 'TIMESTAMPTZ', 'TIMESTAMPTZ')
+
+
+class CryptoboxSightingsBuffer(BufferedWriter):
+    name = 'cryptobox_sightings'
+
+    def __init__(self, interval: float):
+        super().__init__(interval)
+        # (code, message pk) -> (chat id, seen at)
+        self._sightings: Dict[Tuple[str, int], Tuple[int, datetime.datetime]] = {}
+
+    def __len__(self) -> int:
+        return len(self._sightings)
+
+    def add(self, codes: Iterable[str], message: TelegramMessageSnapshot) -> None:
+        for code in codes:
+            self._sightings[(code, message.id)] = (message.chat_id, message.date)
+
+    async def _flush(self) -> None:
+        if not self._sightings:
+            return
+
+        sightings, self._sightings = self._sightings, {}
+        try:
+            async with in_transaction(connection_name=Cryptobox._choose_db(True).connection_name) as connection:
+                await self._write(sightings, connection)
+        except Exception:
+            self._sightings = {**sightings, **self._sightings}
+            raise
+
+    @staticmethod
+    async def _write(
+            sightings: Dict[Tuple[str, int], Tuple[int, datetime.datetime]], connection: BaseDBAsyncClient
+    ) -> None:
+        seen: Dict[str, List[datetime.datetime]] = {}
+        for (code, _), (_, seen_at) in sightings.items():
+            seen.setdefault(code, []).append(seen_at)
+
+        await Cryptobox.bulk_create(
+            [
+                Cryptobox(code=code, first_seen_at=min(dates), last_seen_at=max(dates))
+                for code, dates in seen.items()
+            ],
+            ignore_conflicts=True,
+            using_db=connection
+        )
+        ids = dict(
+            await Cryptobox.filter(code__in=list(seen)).using_db(connection).values_list('code', 'id')
+        )
+        # only the sightings actually inserted count, a redelivered message is seen once
+        inserted = await insert_ignore_returning(
+            connection, CryptoboxSighting,
+            [
+                CryptoboxSighting(cryptobox_id=ids[code], message_id=message_id, chat_id=chat_id, seen_at=seen_at)
+                for (code, message_id), (chat_id, seen_at) in sightings.items()
+            ],
+            returning=['cryptobox_id', 'message_id']
+        )
+        codes = {id: code for code, id in ids.items()}
+        batch: Dict[int, List[datetime.datetime]] = {}
+        for row in inserted:
+            _, seen_at = sightings[(codes[row['cryptobox_id']], row['message_id'])]
+            batch.setdefault(row['cryptobox_id'], []).append(seen_at)
+        if batch:
+            await increment_cryptoboxes(connection, batch)
+
+
+async def increment_cryptoboxes(connection: BaseDBAsyncClient, batch: Dict[int, List[datetime.datetime]]) -> None:
+    postgres = dialect_of(connection) == 'postgres'
+    executor = connection.executor_class(model=Cryptobox, db=connection)
+    seen_at = Cryptobox._meta.fields_map['first_seen_at']
+
+    selects, values = [], []
+    for id, dates in batch.items():
+        columns = []
+        for i, column in enumerate(BATCH_COLUMNS):
+            parameter = executor.parameter(len(values) + i).get_sql()
+            if postgres:
+                parameter = f'CAST({parameter} AS {POSTGRES_BATCH_TYPES[i]})'
+            columns.append(f'{parameter} AS "{column}"')
+        selects.append(f'SELECT {", ".join(columns)}')
+        values.extend([
+            id, len(dates),
+            executor._field_to_db(seen_at, min(dates), Cryptobox),
+            executor._field_to_db(seen_at, max(dates), Cryptobox),
+        ])
+
+    await connection.execute_query(
+        INCREMENT_CRYPTOBOX_SQL.format(
+            least='LEAST' if postgres else 'MIN', greatest='GREATEST' if postgres else 'MAX',
+            batch=' UNION ALL '.join(selects)
+        ),
+        values
+    )
+
+
+cryptobox_sightings = register_writer(CryptoboxSightingsBuffer(settings.BUFFERS.SIGHTINGS_FLUSH_INTERVAL))
+
+
+class CryptoboxService:
+    async def get_by_code(self, code: str) -> Optional[Cryptobox]:
+        return await Cryptobox.filter(code=code).only(
+            'id', 'code', 'first_seen_at', 'last_seen_at', 'sightings_count'
+        ).first()
+
+    async def latest(self, limit: int = 50) -> List[Tuple[str, datetime.datetime]]:
+        return await Cryptobox.all().order_by('-last_seen_at').limit(limit).values_list('code', 'last_seen_at')
+
+    async def first_sighting(self, code: str) -> Optional[CryptoboxSighting]:
+        return await CryptoboxSighting.filter(cryptobox__code=code).order_by('seen_at').first()
+
+
+cryptobox_service = CryptoboxService()
@@ -0,0 +1,119 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Sequence, Tuple, Type
+
+from tortoise import Model
+from tortoise.exceptions import IntegrityError
+from tortoise.log import logger
+from tortoise.transactions import in_transaction
+
+from src.cache import BoundedMemoryCache
+from src.db.buffers import BufferedWriter
+from src.services.telegram.snapshots import OPTIONAL_PROFILE_FIELDS, Fingerprint, profile_fingerprint
+
+
+def fingerprint_changed(fingerprint: Fingerprint, persisted: Fingerprint) -> bool:
+    if len(fingerprint) != len(persisted):
+        return True
+    return any(new is not None and new != old for new, old in zip(fingerprint, persisted))
+
+
+def merge_fingerprints(fingerprint: Fingerprint, persisted: Fingerprint) -> Fingerprint:
+    if len(fingerprint) != len(persisted):
+        return fingerprint
+    return tuple(old if new is None else new for new, old in zip(fingerprint, persisted))
+
+
+class ProfileRefreshBuffer(BufferedWriter):
+    """
+    Keeps stored chat/user profiles in line with incoming messages. A profile is
+    queued only when its fingerprint differs from the last persisted one, and
+    written at most once per ``min_refresh_interval`` in periodic bulk updates.
+    """
+
+    def __init__(
+            self,
+            model: Type[Model],
+            fields: Sequence[str],
+            interval: float,
+            min_refresh_interval: float,
+            max_tracked: int,
+            cache: Optional[BoundedMemoryCache] = None
+    ):
+        super().__init__(interval)
+        self.name = f'{model._meta.db_table}_profiles'
+        self.model = model
+        self.fields = tuple(fields)
+        self.min_refresh_interval = min_refresh_interval
+        self.max_tracked = max_tracked
+        self.cache = cache
+        # id -> (last persisted fingerprint, monotonic time of the write)
+        self._persisted: OrderedDict[int, Tuple[Fingerprint, float]] = OrderedDict()
+        self._pending: Dict[int, Tuple[Dict[str, Any], Fingerprint]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def observe(self, id: int, data: Mapping[str, Any], persisted: Fingerprint) -> bool:
+        fingerprint = profile_fingerprint(data, self.fields)
+        if (entry := self._persisted.get(id)) is not None:
+            self._persisted.move_to_end(id)
+            persisted = entry[0]
+
+        if not fingerprint_changed(fingerprint, persisted):
+            self._pending.pop(id, None)
+            return False
+
+        values = {
+            field: getattr(data.get(field), 'value', data.get(field)) for field in self.fields
+            if not (field in OPTIONAL_PROFILE_FIELDS and data.get(field) is None)
+        }
+        self._pending[id] = (values, merge_fingerprints(fingerprint, persisted))
+        return True
+
+    def _is_due(self, id: int, now: float) -> bool:
+        entry = self._persisted.get(id)
+        return entry is None or now - entry[1] >= self.min_refresh_interval
+
+    def _remember(self, id: int, fingerprint: Fingerprint, now: float) -> None:
+        self._persisted[id] = (fingerprint, now)
+        self._persisted.move_to_end(id)
+        while len(self._persisted) > self.max_tracked:
+            self._persisted.popitem(last=False)
+
+    async def _flush(self) -> None:
+        now = time.monotonic()
+        due = {id: pending for id, pending in self._pending.items() if self._is_due(id, now)}
+        if not due:
+            return
+        for id in due:
+            del self._pending[id]
+
+        # rows can carry different field sets because optional fields are left out when missing
+        groups: Dict[FrozenSet[str], List[Model]] = {}
+        for id, (values, _) in due.items():
+            groups.setdefault(frozenset(values), []).append(self.model(id=id, **values))
+
+        try:
+            async with in_transaction(connection_name=self.model._choose_db(True).connection_name) as connection:
+                for fields, instances in groups.items():
+                    await self.model.bulk_update(instances, fields=list(fields), using_db=connection)
+        except IntegrityError:
+            # e.g. a username that moved to another chat, write row by row and skip the conflicting ones
+            await self._write_each(due)
+        except Exception:
+            self._pending = {**due, **self._pending}
+            raise
+
+        for id, (_, fingerprint) in due.items():
+            self._remember(id, fingerprint, now)
+        if self.cache is not None:
+            self.cache.delete_many(due)
+        logger.debug('Refreshed %s %s profiles', len(due), self.model.__name__)
+
+    async def _write_each(self, due: Dict[int, Tuple[Dict[str, Any], Fingerprint]]) -> None:
+        for id, (values, _) in due.items():
+            try:
+                await self.model.filter(id=id).update(**values)
+            except IntegrityError as e:
+                logger.warning('%s %s profile was not refreshed: %s', self.model.__name__, id, e)
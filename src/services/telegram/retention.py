@@ -0,0 +1,122 @@
+import asyncio
+import datetime
+from typing import Dict
+
+from tortoise import BaseDBAsyncClient
+from tortoise.log import logger
+from tortoise.timezone import now
+
+from src.config.settings import settings
+from src.db import partitions
+from src.db.tasks import PeriodicTask, register_task
+from src.models.telegram import CryptoboxSighting, TelegramChat, TelegramUser, TelegramMessage
+from src.services.telegram.counters import apply_increments, message_counters
+
+
+async def _partition_counts(connection: BaseDBAsyncClient, name: str, column: str) -> Dict[int, int]:
+    _, rows = await connection.execute_query(
+        f'SELECT "{column}" AS pk, COUNT(*) AS total FROM "{name}" WHERE "{column}" IS NOT NULL GROUP BY "{column}"'
+    )
+    return {row['pk']: -row['total'] for row in rows}
+
+
+async def drop_expired_partitions(connection: BaseDBAsyncClient, cutoff: datetime.datetime) -> int:
+    removed = 0
+    for name in await partitions.expired_partitions(connection, settings.MESSAGES.PARTITIONING, cutoff.date()):
+        chats = await _partition_counts(connection, name, 'chat_id')
+        users = await _partition_counts(connection, name, 'from_user_id')
+        await partitions.remove_partition(connection, name, detach=settings.MESSAGES.RETENTION_DETACH)
+        await apply_increments(TelegramChat, chats)
+        await apply_increments(TelegramUser, users)
+        removed += -sum(chats.values())
+        logger.info('Message partition "%s" %s', name, 'detached' if settings.MESSAGES.RETENTION_DETACH else 'dropped')
+    return removed
+
+
+async def purge_default_partition(connection: BaseDBAsyncClient, cutoff: datetime.datetime, batch_size: int) -> int:
+    # rows older than the first dated partition (backfills, old replied-to messages) land here
+    removed = 0
+    while True:
+        _, rows = await connection.execute_query(
+            # the client drops the rows of a statement starting with DELETE, hence the CTE
+            f'WITH expired AS (DELETE FROM "{partitions.DEFAULT_PARTITION}" WHERE ctid IN ('
+            f'SELECT ctid FROM "{partitions.DEFAULT_PARTITION}" WHERE "date" < $1 LIMIT $2'
+            f') RETURNING "chat_id", "from_user_id") SELECT * FROM expired',
+            [cutoff, batch_size]
+        )
+        for row in rows:
+            message_counters.decrement(chat_id=row['chat_id'], user_id=row['from_user_id'])
+
+        removed += len(rows)
+        if len(rows) < batch_size:
+            return removed
+        await asyncio.sleep(0)
+
+
+async def purge_expired_messages(cutoff: datetime.datetime, batch_size: int) -> int:
+    # short batches keep each delete transaction and lock footprint small
+    removed = 0
+    while True:
+        rows = await TelegramMessage.filter(date__lt=cutoff).order_by('date').limit(batch_size).values_list(
+            'id', 'chat_id', 'from_user_id'
+        )
+        if not rows:
+            return removed
+
+        await TelegramMessage.filter(id__in=[row[0] for row in rows]).delete()
+        for _, chat_id, from_user_id in rows:
+            message_counters.decrement(chat_id=chat_id, user_id=from_user_id)
+
+        removed += len(rows)
+        if len(rows) < batch_size:
+            return removed
+        await asyncio.sleep(0)
+
+
+async def purge_expired_sightings(cutoff: datetime.datetime, batch_size: int) -> int:
+    # the messages they point to are gone; the cryptobox counters are lifetime totals and stay as they are
+    removed = 0
+    while True:
+        ids = await CryptoboxSighting.filter(seen_at__lt=cutoff).limit(batch_size).values_list('id', flat=True)
+        if not ids:
+            return removed
+
+        await CryptoboxSighting.filter(id__in=ids).delete()
+        removed += len(ids)
+        if len(ids) < batch_size:
+            return removed
+        await asyncio.sleep(0)
+
+
+async def apply_retention() -> int:
+    if not settings.MESSAGES.RETENTION_DAYS:
+        return 0
+
+    cutoff = now() - datetime.timedelta(days=settings.MESSAGES.RETENTION_DAYS)
+    connection = TelegramMessage._choose_db(True)
+    if await partitions.is_partitioned(connection):
+        removed = await drop_expired_partitions(connection, cutoff)
+        removed += await purge_default_partition(connection, cutoff, settings.MESSAGES.PURGE_BATCH_SIZE)
+    else:
+        removed = await purge_expired_messages(cutoff, settings.MESSAGES.PURGE_BATCH_SIZE)
+
+    sightings = await purge_expired_sightings(cutoff, settings.MESSAGES.PURGE_BATCH_SIZE)
+
+    if removed or sightings:
+        logger.info('Retention removed %s messages and %s code sightings older than %s', removed, sightings, cutoff)
+    return removed
+
+
+class MessageStorageMaintenance(PeriodicTask):
+    name = 'message_storage'
+
+    async def run_once(self) -> None:
+        connection = TelegramMessage._choose_db(True)
+        if settings.MESSAGES.PARTITIONING and await partitions.is_partitioned(connection):
+            await partitions.ensure_partitions(
+                connection, settings.MESSAGES.PARTITIONING, settings.MESSAGES.PARTITIONS_AHEAD
+            )
+        await apply_retention()
+
+
+message_storage_maintenance = register_task(MessageStorageMaintenance(settings.MESSAGES.MAINTENANCE_INTERVAL))
@@ -0,0 +1,157 @@
+import datetime
+from collections import defaultdict
+from typing import DefaultDict, Dict, List, Optional, Tuple, Type
+
+from tortoise import BaseDBAsyncClient
+from tortoise.log import logger
+from tortoise.timezone import now
+from tortoise.transactions import in_transaction
+
+from src.config.settings import settings
+from src.db.buffers import BufferedWriter, register_writer
+from src.db.bulk import upsert
+from src.models.telegram import ChatHourlyRollup, CryptoboxSighting, TelegramMessage, UserHourlyRollup
+from src.models.telegram.rollups import HourlyRollup
+
+COUNTERS = ('messages', 'cryptobox_messages', 'restricted_messages')
+
+# (hour, chat or user id) -> [messages, cryptobox messages, restricted messages]
+Increments = DefaultDict[Tuple[datetime.datetime, int], List[int]]
+
+
+def hour_of(date: datetime.datetime) -> datetime.datetime:
+    return date.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _increments() -> Increments:
+    return defaultdict(lambda: [0, 0, 0])
+
+
+def _merge(into: Increments, increments: Increments) -> None:
+    for key, counts in increments.items():
+        into[key] = [a + b for a, b in zip(into[key], counts)]
+
+
+async def write_increments(
+        connection: BaseDBAsyncClient, model: Type[HourlyRollup], key: str, increments: Increments
+) -> None:
+    await upsert(
+        connection, model,
+        [{'hour': hour, key: id, **dict(zip(COUNTERS, counts))} for (hour, id), counts in increments.items()],
+        conflict=('hour', key),
+        update={counter: f'"{model._meta.db_table}"."{counter}" + EXCLUDED."{counter}"' for counter in COUNTERS}
+    )
+
+
+class RollupBuffer(BufferedWriter):
+    """
+    Hourly message volumes per chat and per user, counted in memory by the
+    consumer and added to the rollup tables with one upsert per table.
+    """
+    name = 'rollups'
+
+    def __init__(self, interval: float):
+        super().__init__(interval)
+        self._chats: Increments = _increments()
+        self._users: Increments = _increments()
+
+    def __len__(self) -> int:
+        return len(self._chats) + len(self._users)
+
+    def add(
+            self, chat_id: Optional[int], user_id: Optional[int], date: Optional[datetime.datetime],
+            cryptobox: bool = False, restricted: bool = False
+    ) -> None:
+        # a delivery without a chat still counts for its sender, one without a date counts when received
+        hour = hour_of(date or now())
+        for increments, id in ((self._chats, chat_id), (self._users, user_id)):
+            if id is not None:
+                counts = increments[(hour, id)]
+                counts[0] += 1
+                counts[1] += cryptobox
+                counts[2] += restricted
+
+    async def _flush(self) -> None:
+        if not self._chats and not self._users:
+            return
+
+        chats, self._chats = self._chats, _increments()
+        users, self._users = self._users, _increments()
+        try:
+            async with in_transaction(connection_name=ChatHourlyRollup._choose_db(True).connection_name) as connection:
+                await write_increments(connection, ChatHourlyRollup, 'chat_id', chats)
+                await write_increments(connection, UserHourlyRollup, 'user_id', users)
+        except Exception:
+            _merge(self._chats, chats)
+            _merge(self._users, users)
+            raise
+
+
+rollups = register_writer(RollupBuffer(settings.BUFFERS.ROLLUPS_FLUSH_INTERVAL))
+
+
+async def backfill_rollups(days: int = 30, chunk_size: int = 5000) -> Dict[str, int]:
+    """
+    Counts the stored cryptobox messages of the last ``days`` into the rollups,
+    raising ``messages`` and ``cryptobox_messages`` to at least that count.
+    Messages without a code and restricted ones are never stored, their
+    counts only come from the consumer.
+    """
+    since = hour_of(now() - datetime.timedelta(days=days))
+    chats, users = _increments(), _increments()
+    after: Optional[Tuple[datetime.datetime, int]] = None
+    while True:
+        queryset = TelegramMessage.filter(date__gte=since).order_by('date', 'id').limit(chunk_size)
+        if after is not None:
+            queryset = queryset.filter(date__gte=after[0]).exclude(date=after[0], id__lte=after[1])
+        rows = await queryset.values_list('id', 'date', 'chat_id', 'from_user_id')
+        if not rows:
+            break
+
+        with_codes = set(await CryptoboxSighting.filter(
+            message_id__in=[row[0] for row in rows]
+        ).values_list('message_id', flat=True))
+        for id, date, chat_id, user_id in rows:
+            if id in with_codes:
+                chats[(hour_of(date), chat_id)][1] += 1
+                if user_id is not None:
+                    users[(hour_of(date), user_id)][1] += 1
+        after = (rows[-1][1], rows[-1][0])
+
+    async with in_transaction(connection_name=ChatHourlyRollup._choose_db(True).connection_name) as connection:
+        for model, key, increments in ((ChatHourlyRollup, 'chat_id', chats), (UserHourlyRollup, 'user_id', users)):
+            table = model._meta.db_table
+            await upsert(
+                connection, model,
+                [
+                    {'hour': hour, key: id, 'messages': counts[1], 'cryptobox_messages': counts[1]}
+                    for (hour, id), counts in increments.items()
+                ],
+                conflict=('hour', key),
+                # the consumer's counts also cover messages that were not stored, keep the larger one
+                update={
+                    counter: f'CASE WHEN "{table}"."{counter}" < EXCLUDED."{counter}" '
+                             f'THEN EXCLUDED."{counter}" ELSE "{table}"."{counter}" END'
+                    for counter in ('messages', 'cryptobox_messages')
+                }
+            )
+    result = {'chats': len(chats), 'users': len(users)}
+    logger.info('Rollups backfilled for %s days: %s', days, result)
+    return result
+
+
+if __name__ == '__main__':
+    import asyncio
+    import sys
+    from src.db import init_orm, close_orm
+
+
+    async def main():
+        await init_orm(generate_schemas=True)
+        try:
+            return await backfill_rollups(int(sys.argv[1]) if len(sys.argv) > 1 else 30)
+        finally:
+            await close_orm()
+
+
+    print(asyncio.run(main()))
@@ -0,0 +1,172 @@
+import datetime
+from typing import Any, Iterable, Mapping, Optional, Sequence, Tuple
+
+from tortoise.timezone import now
+
+from src.models.telegram import TelegramChat, TelegramUser, TelegramMessage
+from src.models.telegram.blacklist.base import BlacklistBaseModel
+
+
+def restriction_from_blacklist(
+        entries: Iterable[BlacklistBaseModel]
+) -> Tuple[bool, Optional[datetime.datetime]]:
+    restricted, until = False, None
+    for entry in entries:
+        if entry.release_at is None:
+            return True, None
+        restricted, until = True, max(until or entry.release_at, entry.release_at)
+    return restricted, until
+
+
+# a chat changing type (group to supergroup) gets a new id, so type is not refreshed
+CHAT_PROFILE_FIELDS = ('title', 'username', 'description', 'members_count')
+USER_PROFILE_FIELDS = ('is_bot', 'username', 'first_name', 'last_name', 'bio')
+
+# missing from most message payloads, a missing value keeps the stored one
+OPTIONAL_PROFILE_FIELDS = frozenset({'description', 'members_count', 'bio'})
+
+Fingerprint = Tuple[Optional[int], ...]
+
+
+def profile_fingerprint(values: Mapping[str, Any], fields: Sequence[str]) -> Fingerprint:
+    """
+    One hash per profile field, ``None`` for an optional field without a value.
+    """
+    fingerprint = []
+    for field in fields:
+        value = values.get(field)
+        value = getattr(value, 'value', value)
+        fingerprint.append(None if value is None and field in OPTIONAL_PROFILE_FIELDS else hash(value))
+    return tuple(fingerprint)
+
+
+def model_fingerprint(instance: Any, fields: Sequence[str]) -> Fingerprint:
+    return profile_fingerprint({field: getattr(instance, field, None) for field in fields}, fields)
+
+
+class RestrictableSnapshot:
+    __slots__ = ('restricted', 'restricted_until')
+
+    @property
+    def is_restricted(self) -> bool:
+        if not self.restricted:
+            return False
+        return self.restricted_until is None or self.restricted_until > now()
+
+
+class TelegramChatSnapshot(RestrictableSnapshot):
+    __slots__ = ('id', 'type', 'title', 'username', 'members_count', 'messages_count', 'fingerprint')
+
+    def __init__(
+            self,
+            id: int,
+            type: TelegramChat.ChatType,
+            title: Optional[str] = None,
+            username: Optional[str] = None,
+            members_count: Optional[int] = None,
+            messages_count: int = 0,
+            restricted: bool = False,
+            restricted_until: Optional[datetime.datetime] = None,
+            fingerprint: Fingerprint = ()
+    ):
+        self.id = id
+        self.type = type
+        self.title = title
+        self.username = username
+        self.members_count = members_count
+        self.messages_count = messages_count
+        self.restricted = restricted
+        self.restricted_until = restricted_until
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_model(
+            cls, chat: TelegramChat, blacklist: Optional[Iterable[BlacklistBaseModel]] = None
+    ) -> 'TelegramChatSnapshot':
+        restricted, restricted_until = restriction_from_blacklist(
+            chat.blacklist if blacklist is None else blacklist
+        )
+        return cls(
+            id=chat.id,
+            type=chat.type,
+            title=chat.title,
+            username=chat.username,
+            members_count=chat.members_count,
+            messages_count=getattr(chat, 'messages_count', 0) or 0,
+            restricted=restricted,
+            restricted_until=restricted_until,
+            fingerprint=model_fingerprint(chat, CHAT_PROFILE_FIELDS),
+        )
+
+
+class TelegramUserSnapshot(RestrictableSnapshot):
+    __slots__ = ('id', 'is_bot', 'username', 'first_name', 'last_name', 'messages_count', 'fingerprint')
+
+    def __init__(
+            self,
+            id: int,
+            is_bot: bool,
+            username: Optional[str] = None,
+            first_name: Optional[str] = None,
+            last_name: Optional[str] = None,
+            messages_count: int = 0,
+            restricted: bool = False,
+            restricted_until: Optional[datetime.datetime] = None,
+            fingerprint: Fingerprint = ()
+    ):
+        self.id = id
+        self.is_bot = is_bot
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+        self.messages_count = messages_count
+        self.restricted = restricted
+        self.restricted_until = restricted_until
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_model(
+            cls, user: TelegramUser, blacklist: Optional[Iterable[BlacklistBaseModel]] = None
+    ) -> 'TelegramUserSnapshot':
+        restricted, restricted_until = restriction_from_blacklist(
+            user.blacklist if blacklist is None else blacklist
+        )
+        return cls(
+            id=user.id,
+            is_bot=user.is_bot,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            messages_count=getattr(user, 'messages_count', 0) or 0,
+            restricted=restricted,
+            restricted_until=restricted_until,
+            fingerprint=model_fingerprint(user, USER_PROFILE_FIELDS),
+        )
+
+
+class TelegramMessageSnapshot:
+    __slots__ = ('id', 'chat_id', 'message_id', 'from_user_id', 'date')
+
+    def __init__(
+            self,
+            id: int,
+            chat_id: int,
+            message_id: int,
+            from_user_id: Optional[int] = None,
+            date: Optional[datetime.datetime] = None
+    ):
+        self.id = id
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.from_user_id = from_user_id
+        self.date = date
+
+    @classmethod
+    def from_model(cls, message: TelegramMessage) -> 'TelegramMessageSnapshot':
+        return cls(
+            id=message.id,
+            chat_id=message.chat_id,
+            message_id=message.message_id,
+            from_user_id=message.from_user_id,
+            date=message.date,
+        )
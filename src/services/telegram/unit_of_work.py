@@ -0,0 +1,205 @@
+import time
+from typing import Any, Dict, Optional, Set, Tuple, Type
+
+from aiocache.base import BaseCache
+from tortoise import BaseDBAsyncClient, Model
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
+
+from src import metrics
+from src.db.bulk import insert_ignore_returning
+from src.models.telegram import TelegramChat, TelegramUser, TelegramMessage
+from src.schemas.telegram.message import TelegramMessageSchema
+from src.services.telegram.chat import cache as chat_cache, chat_profiles, telegram_chat_service
+from src.services.telegram.messages import cache as message_cache, key_builder
+from src.services.telegram.user import cache as user_cache, user_profiles, telegram_user_service
+from src.services.telegram.counters import message_counters
+from src.services.telegram.profiles import ProfileRefreshBuffer
+from src.services.telegram.snapshots import TelegramChatSnapshot, TelegramUserSnapshot, TelegramMessageSnapshot
+
+MessageKey = Tuple[int, int]
+
+
+class MessageUnitOfWork:
+    """
+    Collects the chats, users and messages of one delivery (or a batch of them)
+    and writes what is missing in a single transaction: one multi-row insert per
+    table, plus one per level of reply nesting for messages. Rows already in the
+    caches are not touched; counters, profile refreshes and cache updates are
+    applied only after the commit.
+
+        async with MessageUnitOfWork() as uow:
+            key = uow.add(message)
+        if key is not None:
+            snapshot, created = uow.messages[key], key in uow.created
+    """
+
+    def __init__(self):
+        self._chats: Dict[int, Dict[str, Any]] = {}
+        self._users: Dict[int, Dict[str, Any]] = {}
+        self._messages: Dict[MessageKey, Tuple[Dict[str, Any], Optional[MessageKey]]] = {}
+
+        self.chats: Dict[int, TelegramChatSnapshot] = {}
+        self.users: Dict[int, TelegramUserSnapshot] = {}
+        self.messages: Dict[MessageKey, TelegramMessageSnapshot] = {}
+        self.created: Set[MessageKey] = set()
+        self.statements = 0
+
+    async def __aenter__(self) -> 'MessageUnitOfWork':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            await self.flush()
+
+    def add(self, message: TelegramMessageSchema) -> Optional[MessageKey]:
+        """
+        Queues ``message`` and the messages it replies to, ``None`` for a message
+        without a chat: chat_id is required, it can't be stored.
+        """
+        if message.chat is None:
+            return None
+        key = (message.chat.id, message.id)
+        if key in self._messages or key in self.messages:
+            return key
+
+        values = dict(
+            chat_id=message.chat.id,
+            message_id=message.id,
+            date=message.date,
+            text=message.text,
+            caption=message.caption,
+            empty=message.empty,
+        )
+        self._chats.setdefault(message.chat.id, message.chat.model_dump(mode='json'))
+        if message.from_user:
+            self._users.setdefault(message.from_user.id, message.from_user.model_dump())
+            values['from_user_id'] = message.from_user.id
+
+        reply_key = self.add(message.reply_to_message) if message.reply_to_message else None
+        self._messages[key] = (values, reply_key)
+        return key
+
+    async def flush(self) -> None:
+        if not (self._chats or self._users or self._messages):
+            return
+
+        chats, self._chats = self._chats, {}
+        users, self._users = self._users, {}
+        pending, self._messages = self._messages, {}
+
+        started = time.perf_counter()
+        statements = self.statements
+        for key in list(pending):
+            if (snapshot := await message_cache.get(key_builder(*key))) is not None:
+                self.messages[key] = snapshot
+                del pending[key]
+
+        async with in_transaction(connection_name=TelegramMessage._choose_db(True).connection_name) as connection:
+            chats_written = await self._write_profiles(
+                connection, TelegramChat, TelegramChatSnapshot, chat_cache,
+                telegram_chat_service.get_queryset(), chats, self.chats
+            )
+            users_written = await self._write_profiles(
+                connection, TelegramUser, TelegramUserSnapshot, user_cache,
+                telegram_user_service.get_queryset(), users, self.users
+            )
+            messages_loaded = await self._write_messages(connection, pending)
+
+        metrics.UOW_FLUSH_SECONDS.observe(time.perf_counter() - started)
+        metrics.UOW_FLUSH_STATEMENTS.observe(self.statements - statements)
+
+        await self._after_commit(chat_cache, chat_profiles, chats, self.chats, chats_written)
+        await self._after_commit(user_cache, user_profiles, users, self.users, users_written)
+        for key in self.created | messages_loaded:
+            if key in pending:
+                await message_cache.set(key_builder(*key), self.messages[key])
+        for key in self.created & set(pending):
+            snapshot = self.messages[key]
+            message_counters.increment(chat_id=snapshot.chat_id, user_id=snapshot.from_user_id)
+
+    async def _write_profiles(
+            self, connection: BaseDBAsyncClient, model: Type[Model], snapshot_class, cache: BaseCache,
+            queryset: QuerySet, values: Dict[int, Dict[str, Any]], resolved: Dict[int, Any]
+    ) -> Set[int]:
+        """
+        Inserts the rows missing from the cache and loads the ones that already
+        existed, returns the ids of both.
+        """
+        missing = []
+        for id in values:
+            if (snapshot := await cache.get(id)) is not None:
+                resolved[id] = snapshot
+            else:
+                missing.append(id)
+        if not missing:
+            return set()
+
+        rows = await insert_ignore_returning(
+            connection, model, [model(**values[id]) for id in missing], returning=['id'], include_pk=True
+        )
+        self.statements += 1
+        created = {row['id'] for row in rows}
+        for id in created:
+            resolved[id] = snapshot_class.from_model(model(**values[id]), blacklist=[])
+
+        if existing := [id for id in missing if id not in created]:
+            for instance in await queryset.using_db(connection).filter(id__in=existing):
+                resolved[instance.id] = snapshot_class.from_model(instance)
+            self.statements += 1
+        return set(missing) & set(resolved)
+
+    @staticmethod
+    async def _after_commit(
+            cache: BaseCache, profiles: ProfileRefreshBuffer, values: Dict[int, Dict[str, Any]],
+            resolved: Dict[int, Any], written: Set[int]
+    ) -> None:
+        for id in written:
+            await cache.set(id, resolved[id])
+        for id, data in values.items():
+            if id in resolved:
+                profiles.observe(id, data, resolved[id].fingerprint)
+
+    async def _write_messages(
+            self,
+            connection: BaseDBAsyncClient,
+            pending: Dict[MessageKey, Tuple[Dict[str, Any], Optional[MessageKey]]]
+    ) -> Set[MessageKey]:
+        loaded: Set[MessageKey] = set()
+        remaining = dict(pending)
+        while remaining:
+            # replied-to messages go first, their ids are needed for reply_to_message_id
+            level = [
+                key for key, (_, reply_key) in remaining.items()
+                if reply_key is None or reply_key not in remaining
+            ]
+            instances = []
+            for key in level:
+                values, reply_key = remaining.pop(key)
+                if reply_key is not None and reply_key in self.messages:
+                    values = dict(values, reply_to_message_id=self.messages[reply_key].id)
+                instances.append(TelegramMessage(**values))
+
+            rows = await insert_ignore_returning(
+                connection, TelegramMessage, instances, returning=['id', 'chat_id', 'message_id']
+            )
+            self.statements += 1
+            by_key = {(row['chat_id'], row['message_id']): row['id'] for row in rows}
+            for instance in instances:
+                key = (instance.chat_id, instance.message_id)
+                if key in by_key:
+                    instance.id = by_key[key]
+                    self.messages[key] = TelegramMessageSnapshot.from_model(instance)
+                    self.created.add(key)
+
+            if existing := [key for key in level if key not in by_key]:
+                query = Q(*[Q(chat_id=chat_id, message_id=message_id) for chat_id, message_id in existing],
+                          join_type='OR')
+                for instance in await TelegramMessage.filter(query).using_db(connection):
+                    key = (instance.chat_id, instance.message_id)
+                    self.messages[key] = TelegramMessageSnapshot.from_model(instance)
+                    loaded.add(key)
+                self.statements += 1
+        return loaded
+
@@ -1,18 +1,22 @@
 import datetime
-import asyncio
 from typing import Any, Optional, Union, Tuple, List, Dict
 
-from aiocache import caches, cached, SimpleMemoryCache
+from aiocache import caches
 from tortoise import BaseDBAsyncClient
 from tortoise.exceptions import DoesNotExist, IntegrityError, TransactionManagementError
-from tortoise.functions import Count
 from tortoise.query_utils import Prefetch
 from tortoise.queryset import QuerySet
 from tortoise.signals import post_save, post_delete
 from tortoise.timezone import now
 from tortoise.transactions import in_transaction
 
+from src.cache import BoundedMemoryCache, bounded_cache_config, coalesced
+from src.config.settings import settings
 from src.models.telegram import TelegramUser, TelegramUserBlacklist
+from src.db.buffers import register_writer
+from src.services.telegram.blacklist import amnesty_many, blacklist_many
+from src.services.telegram.profiles import ProfileRefreshBuffer
+from src.services.telegram.snapshots import TelegramUserSnapshot, USER_PROFILE_FIELDS
 
 
 class TelegramUserAlreadyBlacklisted(Exception):
@@ -24,32 +28,18 @@ class TelegramUserIsNotRestricted(Exception):
 
 
 cache_alias = 'telegram_user'
-caches.add(cache_alias, {
-    'ttl': 300,
-    'cache': "aiocache.SimpleMemoryCache",
-    'serializer': {
-        'class': "aiocache.serializers.NullSerializer"
-    }
-})
-
-cache: SimpleMemoryCache = caches.get(cache_alias)
-
-
-def get_cache_detail():
-    assert isinstance(cache, SimpleMemoryCache), 'this available only on SimpleMemoryCache'
-    items = []
-    loop_time = asyncio.get_running_loop().time()
-    for cache_key in cache._cache.keys():
-        item = {'key': cache_key}
-        if handler := cache._handlers.get(cache_key):
-            item.update({'ttl': round(handler.when() - loop_time, 2)})
-        items.append(item)
-
-    return {
-        'ttl': cache.ttl,
-        'total': len(items),
-        'items': items
-    }
+caches.add(cache_alias, bounded_cache_config(cache_alias, max_entries=settings.CACHE.USER_MAX_ENTRIES))
+
+cache: BoundedMemoryCache = caches.get(cache_alias)
+
+user_profiles = register_writer(ProfileRefreshBuffer(
+    TelegramUser,
+    USER_PROFILE_FIELDS,
+    interval=settings.BUFFERS.PROFILES_FLUSH_INTERVAL,
+    min_refresh_interval=settings.BUFFERS.PROFILES_MIN_REFRESH_INTERVAL,
+    max_tracked=settings.BUFFERS.PROFILES_MAX_TRACKED,
+    cache=cache
+))
 
 
 async def invalidate_cache(key: Any):
@@ -60,11 +50,11 @@ async def invalidate_cache(key: Any):
 async def on_models_save(
         sender, instance: Union[TelegramUser, TelegramUserBlacklist], created, using_db, update_fields
 ):
-    if not created:
-        if isinstance(instance, TelegramUser):
-            await invalidate_cache(instance.id)
-        elif isinstance(instance, TelegramUserBlacklist):
-            await invalidate_cache(instance.user_id)
+    # a new blacklist entry restricts the cached user as well
+    if isinstance(instance, TelegramUserBlacklist):
+        await invalidate_cache(instance.user_id)
+    elif not created:
+        await invalidate_cache(instance.id)
 
 
 @post_delete(TelegramUser, TelegramUserBlacklist)
@@ -77,16 +67,20 @@ async def on_models_delete(sender, instance: Union[TelegramUser, TelegramUserBla
 
 class TelegramUserService:
     def get_queryset(self) -> QuerySet[TelegramUser]:
-        return TelegramUser.all().annotate(
-            messages_count=Count('messages')
-        ).prefetch_related(Prefetch('blacklist', TelegramUserBlacklist.objects.restricted()))
+        return TelegramUser.all().prefetch_related(
+            Prefetch('blacklist', TelegramUserBlacklist.objects.restricted())
+        )
 
-    @cached(alias=cache_alias, key_builder=lambda f, *args, **kwargs: kwargs.get('id', args[-1]))
-    async def get_by_id(self, id: int, using_db: Optional[BaseDBAsyncClient] = None) -> TelegramUser:
-        return await self.get_queryset().using_db(using_db).get(id=id)
+    @coalesced(
+        alias=cache_alias,
+        key_builder=lambda f, *args, **kwargs: kwargs.get('id', args[-1]),
+        refresh_ahead=settings.CACHE.REFRESH_AHEAD
+    )
+    async def get_by_id(self, id: int, using_db: Optional[BaseDBAsyncClient] = None) -> TelegramUserSnapshot:
+        return TelegramUserSnapshot.from_model(await self.get_queryset().using_db(using_db).get(id=id))
 
-    async def create(self, using_db: Optional[BaseDBAsyncClient] = None, **kwargs: Any) -> TelegramUser:
-        return await TelegramUser.create(using_db=using_db, **kwargs)
+    async def create(self, using_db: Optional[BaseDBAsyncClient] = None, **kwargs: Any) -> TelegramUserSnapshot:
+        return TelegramUserSnapshot.from_model(await TelegramUser.create(using_db=using_db, **kwargs), blacklist=[])
 
     async def update(
             self, user: TelegramUser, data: Dict, using_db: Optional[BaseDBAsyncClient] = None
@@ -95,19 +89,22 @@ class TelegramUserService:
 
     async def get_or_create(
             self, id: int, defaults: Optional[dict] = None, using_db: Optional[BaseDBAsyncClient] = None
-    ) -> Tuple[TelegramUser, bool]:
+    ) -> Tuple[TelegramUserSnapshot, bool]:
         if not defaults:
             defaults = {}
         db = using_db or TelegramUser._choose_db(True)
         async with in_transaction(connection_name=db.connection_name) as connection:
             try:
-                return await self.get_by_id(id=id), False
+                user = await self.get_by_id(id=id)
             except DoesNotExist:
                 try:
                     defaults.update({'id': id})
                     return await self.create(using_db=connection, **defaults), True
                 except (IntegrityError, TransactionManagementError):
-                    return await self.get_by_id(id=id), False
+                    user = await self.get_by_id(id=id)
+        if defaults:
+            user_profiles.observe(id, defaults, user.fingerprint)
+        return user, False
 
     async def add_to_blacklist(
             self, user_id: int, reason: Optional[str] = None, release_at: Optional[datetime.datetime] = None
@@ -119,7 +116,7 @@ class TelegramUserService:
     async def is_restricted(self, user_id: int) -> bool:
         try:
             user = await self.get_by_id(id=user_id)
-            return len(user.blacklist) != 0
+            return user.is_restricted
         except DoesNotExist:
             pass
         return False
@@ -131,15 +128,23 @@ class TelegramUserService:
         if not active_violations:
             raise TelegramUserIsNotRestricted
 
-        amnestied_violations: List[TelegramUserBlacklist] = []
+        amnestied_at = now()
+        await TelegramUserBlacklist.filter(id__in=[violation.id for violation in active_violations]).update(
+            amnestied_reason=amnestied_reason, amnestied_at=amnestied_at
+        )
         for violation in active_violations:
-            await violation.update_from_dict(dict(
-                amnestied_reason=amnestied_reason,
-                amnestied_at=now()
-            )).save()
-            amnestied_violations.append(violation)
+            violation.amnestied_reason, violation.amnestied_at = amnestied_reason, amnestied_at
+        await invalidate_cache(user_id)
         return active_violations
 
+    async def blacklist_many(
+            self, user_ids: List[int], reason: Optional[str] = None, release_at: Optional[datetime.datetime] = None
+    ) -> List[int]:
+        return await blacklist_many(TelegramUserBlacklist, 'user_id', user_ids, cache, reason, release_at)
+
+    async def amnesty_many(self, user_ids: List[int], amnestied_reason: Optional[str] = None) -> List[int]:
+        return await amnesty_many(TelegramUserBlacklist, 'user_id', user_ids, cache, amnestied_reason)
+
 
 telegram_user_service = TelegramUserService()
 
@@ -158,7 +163,7 @@ if __name__ == '__main__':
         user: TelegramUser = await telegram_user_service.get_by_id(user_id)
         pprint(TelegramUserRetrieveDetail.model_validate(user).model_dump())
 
-        if user.blacklist:
+        if user.is_restricted:
             await telegram_user_service.remove_from_blacklist(user.id, 'test')
             print('remove from blacklist')
         else:
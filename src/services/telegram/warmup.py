@@ -0,0 +1,108 @@
+import asyncio
+import datetime
+import time
+from typing import Any, Dict, List, Optional, Type
+
+from aiocache.base import BaseCache
+from tortoise import Model
+from tortoise.functions import Count
+from tortoise.log import logger
+from tortoise.queryset import QuerySet
+from tortoise.timezone import now
+
+from src.config.settings import settings
+from src.models.telegram import TelegramMessage, TelegramChatBlacklist, TelegramUserBlacklist
+from src.services.telegram.chat import cache as chat_cache, telegram_chat_service
+from src.services.telegram.messages import cache as message_cache, key_builder
+from src.services.telegram.snapshots import TelegramChatSnapshot, TelegramUserSnapshot, TelegramMessageSnapshot
+from src.services.telegram.user import cache as user_cache, telegram_user_service
+
+CHUNK_SIZE = 1000
+
+
+class CacheWarmup:
+    """
+    Preloads chat, user and message snapshots of recent activity, plus every
+    restricted chat and user, before traffic reaches the caches.
+    """
+
+    def __init__(self):
+        self.state = 'pending'
+        self.loaded: Dict[str, int] = {'chats': 0, 'users': 0, 'messages': 0}
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ('done', 'timeout', 'failed', 'disabled')
+
+    def progress(self) -> Dict[str, Any]:
+        elapsed = None
+        if self._started_at is not None:
+            elapsed = round((self._finished_at or time.monotonic()) - self._started_at, 3)
+        return {'state': self.state, 'elapsed': elapsed, 'loaded': dict(self.loaded)}
+
+    def skip(self) -> None:
+        self.state = 'disabled'
+
+    async def run(self, budget: float) -> None:
+        self.state, self._started_at = 'running', time.monotonic()
+        try:
+            await asyncio.wait_for(self._warm(), budget)
+        except asyncio.TimeoutError:
+            self.state = 'timeout'
+            logger.warning('Cache warm-up stopped after %ss: %s', budget, self.loaded)
+        except Exception:
+            self.state = 'failed'
+            logger.exception('Cache warm-up failed')
+        else:
+            self.state = 'done'
+            logger.info('Cache warm-up done: %s', self.progress())
+        finally:
+            self._finished_at = time.monotonic()
+
+    async def _warm(self) -> None:
+        since = now() - datetime.timedelta(days=settings.WARMUP.ACTIVITY_DAYS)
+        await asyncio.gather(
+            self._warm_profiles(
+                'chats', 'chat_id', since, settings.WARMUP.CHATS, TelegramChatBlacklist, 'chat_id',
+                telegram_chat_service.get_queryset(), TelegramChatSnapshot, chat_cache
+            ),
+            self._warm_profiles(
+                'users', 'from_user_id', since, settings.WARMUP.USERS, TelegramUserBlacklist, 'user_id',
+                telegram_user_service.get_queryset(), TelegramUserSnapshot, user_cache
+            ),
+            self._warm_messages(since, settings.WARMUP.MESSAGES),
+        )
+
+    async def _warm_profiles(
+            self, name: str, message_field: str, since: datetime.datetime, limit: int,
+            blacklist_model: Type[Model], blacklist_field: str, queryset: QuerySet, snapshot_class, cache: BaseCache
+    ) -> None:
+        active = await TelegramMessage.filter(
+            date__gte=since, **{f'{message_field}__isnull': False}
+        ).annotate(total=Count('id')).group_by(message_field).order_by('-total').limit(limit).values_list(
+            message_field, 'total'
+        )
+        restricted = await blacklist_model.objects.get_queryset().restricted().values_list(blacklist_field, flat=True)
+
+        # restricted first, their lookups gate every message from them
+        ids: List[int] = list(dict.fromkeys([*restricted, *(id for id, _ in active)]))
+        for start in range(0, len(ids), CHUNK_SIZE):
+            instances = await queryset.filter(id__in=ids[start:start + CHUNK_SIZE])
+            await cache.multi_set([(instance.id, snapshot_class.from_model(instance)) for instance in instances])
+            self.loaded[name] += len(instances)
+
+    async def _warm_messages(self, since: datetime.datetime, limit: int) -> None:
+        rows = await TelegramMessage.filter(date__gte=since).order_by('-date').limit(limit).values_list(
+            'id', 'chat_id', 'message_id', 'from_user_id', 'date'
+        )
+        for start in range(0, len(rows), CHUNK_SIZE):
+            snapshots = [TelegramMessageSnapshot(*row) for row in rows[start:start + CHUNK_SIZE]]
+            await message_cache.multi_set([
+                (key_builder(snapshot.chat_id, snapshot.message_id), snapshot) for snapshot in snapshots
+            ])
+            self.loaded['messages'] += len(snapshots)
+
+
+cache_warmup = CacheWarmup()
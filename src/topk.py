@@ -0,0 +1,181 @@
+import heapq
+import itertools
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+from prometheus_client import Counter
+
+OTHER = 'other'
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters over at most ``capacity`` keys. A new key takes
+    over the smallest counter, so counts overestimate by at most ``error``.
+    Counts are halved every ``window`` additions to follow recent traffic.
+    """
+    __slots__ = ('capacity', 'window', '_counts', '_errors', '_payloads', '_heap', '_sequence', '_additions')
+
+    def __init__(self, capacity: int, window: Optional[int] = None):
+        self.capacity = max(1, capacity)
+        self.window = window
+        self._counts: Dict[Hashable, int] = {}
+        self._errors: Dict[Hashable, int] = {}
+        self._payloads: Dict[Hashable, Any] = {}
+        # (count, sequence, key), stale entries are skipped when popped
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._sequence = itertools.count()
+        self._additions = 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._counts
+
+    def add(self, key: Hashable, amount: int = 1, payload: Any = None) -> None:
+        counts = self._counts
+        if key in counts:
+            counts[key] += amount
+        elif len(counts) < self.capacity:
+            counts[key], self._errors[key] = amount, 0
+        else:
+            victim, minimum = self._pop_min()
+            del counts[victim], self._errors[victim]
+            self._payloads.pop(victim, None)
+            counts[key], self._errors[key] = minimum + amount, minimum
+        if payload is not None:
+            self._payloads[key] = payload
+
+        heapq.heappush(self._heap, (counts[key], next(self._sequence), key))
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild()
+
+        self._additions += amount
+        if self.window and self._additions >= self.window:
+            self._decay()
+
+    def _pop_min(self) -> Tuple[Hashable, int]:
+        while True:
+            count, _, key = heapq.heappop(self._heap)
+            if self._counts.get(key) == count:
+                return key, count
+
+    def _rebuild(self) -> None:
+        self._heap = [(count, next(self._sequence), key) for key, count in self._counts.items()]
+        heapq.heapify(self._heap)
+
+    def _decay(self) -> None:
+        self._additions = 0
+        for key in list(self._counts):
+            self._counts[key] >>= 1
+            self._errors[key] >>= 1
+            if not self._counts[key]:
+                del self._counts[key], self._errors[key]
+                self._payloads.pop(key, None)
+        self._rebuild()
+
+    def top(self, k: int) -> List[Tuple[Hashable, int, int, Any]]:
+        """
+        ``(key, count, error, payload)`` of the ``k`` largest counters.
+        """
+        keys = heapq.nlargest(k, self._counts, key=self._counts.__getitem__)
+        return [(key, self._counts[key], self._errors[key], self._payloads.get(key)) for key in keys]
+
+
+class TopKCounter:
+    """
+    Wraps a labelled counter keyed by one label (``chat_id``, ``user_id``). Only
+    the ``k`` heaviest keys of a :class:`SpaceSaving` sketch keep their own
+    series, the rest are counted with ``<key>="other"`` and empty other labels.
+    With ``k=None`` every key gets its series as before.
+    """
+
+    def __init__(
+            self,
+            counter: Counter,
+            key: str,
+            k: Optional[int],
+            tracked: int,
+            window: Optional[int] = None,
+            refresh_every: int = 1000
+    ):
+        self.counter = counter
+        self.key = key
+        self.k = k
+        self.refresh_every = refresh_every
+        self.sketch = SpaceSaving(tracked, window)
+        self._labelnames: Tuple[str, ...] = counter._labelnames
+        self._top: Set[Hashable] = set()
+        self._series: Dict[Hashable, Tuple[str, ...]] = {}
+        # what each exported series holds, moved to "other" when the series is removed
+        self._amounts: Dict[Hashable, float] = {}
+        self._updates = 0
+        self._other = None
+
+    @property
+    def name(self) -> str:
+        return self.counter._name
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if self.k is None:
+            self.counter.labels(**labels).inc(amount)
+            return
+
+        key = labels[self.key]
+        values = tuple(str(labels[name]) for name in self._labelnames)
+        self.sketch.add(key, payload=values)
+
+        self._updates += 1
+        if self._updates >= self.refresh_every:
+            self._refresh()
+        elif key not in self._top and len(self._top) < self.k:
+            self._top.add(key)
+
+        if key in self._top:
+            self._series_for(key, values).inc(amount)
+            self._amounts[key] = self._amounts.get(key, 0) + amount
+        else:
+            self._other_series().inc(amount)
+
+    def _series_for(self, key: Hashable, values: Tuple[str, ...]):
+        exported = self._series.get(key)
+        series = self.counter.labels(*values)
+        if exported != values:
+            if exported is not None:
+                # a renamed chat or user, keep one series per key and carry its count over
+                self.counter.remove(*exported)
+                series.inc(self._amounts.get(key, 0))
+            self._series[key] = values
+        return series
+
+    def _other_series(self):
+        if self._other is None:
+            self._other = self.counter.labels(*(OTHER if name == self.key else '' for name in self._labelnames))
+        return self._other
+
+    def _refresh(self) -> None:
+        self._updates = 0
+        self._top = {key for key, *_ in self.sketch.top(self.k)}
+        for key in [key for key in self._series if key not in self._top]:
+            self.counter.remove(*self._series.pop(key))
+            # the exported total doesn't go down
+            self._other_series().inc(self._amounts.pop(key, 0))
+
+    def top(self, limit: int, key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Estimated recent counts of the tracked keys, heaviest first.
+        """
+        rows = []
+        for tracked, count, error, values in self.sketch.top(limit if key is None else len(self.sketch)):
+            if key is not None and str(tracked) != key:
+                continue
+            rows.append({
+                **dict(zip(self._labelnames, values or ())),
+                self.key: tracked,
+                'count': count,
+                'error': error,
+                'exported': tracked in self._series,
+            })
+            if len(rows) >= limit:
+                break
+        return rows
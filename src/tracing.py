@@ -0,0 +1,202 @@
+import collections
+import json
+import os
+import random
+import time
+from contextvars import ContextVar, Token
+from typing import Any, Deque, Dict, List, Mapping, Optional, Tuple
+
+from src.config.settings import settings
+from src.db.buffers import BufferedWriter, register_writer
+
+TRACEPARENT = 'traceparent'
+
+_current: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+def _random_id(bytes_count: int) -> str:
+    return os.urandom(bytes_count).hex()
+
+
+def parse_traceparent(value: Any) -> Optional[Tuple[str, str, bool]]:
+    """
+    ``(trace_id, parent_span_id, sampled)`` of a W3C ``traceparent`` header.
+    """
+    if isinstance(value, bytes):
+        value = value.decode('ascii', 'ignore')
+    if not isinstance(value, str):
+        return None
+    parts = value.strip().split('-')
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or parts[1] == '0' * 32:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'error', 'start', '_started', '_token')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = _random_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._token: Optional[Token] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def __enter__(self) -> 'Span':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        end_span(self, exc_val)
+
+    def to_dict(self, duration: float) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration': round(duration, 6),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_trace(name: str, headers: Optional[Mapping[str, Any]] = None, **attributes: Any) -> Optional[Span]:
+    """
+    Root span of a consumed message. The sampling decision is taken here once:
+    a ``traceparent`` from the publisher is followed, otherwise a fraction of
+    ``TRACING_SAMPLE_RATE`` is traced. Unsampled messages create no spans.
+    """
+    if not settings.TRACING.ENABLED:
+        return None
+    parent = parse_traceparent(headers.get(TRACEPARENT)) if headers else None
+    if parent is not None:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id, sampled = None, None, random.random() < settings.TRACING.SAMPLE_RATE
+    if not sampled:
+        return None
+
+    span = Span(name, trace_id or _random_id(16), parent_id, attributes)
+    span._token = _current.set(span)
+    return span
+
+
+def start_span(name: str, **attributes: Any) -> Optional[Span]:
+    """
+    Child of the current span, nothing outside of a sampled trace.
+    """
+    parent = _current.get()
+    if parent is None:
+        return None
+    span = Span(name, parent.trace_id, parent.span_id, attributes)
+    span._token = _current.set(span)
+    return span
+
+
+def end_span(span: Optional[Span], error: Optional[BaseException] = None) -> None:
+    if span is None:
+        return
+    duration = time.perf_counter() - span._started
+    if error is not None:
+        span.error = repr(error)
+    if span._token is not None:
+        _current.reset(span._token)
+        span._token = None
+    exporter.export(span.to_dict(duration))
+
+
+def record_span(name: str, started: float, **attributes: Any) -> None:
+    """
+    Child span of the current one for work already done since ``started``
+    (a ``time.perf_counter()`` value).
+    """
+    parent = _current.get()
+    if parent is None:
+        return
+    span = Span(name, parent.trace_id, parent.span_id, attributes)
+    duration = time.perf_counter() - started
+    span.start -= duration
+    exporter.export(span.to_dict(duration))
+
+
+def inject(headers: Dict[str, Any]) -> Dict[str, Any]:
+    if (span := _current.get()) is not None:
+        headers[TRACEPARENT] = span.traceparent
+    return headers
+
+
+class SpanExporter(BufferedWriter):
+    """
+    Keeps the latest finished spans in a ring buffer and appends them as JSON
+    lines to ``TRACING_FILE`` on every flush.
+    """
+    name = 'span_exporter'
+
+    def __init__(self, interval: float, buffer_size: int, path: Optional[str] = None):
+        super().__init__(interval)
+        self.path = path
+        self.spans: Deque[Dict[str, Any]] = collections.deque(maxlen=buffer_size)
+        self._pending: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def export(self, span: Dict[str, Any]) -> None:
+        self.spans.append(span)
+        if self.path is not None:
+            self._pending.append(span)
+
+    async def _flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        with open(self.path, 'a') as file:
+            file.writelines(json.dumps(span, default=str) + '\n' for span in pending)
+
+    def traces(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        The latest traces, newest first, each with its spans in start order.
+        """
+        traces: Dict[str, List[Dict[str, Any]]] = {}
+        for span in reversed(self.spans):
+            if span['trace_id'] not in traces:
+                if len(traces) >= limit:
+                    continue
+                traces[span['trace_id']] = []
+            traces[span['trace_id']].append(span)
+        return [
+            {'trace_id': trace_id, 'spans': sorted(spans, key=lambda span: span['start'])}
+            for trace_id, spans in traces.items()
+        ]
+
+    def trace(self, trace_id: str) -> List[Dict[str, Any]]:
+        return sorted((span for span in self.spans if span['trace_id'] == trace_id), key=lambda span: span['start'])
+
+
+exporter = SpanExporter(
+    interval=settings.TRACING.FLUSH_INTERVAL,
+    buffer_size=settings.TRACING.BUFFER_SIZE,
+    path=settings.TRACING.FILE
+)
+if settings.TRACING.ENABLED and settings.TRACING.FILE:
+    register_writer(exporter)
@@ -0,0 +1,28 @@
+from src.models.telegram import TelegramChat, TelegramChatBlacklist, TelegramUser, TelegramUserBlacklist
+from src.services.telegram.chat import telegram_chat_service
+from src.services.telegram.user import telegram_user_service
+
+
+def test_blacklist_many_skips_ids_without_a_stored_row(database):
+    async def main():
+        await TelegramUser.create(id=1, is_bot=False)
+        await TelegramChat.create(id=-1, type=TelegramChat.ChatType.GROUP)
+
+        assert await telegram_user_service.blacklist_many([1, 2], reason='test') == [1]
+        assert await telegram_chat_service.blacklist_many([-2, -1]) == [-1]
+        assert await TelegramUserBlacklist.all().values_list('user_id', flat=True) == [1]
+        assert await TelegramChatBlacklist.all().values_list('chat_id', flat=True) == [-1]
+
+    database(main)
+
+
+def test_blacklist_many_skips_restricted_ids(database):
+    async def main():
+        for id in (1, 2):
+            await TelegramUser.create(id=id, is_bot=False)
+        await telegram_user_service.blacklist_many([1])
+
+        assert await telegram_user_service.blacklist_many([1, 2]) == [2]
+        assert await TelegramUserBlacklist.all().count() == 2
+
+    database(main)
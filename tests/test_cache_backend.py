@@ -0,0 +1,119 @@
+import asyncio
+import itertools
+
+from src.cache import BoundedMemoryCache
+
+names = itertools.count()
+
+
+def make_cache(**kwargs) -> BoundedMemoryCache:
+    return BoundedMemoryCache(name=f'test_{next(names)}', **kwargs)
+
+
+def test_lru_evicts_least_recently_used():
+    async def main():
+        cache = make_cache(max_entries=2, admission=BoundedMemoryCache.ADMISSION_LRU)
+        await cache.set('a', 1)
+        await cache.set('b', 2)
+        await cache.get('a')
+        await cache.set('c', 3)
+        assert await cache.multi_get(['a', 'b', 'c']) == [1, None, 3]
+
+    asyncio.run(main())
+
+
+def test_tinylfu_rejects_rarer_candidate():
+    async def main():
+        cache = make_cache(max_entries=2)
+        await cache.set('a', 1)
+        await cache.set('b', 2)
+        for _ in range(5):
+            await cache.get('a')
+            await cache.get('b')
+        await cache.get('c')
+        assert not await cache.set('c', 3)
+        assert await cache.multi_get(['a', 'b', 'c']) == [1, 2, None]
+        assert cache.rejections == 1
+
+    asyncio.run(main())
+
+
+def test_tinylfu_admits_ties():
+    async def main():
+        cache = make_cache(max_entries=3)
+        for key in range(3):
+            await cache.get(key)
+            await cache.set(key, key)
+        # a cache full of one-hit keys still takes new one-hit keys
+        for key in range(3, 10):
+            await cache.get(key)
+            assert await cache.set(key, key)
+        assert sorted(key for key, _ in cache.entries()) == [7, 8, 9]
+        assert cache.rejections == 0
+
+    asyncio.run(main())
+
+
+def test_tinylfu_admits_frequent_candidate():
+    async def main():
+        cache = make_cache(max_entries=1)
+        await cache.set('a', 1)
+        for _ in range(3):
+            await cache.get('b')
+        assert await cache.set('b', 2)
+        assert await cache.multi_get(['a', 'b']) == [None, 2]
+
+    asyncio.run(main())
+
+
+def test_update_of_resident_key_is_not_subject_to_admission():
+    async def main():
+        cache = make_cache(max_entries=2)
+        await cache.set('a', 1)
+        await cache.set('b', 2)
+        for _ in range(5):
+            await cache.get('b')
+        assert await cache.set('a', 10)
+        assert await cache.multi_get(['a', 'b']) == [10, 2]
+
+    asyncio.run(main())
+
+
+def test_oversized_value_is_rejected_without_evicting():
+    async def main():
+        cache = make_cache(max_entries=10, max_bytes=100, sizeof=len)
+        await cache.set('a', 'x' * 40)
+        await cache.set('b', 'x' * 40)
+        assert not await cache.set('c', 'x' * 101)
+        assert not await cache.set('a', 'y' * 101)
+        assert await cache.multi_get(['a', 'b', 'c']) == ['x' * 40, 'x' * 40, None]
+        assert cache.size_bytes == 80 and cache.evictions == 0
+
+    asyncio.run(main())
+
+
+def test_growing_update_evicts_others_within_max_bytes():
+    async def main():
+        cache = make_cache(max_entries=10, max_bytes=100, admission=BoundedMemoryCache.ADMISSION_LRU, sizeof=len)
+        await cache.set('a', 'x' * 40)
+        await cache.set('b', 'x' * 40)
+        assert await cache.set('b', 'y' * 70)
+        assert await cache.multi_get(['a', 'b']) == [None, 'y' * 70]
+        assert cache.size_bytes == 70
+
+    asyncio.run(main())
+
+
+def test_expired_entries_are_evicted_first():
+    async def main():
+        cache = make_cache(max_entries=2)
+        await cache.set('a', 1, ttl=0.01)
+        await cache.set('b', 2)
+        for _ in range(5):
+            await cache.get('b')
+        await asyncio.sleep(0.02)
+        assert await cache.set('c', 3)
+        assert await cache.multi_get(['b', 'c']) == [2, 3]
+        assert cache.expirations == 1
+
+    asyncio.run(main())
@@ -0,0 +1,39 @@
+import datetime
+
+from src.models.telegram import Cryptobox, CryptoboxSighting
+from src.services.telegram.cryptobox import cryptobox_sightings
+from src.services.telegram.snapshots import TelegramMessageSnapshot
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def at(minutes: int) -> datetime.datetime:
+    return START + datetime.timedelta(minutes=minutes)
+
+
+def snapshot(id: int, minutes: int) -> TelegramMessageSnapshot:
+    return TelegramMessageSnapshot(id=id, chat_id=1, message_id=id, date=at(minutes))
+
+
+async def counters(code: str):
+    cryptobox = await Cryptobox.get(code=code)
+    return cryptobox.sightings_count, cryptobox.first_seen_at, cryptobox.last_seen_at
+
+
+def test_flushes_add_new_sightings_to_the_counters(database):
+    async def main():
+        cryptobox_sightings.add(['AAAA1111', 'BBBB2222'], snapshot(1, 10))
+        cryptobox_sightings.add(['AAAA1111'], snapshot(2, 20))
+        await cryptobox_sightings.flush()
+        assert await counters('AAAA1111') == (2, at(10), at(20))
+        assert (await counters('BBBB2222'))[0] == 1
+
+        # an earlier and a later sighting move both ends, a redelivered one is not counted again
+        cryptobox_sightings.add(['AAAA1111'], snapshot(3, 5))
+        cryptobox_sightings.add(['AAAA1111'], snapshot(4, 30))
+        cryptobox_sightings.add(['AAAA1111'], snapshot(2, 20))
+        await cryptobox_sightings.flush()
+        assert await counters('AAAA1111') == (4, at(5), at(30))
+        assert await CryptoboxSighting.all().count() == 5
+
+    database(main)
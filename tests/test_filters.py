@@ -0,0 +1,76 @@
+import datetime
+
+import pytest
+
+from src.admin.contrib.tortoise.filters import build_query
+from src.db.schema import leading_index_columns
+from src.models.telegram import TelegramChat, TelegramMessage, TelegramUser
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+FIELDS = {'message_id', 'date', 'text', 'chat', 'from_user'}
+
+
+def compile(where):
+    return build_query(where, TelegramMessage, FIELDS, leading_index_columns(TelegramMessage))
+
+
+async def create_messages():
+    await TelegramChat.create(id=1, type=TelegramChat.ChatType.GROUP)
+    await TelegramChat.create(id=2, type=TelegramChat.ChatType.GROUP)
+    await TelegramUser.create(id=7, is_bot=False)
+    rows = [
+        (1, 1, 'code box', 7),
+        (2, 1, 'hello', None),
+        (3, 2, 'box here', 7),
+        (4, 2, None, None),
+    ]
+    for message_id, chat_id, text, user_id in rows:
+        await TelegramMessage.create(
+            message_id=message_id, chat_id=chat_id, text=text, from_user_id=user_id,
+            date=START + datetime.timedelta(days=message_id)
+        )
+
+
+@pytest.mark.parametrize('where, expected', [
+    ({'chat': {'eq': '1'}}, [1, 2]),
+    ({'chat': {'neq': 1}}, [3, 4]),
+    ({'message_id': {'in': ['1', '3']}}, [1, 3]),
+    ({'message_id': {'not_in': [1, 3]}}, [2, 4]),
+    ({'message_id': {'ge': 2, 'lt': '4'}}, [2, 3]),
+    ({'date': {'between': [(START + datetime.timedelta(days=2)).isoformat(), START + datetime.timedelta(days=3)]}},
+     [2, 3]),
+    ({'message_id': {'not_between': ['2', '3']}}, [1, 4]),
+    ({'text': {'contains': 'box'}}, [1, 3]),
+    ({'text': {'startswith': 'box'}}, [3]),
+    ({'text': {'is_null': None}}, [4]),
+    ({'from_user': {'is_not_null': None}}, [1, 3]),
+    ({'and': [{'chat': {'eq': 2}}, {'text': {'contains': 'box'}}]}, [3]),
+    ({'or': [{'chat': {'eq': 2}}, {'text': {'contains': 'hello'}}]}, [2, 3, 4]),
+    ({'or': [{'and': [{'chat': {'eq': 1}}, {'message_id': {'gt': 1}}]}, {'message_id': {'eq': 4}}]}, [2, 4]),
+    # fields outside the view are ignored
+    ({'empty': {'eq': True}}, [1, 2, 3, 4]),
+])
+def test_compiled_filters_select_the_expected_rows(database, where, expected):
+    async def main():
+        await create_messages()
+        q, _ = compile(where)
+        assert await TelegramMessage.filter(q).order_by('message_id').values_list('message_id', flat=True) == expected
+
+    database(main)
+
+
+@pytest.mark.parametrize('where, indexed', [
+    ({'chat': {'eq': 1}}, True),
+    ({'date': {'ge': START.isoformat()}}, True),
+    ({'from_user': {'in': [7]}}, True),
+    ({'text': {'contains': 'box'}}, False),
+    ({'chat': {'neq': 1}}, False),
+    ({'message_id': {'eq': 1}}, False),
+    # one indexed condition narrows an AND, an OR needs every branch indexed
+    ({'and': [{'chat': {'eq': 1}}, {'text': {'contains': 'box'}}]}, True),
+    ({'or': [{'chat': {'eq': 1}}, {'text': {'contains': 'box'}}]}, False),
+    ({'or': [{'chat': {'eq': 1}}, {'from_user': {'eq': 7}}]}, True),
+    ({'or': []}, False),
+])
+def test_indexed_flag(where, indexed):
+    assert compile(where)[1] is indexed
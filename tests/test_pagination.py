@@ -0,0 +1,69 @@
+import datetime
+
+import pytest
+
+from src.admin.contrib.tortoise.pagination import InvalidCursor, Keyset
+from src.models.telegram import TelegramChat, TelegramMessage
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+async def create_messages():
+    await TelegramChat.create(id=1, type=TelegramChat.ChatType.GROUP)
+    # three rows per date, the pk has to break the ties
+    for i in range(12):
+        await TelegramMessage.create(chat_id=1, message_id=i, date=START + datetime.timedelta(minutes=i // 3))
+
+
+async def page_through(keyset: Keyset, limit: int):
+    seen, cursor = [], None
+    while True:
+        queryset = TelegramMessage.all().order_by(*keyset.order_by())
+        if cursor is not None:
+            queryset = queryset.filter(keyset.seek(cursor))
+        page = await queryset.limit(limit)
+        seen.extend(message.id for message in page)
+        if len(page) < limit:
+            return seen
+        cursor = keyset.cursor(page[-1])
+
+
+def test_from_ordering_appends_pk_in_the_same_direction():
+    assert Keyset.from_ordering(TelegramMessage, ['-date']).fields == [('date', True), ('id', True)]
+    assert Keyset.from_ordering(TelegramMessage, ['chat_id', 'id']).fields == [('chat_id', False), ('id', False)]
+
+
+def test_from_ordering_refuses_unseekable_orderings():
+    assert Keyset.from_ordering(TelegramMessage, ['chat__title']) is None
+    # nullable columns: "> value" would skip the NULL rows
+    assert Keyset.from_ordering(TelegramMessage, ['text']) is None
+    assert Keyset.from_ordering(TelegramChat, ['title']) is None
+
+
+@pytest.mark.parametrize('ordering', [['date'], ['-date'], ['chat_id', '-date'], ['-id']])
+@pytest.mark.parametrize('limit', [1, 2, 5])
+def test_seek_visits_every_row_once_in_order(database, ordering, limit):
+    async def main():
+        await create_messages()
+        keyset = Keyset.from_ordering(TelegramMessage, ordering)
+        expected = await TelegramMessage.all().order_by(*keyset.order_by()).values_list('id', flat=True)
+        assert await page_through(keyset, limit) == expected
+
+    database(main)
+
+
+def test_cursor_round_trips_values(database):
+    async def main():
+        await create_messages()
+        keyset = Keyset.from_ordering(TelegramMessage, ['-date'])
+        message = await TelegramMessage.get(message_id=4)
+        assert keyset.decode(keyset.cursor(message)) == [message.date, message.id]
+
+    database(main)
+
+
+@pytest.mark.parametrize('cursor', ['not base64!', 'e30', 'WzFd'])
+def test_invalid_cursor(cursor):
+    # e30 is {}, WzFd is [1]: not a list or the wrong length
+    with pytest.raises(InvalidCursor):
+        Keyset.from_ordering(TelegramMessage, ['-date']).seek(cursor)
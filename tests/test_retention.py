@@ -0,0 +1,30 @@
+import datetime
+
+from tortoise.timezone import now
+
+from src.config.settings import settings
+from src.models.telegram import Cryptobox, CryptoboxSighting, TelegramChat, TelegramMessage
+from src.services.telegram.cryptobox import cryptobox_sightings
+from src.services.telegram.retention import apply_retention
+from src.services.telegram.snapshots import TelegramMessageSnapshot
+
+
+def test_retention_purges_old_messages_and_their_sightings(database, monkeypatch):
+    monkeypatch.setattr(settings.MESSAGES, 'RETENTION_DAYS', 7)
+    monkeypatch.setattr(settings.MESSAGES, 'PURGE_BATCH_SIZE', 2)
+
+    async def main():
+        await TelegramChat.create(id=1, type=TelegramChat.ChatType.GROUP)
+        for days in (1, 8, 9, 10):
+            date = now() - datetime.timedelta(days=days)
+            message = await TelegramMessage.create(chat_id=1, message_id=days, date=date)
+            cryptobox_sightings.add(['AAAA1111'], TelegramMessageSnapshot.from_model(message))
+        await cryptobox_sightings.flush()
+
+        assert await apply_retention() == 3
+        assert await TelegramMessage.all().values_list('message_id', flat=True) == [1]
+        assert await CryptoboxSighting.all().count() == 1
+        # lifetime totals
+        assert (await Cryptobox.get(code='AAAA1111')).sightings_count == 4
+
+    database(main)
@@ -0,0 +1,20 @@
+import datetime
+
+from src.models.telegram import ChatHourlyRollup, TelegramChat, TelegramUser, UserHourlyRollup
+from src.services.telegram.rollups import rollups
+
+START = datetime.datetime(2024, 1, 1, 10, 30, tzinfo=datetime.timezone.utc)
+
+
+def test_messages_without_a_chat_count_for_their_sender(database):
+    async def main():
+        await TelegramChat.create(id=1, type=TelegramChat.ChatType.GROUP)
+        await TelegramUser.create(id=7, is_bot=False)
+        rollups.add(1, 7, START, cryptobox=True)
+        rollups.add(None, 7, START)
+        await rollups.flush()
+
+        assert await ChatHourlyRollup.all().values_list('chat_id', 'messages', 'cryptobox_messages') == [(1, 1, 1)]
+        assert await UserHourlyRollup.all().values_list('user_id', 'messages', 'cryptobox_messages') == [(7, 2, 1)]
+
+    database(main)
@@ -0,0 +1,48 @@
+import itertools
+
+from prometheus_client import CollectorRegistry, Counter
+
+from src.topk import OTHER, TopKCounter
+
+names = itertools.count()
+
+
+def make_counter(**kwargs) -> TopKCounter:
+    counter = Counter(
+        f'test_messages_{next(names)}', 'test', labelnames=('chat_id', 'title'), registry=CollectorRegistry()
+    )
+    return TopKCounter(counter, 'chat_id', **kwargs)
+
+
+def exported(counter: TopKCounter):
+    return {
+        sample.labels['chat_id']: sample.value
+        for metric in counter.counter.collect() for sample in metric.samples if sample.name.endswith('_total')
+    }
+
+
+def test_evicted_series_are_folded_into_other():
+    counter = make_counter(k=1, tracked=10, refresh_every=5)
+    for _ in range(3):
+        counter.inc(chat_id=1, title='a')
+    for _ in range(6):
+        counter.inc(chat_id=2, title='b')
+    assert exported(counter) == {'1': 3, OTHER: 6}
+
+    # the next refresh evicts chat 1 in favour of chat 2
+    counter.inc(chat_id=2, title='b')
+    assert exported(counter) == {OTHER: 9, '2': 1}
+
+
+def test_renamed_series_carries_its_count():
+    counter = make_counter(k=5, tracked=10)
+    counter.inc(2, chat_id=1, title='a')
+    counter.inc(chat_id=1, title='b')
+    assert exported(counter) == {'1': 3}
+
+
+def test_without_k_every_key_is_exported():
+    counter = make_counter(k=None, tracked=10)
+    counter.inc(chat_id=1, title='a')
+    counter.inc(chat_id=2, title='b')
+    assert exported(counter) == {'1': 1, '2': 1}
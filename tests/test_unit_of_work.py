@@ -0,0 +1,128 @@
+import datetime
+
+from src.cache import CACHES
+from src.models.telegram import TelegramChat, TelegramMessage, TelegramUser
+from src.schemas.telegram.message import TelegramMessageSchema
+from src.services.telegram.counters import message_counters
+from src.services.telegram.unit_of_work import MessageUnitOfWork
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def message(message_id: int, user_id: int = 7, reply_to: dict = None) -> dict:
+    return {
+        'id': message_id,
+        'date': (START + datetime.timedelta(minutes=message_id)).isoformat(),
+        'text': f'message {message_id}',
+        'chat': {'id': 1, 'type': 'GROUP', 'title': 'chat'},
+        'from_user': {'id': user_id, 'is_bot': False},
+        'reply_to_message': reply_to,
+    }
+
+
+def chain() -> TelegramMessageSchema:
+    # 3 replies to 2, which replies to 1
+    return TelegramMessageSchema.model_validate(message(3, reply_to=message(2, user_id=8, reply_to=message(1))))
+
+
+async def replies():
+    rows = await TelegramMessage.all().order_by('message_id').values('id', 'message_id', 'reply_to_message_id')
+    ids = {row['id']: row['message_id'] for row in rows}
+    return {row['message_id']: ids.get(row['reply_to_message_id']) for row in rows}
+
+
+async def clear_caches():
+    for cache in CACHES.values():
+        await cache.clear()
+
+
+def test_flush_inserts_replied_to_messages_first(database):
+    async def main():
+        async with MessageUnitOfWork() as uow:
+            key = uow.add(chain())
+
+        assert key == (1, 3)
+        assert uow.created == {(1, 1), (1, 2), (1, 3)}
+        assert await replies() == {1: None, 2: 1, 3: 2}
+        assert await TelegramChat.all().values_list('id', flat=True) == [1]
+        assert sorted(await TelegramUser.all().values_list('id', flat=True)) == [7, 8]
+        # one insert per table, one per level of reply nesting
+        assert uow.statements == 5
+
+    database(main)
+
+
+def test_second_flush_of_cached_messages_writes_nothing(database):
+    async def main():
+        async with MessageUnitOfWork() as first:
+            first.add(chain())
+        async with MessageUnitOfWork() as second:
+            key = second.add(chain())
+
+        assert second.created == set()
+        assert second.statements == 0
+        assert second.messages[key].id == first.messages[key].id
+        assert await TelegramMessage.all().count() == 3
+
+    database(main)
+
+
+def test_existing_rows_are_loaded_and_linked(database):
+    async def main():
+        async with MessageUnitOfWork() as first:
+            first.add(TelegramMessageSchema.model_validate(message(1)))
+        await clear_caches()
+
+        async with MessageUnitOfWork() as uow:
+            uow.add(TelegramMessageSchema.model_validate(message(2, reply_to=message(1))))
+
+        assert uow.created == {(1, 2)}
+        assert uow.messages[(1, 1)].id == first.messages[(1, 1)].id
+        assert await replies() == {1: None, 2: 1}
+
+    database(main)
+
+
+def test_counters_count_created_messages_only(database):
+    async def main():
+        # increments left by other tests update no rows of this database
+        await message_counters.flush()
+        for _ in range(2):
+            async with MessageUnitOfWork() as uow:
+                uow.add(chain())
+        await message_counters.flush()
+
+        assert await TelegramChat.get(id=1).values_list('messages_count', flat=True) == 3
+        assert await TelegramUser.get(id=7).values_list('messages_count', flat=True) == 2
+
+    database(main)
+
+
+def test_failed_flush_leaves_nothing_behind(database):
+    async def main():
+        uow = MessageUnitOfWork()
+        try:
+            async with uow:
+                uow.add(chain())
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        assert uow.created == set()
+        assert await TelegramMessage.all().count() == 0
+
+    database(main)
+
+
+def test_messages_without_a_chat_are_skipped(database):
+    async def main():
+        chatless = dict(message(1), chat=None)
+        async with MessageUnitOfWork() as uow:
+            assert uow.add(TelegramMessageSchema.model_validate(chatless)) is None
+            # a reply to one is stored without the link
+            key = uow.add(TelegramMessageSchema.model_validate(message(2, reply_to=chatless)))
+
+        assert uow.created == {key}
+        assert await replies() == {2: None}
+
+    database(main)